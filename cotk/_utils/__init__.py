@@ -3,6 +3,7 @@ r"""
 not find api here.
 """
 
-from .utils import trim_before_target, chain_sessions, restore_sessions, replace_unk, is_build_private_docs
+from .utils import trim_before_target, chain_sessions, restore_sessions, replace_unk, is_build_private_docs, \
+	FORK_LOCK
 
-__all__ = ['trim_before_target', 'chain_sessions', 'restore_sessions', 'replace_unk', 'is_build_private_docs']
+__all__ = ['trim_before_target', 'chain_sessions', 'restore_sessions', 'replace_unk', 'is_build_private_docs', 'FORK_LOCK']
@@ -4,6 +4,9 @@ r"""
 import importlib
 import sys
 
+# the object of a :class:`LazyObject` which is not resolved yet
+_UNRESOLVED = object()
+
 class LazyModule(object):
 	r'''Lazy loading modules.
 
@@ -31,8 +34,10 @@ class LazyModule(object):
 		self._global_dict = global_dict
 
 	def _try_load(self):
-		if super().__getattribute__("_module_name") in sys.modules:
-			return sys.modules[super().__getattribute__("_module_name")]
+		module_name = super().__getattribute__("_module_name")
+		if module_name in sys.modules:
+			# ``import_module`` waits until the module is initialized if it is being imported by another thread
+			return importlib.import_module(module_name)
 		else:
 			return None
 
@@ -77,22 +82,38 @@ class LazyObject(object):
 		super().__init__()
 		self._object_name = object_name
 		self._module_name = object_name.split('.')[0]
+		self._object = _UNRESOLVED
 
 	def _try_load_module(self):
-		if super().__getattribute__("_module_name") in sys.modules:
-			return sys.modules[super().__getattribute__("_module_name")]
+		module_name = super().__getattribute__("_module_name")
+		if module_name in sys.modules:
+			# ``import_module`` waits until the module is initialized if it is being imported by another thread
+			return importlib.import_module(module_name)
 		else:
 			return None
 
 	def _load_object(self):
-		mod = importlib.import_module(super().__getattribute__("_module_name"))
+		obj = super().__getattribute__("_object")
+		if obj is not _UNRESOLVED:
+			return obj
 		arr = super().__getattribute__("_object_name").split('.')
-		obj = getattr(mod, arr[1])
-		for i in range(2, len(arr)):
+		# import the longest module path, because a submodule may not be
+		# imported (or may be shadowed) by its parent package
+		for i in range(len(arr) - 1, 1, -1):
+			try:
+				obj = importlib.import_module(".".join(arr[:i]))
+				break
+			except ImportError:
+				pass
+		else:
+			i = 1
+			obj = importlib.import_module(super().__getattribute__("_module_name"))
+		for j in range(i, len(arr)):
 			try:
-				obj = getattr(obj, arr[i])
+				obj = getattr(obj, arr[j])
 			except AttributeError:
-				raise AttributeError("No attribute %s in %s." % (arr[i], ".".join(arr[:i])))
+				raise AttributeError("No attribute %s in %s." % (arr[j], ".".join(arr[:j])))
+		super().__setattr__("_object", obj)
 		return obj
 
 	def _try_getattribute(self, key):
@@ -109,6 +130,9 @@ class LazyObject(object):
 
 
 	def __getattribute__(self, key):
+		obj = super().__getattribute__("_object")
+		if obj is not _UNRESOLVED:
+			return getattr(obj, key)
 		loaded = super().__getattribute__("_try_load_module")()
 		if loaded is not None:
 			return getattr(super().__getattribute__("_load_object")(), key)
@@ -124,7 +148,7 @@ class LazyObject(object):
 			return getattr(super().__getattribute__("_load_object")(), key)
 
 	def __call__(self, *args, **kwargs):
-		return self._load_object()(*args, **kwargs)
+		return super().__getattribute__("_load_object")()(*args, **kwargs)
 
 	@staticmethod
 	def peek(obj, key):
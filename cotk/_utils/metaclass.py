@@ -1,10 +1,241 @@
 """A lib for decorator and metaclass"""
+import os
 import re
+import json
+import hashlib
 import inspect
-import types
-from typing import Optional, Iterable, Any
+from typing import Optional, Iterable, Any, Dict
 from functools import wraps
 
+# The expanded docstrings of the cotk classes, which is generated by ``docs/meta/update_docstring_cache.py``.
+DOCSTRING_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "docstring_cache.json")
+_docstring_cache = None # type: Optional[Dict[str, Any]]
+# the names of the CONSTANTs which can be used in docstrings
+_CONSTANT_NAME = re.compile(r'^[A-Z_]+$')
+
+def _expand_docstring(name, bases, clsdict):
+	# Expand the docstrings of the class and its attributes in place.
+
+	def find_base(base_name):
+		if name == base_name:
+			return clsdict
+		for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()):
+			if mro_cls.__name__ == base_name:
+				return mro_cls
+		raise ValueError("No bases named %s" % base_name)
+
+	def find_attr(attr_name):
+		if "." in attr_name:
+			base_name, attr_name = attr_name.split(".")
+			base = find_base(base_name)
+			if isinstance(base, dict):
+				return base[attr_name]
+			else:
+				return getattr(base, attr_name)
+		else:
+			if attr_name in clsdict:
+				return clsdict[attr_name]
+			for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()):
+				if hasattr(mro_cls, attr_name):
+					return getattr(mro_cls, attr_name)
+			raise KeyError("No such attr.")
+
+	def replace_for_clsdict(first):
+		def replace(matched):
+			attr_name = matched.group(1)
+			if not first:
+				if "." not in attr_name and not attr_name.startswith("_"):
+					raise ValueError(("%s are not allowed in nested replacement when interpreting docstring of class %s, "
+						"try to use BaseClassName.ATTR or _ATTR instead.") % (attr_name, name))
+			try:
+				return find_attr(attr_name)
+			except ValueError as err:
+				if err.args[0].startswith("No bases"):
+					raise ValueError("Can't find %s when interpreting docstring of class %s, because the class doesn't have a baseclass named %s." \
+						% (attr_name, name, attr_name.split(".")[0]))
+				else:
+					raise
+			except (AttributeError, KeyError):
+				raise ValueError("Can't find %s when interpreting docstring of class %s, please check whether the CONSTANT exists." \
+					% (attr_name, name))
+		return replace
+
+	def replace_for(attr, first):
+		def replace(matched):
+			attr_name = matched.group(1)
+			if not first:
+				if "." not in attr_name and not attr_name.startswith("_"):
+					raise ValueError("%s are not allowed in nested replacement when interpreting docstring of class %s, "
+						"try to use BaseClassName.ATTR or _ATTR instead." % (attr_name, name))
+			try:
+				return find_attr(attr_name)
+			except ValueError as err:
+				if err.args[0].startswith("No bases"):
+					raise ValueError("Can't find %s when interpreting docstring of %s.%s, because the class doesn't have a baseclass named %s." \
+						% (attr_name, name, attr, attr_name.split(".")[0]))
+				else:
+					raise
+			except (AttributeError, KeyError):
+				raise ValueError("Can't find %s when interpreting docstring of %s.%s, please check whether the CONSTANT exists." \
+					% (attr_name, name, attr))
+		return replace
+
+	_expand_class_docstring(bases, clsdict, replace_for_clsdict)
+	_expand_attribute_docstrings(bases, clsdict, replace_for)
+
+def _expand_class_docstring(bases, clsdict, replace_for_clsdict):
+	# modify class docstring
+	# first, inherit docstring from bases
+	if not('__doc__' in clsdict and clsdict['__doc__']):
+		for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()):
+			# iterate from bases in MRO
+			if mro_cls.META_DOC:
+				clsdict['__doc__'] = mro_cls.META_DOC
+				break
+	# second, subtitute CONSTANT with _ prefix
+	first = True
+	if clsdict.get('__doc__'):
+		while True:
+			doc = re.sub(r'\{\b((\w*\.)?[A-Z][A-Z_]*?)\}', replace_for_clsdict(first), clsdict['__doc__'])
+			first = False
+			if doc == clsdict['__doc__']:
+				break
+			clsdict['__doc__'] = doc
+	# save docstring now as META_DOC, before the final subtitution
+	clsdict['META_DOC'] = clsdict.get('__doc__')
+	# final, do substitution for CONSTANT
+	first = True
+	if clsdict.get('__doc__'):
+		while True:
+			doc = re.sub(r'\{\b((\w*\.)?[A-Z_]+?)\}', replace_for_clsdict(first), clsdict['__doc__'])
+			first = False
+			if doc == clsdict['__doc__']:
+				break
+			clsdict['__doc__'] = doc
+
+def _expand_attribute_docstrings(bases, clsdict, replace_for):
+	meta_doc = clsdict['META_DOC_FOR_ATTRIBUTES'] = {}
+
+	# modify attribute docstring
+	for attr, attribute in clsdict.items():
+		if attr in ('__doc__', 'META_DOC', 'META_DOC_FOR_ATTRIBUTES'):
+			continue
+
+		doc = _raw_docstring(attribute)
+		# first, inherit docstring from bases
+		if not doc:
+			for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()
+							if hasattr(mro_cls, attr)):
+				if attr in getattr(mro_cls, "META_DOC_FOR_ATTRIBUTES", {}):
+					doc = mro_cls.META_DOC_FOR_ATTRIBUTES[attr]
+					break
+			else:
+				doc = ""
+
+		# second, subtitute CONSTANT with _ prefix
+		first = True
+		while True:
+			# else do substitution for CONSTANT
+			new_doc = re.sub(r'\{\b(((\w*\.)?)[A-Z][A-Z_]*?)\}', replace_for(attr, first), doc)
+			first = False
+			if doc == new_doc:
+				break
+			doc = new_doc
+
+		# save docstring now as META_DOC, before the final subtitution
+		meta_doc[attr] = doc
+
+		# final, do substitution for CONSTANT
+		first = True
+		while True:
+			# else do substitution for CONSTANT
+			new_doc = re.sub(r'\{\b(((\w*\.)?)[A-Z_]+?)\}', replace_for(attr, first), doc)
+			first = False
+			if doc == new_doc:
+				break
+			doc = new_doc
+
+		# set all doc
+		_set_docstring(clsdict, attr, doc)
+
+def _raw_docstring(attribute):
+	if isinstance(attribute, (staticmethod, classmethod)):
+		return attribute.__func__.__doc__
+	return attribute.__doc__
+
+def _set_docstring(clsdict, attr, doc):
+	attribute = clsdict[attr]
+	if not doc:
+		doc = None
+	if isinstance(attribute, (staticmethod, classmethod)):
+		if doc != attribute.__func__.__doc__:
+			attribute.__func__.__doc__ = doc
+	else:
+		if doc == attribute.__doc__:
+			return
+		elif isinstance(attribute, property):
+			clsdict[attr] = property(
+					attribute.fget, attribute.fset, attribute.fdel, doc) # type: ignore
+		else:
+			attribute.__doc__ = doc
+
+def _docstring_digest(name, bases, clsdict) -> str:
+	# The expanded docstrings only depend on the name, the raw docstrings and the constants of the class,
+	# and those of the classes in the MRO of the bases (which are identified by their digests if they have).
+	source = [name]
+	for attr, attribute in clsdict.items():
+		if isinstance(attribute, str):
+			source += [attr, attribute]
+		else:
+			doc = _raw_docstring(attribute)
+			# the docstring of a type (e.g. int) is the same for all its instances, and differs between python versions
+			source += [attr, type(attribute).__qualname__ if doc is type(attribute).__doc__ else doc or ""]
+	visited = set()
+	for base in bases:
+		for mro_cls in base.mro():
+			if mro_cls in visited:
+				continue
+			visited.add(mro_cls)
+			if "_docstring_digest" in vars(mro_cls):
+				source.append(mro_cls._docstring_digest)
+				# the digest covers the bases of ``mro_cls``
+				visited.update(mro_cls.mro())
+			else:
+				source += [mro_cls.__module__, mro_cls.__qualname__]
+				for attr, value in vars(mro_cls).items():
+					if isinstance(value, str) and _CONSTANT_NAME.match(attr):
+						source += [attr, value]
+	return hashlib.sha256("\0".join(source).encode("utf-8", "surrogatepass")).hexdigest()
+
+def _load_docstring_cache() -> Dict[str, Any]:
+	global _docstring_cache #pylint: disable=global-statement
+	if _docstring_cache is None:
+		try:
+			with open(DOCSTRING_CACHE_PATH, "r", encoding="utf-8") as cache_file:
+				_docstring_cache = json.load(cache_file)
+		except (OSError, ValueError):
+			_docstring_cache = {}
+	return _docstring_cache
+
+def _docstring_record(clsdict, raw_docs):
+	# Return the expanded docstrings of an expanded ``clsdict``, without the ones same as ``raw_docs``.
+	return {
+		"__doc__": clsdict.get("__doc__"),
+		"META_DOC": clsdict["META_DOC"],
+		"META_DOC_FOR_ATTRIBUTES": {attr: doc for attr, doc in clsdict["META_DOC_FOR_ATTRIBUTES"].items() \
+			if doc != raw_docs[attr]},
+		"docs": {attr: _raw_docstring(clsdict[attr]) for attr in raw_docs \
+			if (_raw_docstring(clsdict[attr]) or "") != raw_docs[attr]}
+	}
+
+def _apply_docstring_record(clsdict, raw_docs, record):
+	clsdict["__doc__"] = record["__doc__"]
+	clsdict["META_DOC"] = record["META_DOC"]
+	meta_doc = record["META_DOC_FOR_ATTRIBUTES"]
+	clsdict["META_DOC_FOR_ATTRIBUTES"] = {attr: meta_doc.get(attr, doc) for attr, doc in raw_docs.items()}
+	for attr, doc in record["docs"].items():
+		_set_docstring(clsdict, attr, doc)
+
 class DocStringInheritor(type):
 	"""
 	A meta class. It make the class:
@@ -17,166 +248,31 @@ class DocStringInheritor(type):
 	  but {STRING_DOCS} (without underscore prefix) will use the value of Base.STRING_DOCS
 	* The replacement can be nested. But only {BaseClassName.STRING_DOCS} or {_STRING_DOCS} are allowed in the nested replacement,
 	  for avoiding ambiguous use.
+	* The expanded docstrings are loaded from ``DOCSTRING_CACHE_PATH`` if the class and its bases are
+	  not changed since the cache is generated. Otherwise, they are expanded when the class is created.
+	  Set ``DocStringInheritor.use_docstring_cache = False`` before the classes are created to expand all of them.
 
 	A variation on
 	http://groups.google.com/group/comp.lang.python/msg/26f7b4fcb4d66c95
 	by Paul McGuire
 	from https://stackoverflow.com/questions/8100166/inheriting-methods-docstrings-in-python
 	"""
-	def __new__(cls, name, bases, clsdict):
-
-		def find_base(base_name):
-			if name == base_name:
-				return clsdict
-			for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()):
-				if mro_cls.__name__ == base_name:
-					return mro_cls
-			raise ValueError("No bases named %s" % base_name)
-
-		def find_attr(attr_name):
-			if "." in attr_name:
-				base_name, attr_name = attr_name.split(".")
-				base = find_base(base_name)
-				if isinstance(base, dict):
-					return base[attr_name]
-				else:
-					return getattr(base, attr_name)
-			else:
-				if attr_name in clsdict:
-					return clsdict[attr_name]
-				for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()):
-					if hasattr(mro_cls, attr_name):
-						return getattr(mro_cls, attr_name)
-				raise KeyError("No such attr.")
-
-		def replace_for_clsdict(first):
-			def replace(matched):
-				attr_name = matched.group(1)
-				if not first:
-					if "." not in attr_name and not attr_name.startswith("_"):
-						raise ValueError(("%s are not allowed in nested replacement when interpreting docstring of class %s, "
-							"try to use BaseClassName.ATTR or _ATTR instead.") % (attr_name, name))
-				try:
-					return find_attr(attr_name)
-				except ValueError as err:
-					if err.args[0].startswith("No bases"):
-						raise ValueError("Can't find %s when interpreting docstring of class %s, because the class doesn't have a baseclass named %s." \
-							% (attr_name, name, attr_name.split(".")[0]))
-					else:
-						raise
-				except (AttributeError, KeyError):
-					raise ValueError("Can't find %s when interpreting docstring of class %s, please check whether the CONSTANT exists." \
-						% (attr_name, name))
-			return replace
-
-		def replace_for(attr, first):
-			def replace(matched):
-				attr_name = matched.group(1)
-				if not first:
-					if "." not in attr_name and not attr_name.startswith("_"):
-						raise ValueError("%s are not allowed in nested replacement when interpreting docstring of class %s, "
-							"try to use BaseClassName.ATTR or _ATTR instead." % (attr_name, name))
-				try:
-					return find_attr(attr_name)
-				except ValueError as err:
-					if err.args[0].startswith("No bases"):
-						raise ValueError("Can't find %s when interpreting docstring of %s.%s, because the class doesn't have a baseclass named %s." \
-							% (attr_name, name, attr, attr_name.split(".")[0]))
-					else:
-						raise
-				except (AttributeError, KeyError):
-					raise ValueError("Can't find %s when interpreting docstring of %s.%s, please check whether the CONSTANT exists." \
-						% (attr_name, name, attr))
-			return replace
-
-		# modify class docstring
-		# first, inherit docstring from bases
-		if not('__doc__' in clsdict and clsdict['__doc__']):
-			for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()):
-				# iterate from bases in MRO
-				if mro_cls.META_DOC:
-					clsdict['__doc__'] = mro_cls.META_DOC
-					break
-		# second, subtitute CONSTANT with _ prefix
-		first = True
-		if clsdict.get('__doc__'):
-			while True:
-				doc = re.sub(r'\{\b((\w*\.)?[A-Z][A-Z_]*?)\}', replace_for_clsdict(first), clsdict['__doc__'])
-				first = False
-				if doc == clsdict['__doc__']:
-					break
-				clsdict['__doc__'] = doc
-		# save docstring now as META_DOC, before the final subtitution
-		clsdict['META_DOC'] = clsdict.get('__doc__')
-		# final, do substitution for CONSTANT
-		first = True
-		if clsdict.get('__doc__'):
-			while True:
-				doc = re.sub(r'\{\b((\w*\.)?[A-Z_]+?)\}', replace_for_clsdict(first), clsdict['__doc__'])
-				first = False
-				if doc == clsdict['__doc__']:
-					break
-				clsdict['__doc__'] = doc
-
-		meta_doc = clsdict['META_DOC_FOR_ATTRIBUTES'] = {}
-
-		# modify attribute docstring
-		for attr, attribute in clsdict.items():
-
-			if isinstance(attribute, (staticmethod, classmethod)):
-				doc = attribute.__func__.__doc__
-			else:
-				doc = attribute.__doc__
-			# first, inherit docstring from bases
-			if not doc:
-				for mro_cls in (mro_cls for base in bases for mro_cls in base.mro()
-								if hasattr(mro_cls, attr)):
-					if attr in getattr(mro_cls, "META_DOC_FOR_ATTRIBUTES", {}):
-						doc = mro_cls.META_DOC_FOR_ATTRIBUTES[attr]
-						break
-				else:
-					doc = ""
-
-			# second, subtitute CONSTANT with _ prefix
-			first = True
-			while True:
-				# else do substitution for CONSTANT
-				new_doc = re.sub(r'\{\b(((\w*\.)?)[A-Z][A-Z_]*?)\}', replace_for(attr, first), doc)
-				first = False
-				if doc == new_doc:
-					break
-				doc = new_doc
-
-			# save docstring now as META_DOC, before the final subtitution
-			meta_doc[attr] = doc
-
-			# final, do substitution for CONSTANT
-			first = True
-			while True:
-				# else do substitution for CONSTANT
-				new_doc = re.sub(r'\{\b(((\w*\.)?)[A-Z_]+?)\}', replace_for(attr, first), doc)
-				first = False
-				if doc == new_doc:
-					break
-				doc = new_doc
-
-			# set all doc
-			if not doc:
-				doc = None
-			if isinstance(attribute, (staticmethod, classmethod)):
-				if doc == attribute.__func__.__doc__:
-					continue
-				else:
-					attribute.__func__.__doc__ = doc
-			else:
-				if doc == attribute.__doc__:
-					continue
-				elif isinstance(attribute, property):
-					clsdict[attr] = property(
-							attribute.fget, attribute.fset, attribute.fdel, doc) # type: ignore
-				else:
-					attribute.__doc__ = doc
+	use_docstring_cache = True
+	# digest -> the expanded docstrings of the created classes, if not None
+	docstring_records = None # type: Optional[Dict[str, Any]]
 
+	def __new__(cls, name, bases, clsdict):
+		digest = _docstring_digest(name, bases, clsdict)
+		raw_docs = {attr: _raw_docstring(attribute) or "" for attr, attribute in clsdict.items() \
+			if attr not in ('__doc__', 'META_DOC', 'META_DOC_FOR_ATTRIBUTES')}
+		record = _load_docstring_cache().get(digest) if cls.use_docstring_cache else None
+		if record is not None:
+			_apply_docstring_record(clsdict, raw_docs, record)
+		else:
+			_expand_docstring(name, bases, clsdict)
+			if cls.docstring_records is not None:
+				cls.docstring_records[digest] = _docstring_record(clsdict, raw_docs)
+		clsdict['_docstring_digest'] = digest
 		return type.__new__(cls, name, bases, clsdict)
 
 class LoadClassInterface:
@@ -3,9 +3,22 @@ r"""
 """
 
 import os
+import threading
 from typing import List, Any, Tuple
 from itertools import chain
 
+# Held while creating worker processes by ``fork``, so that the threads using the metrics
+# (e.g. the worker pools of :mod:`cotk.metric.worker_pool`) never fork at the same time.
+FORK_LOCK = threading.Lock()
+
+def _release_fork_lock():
+	# only the thread which forked exists in the child process, so the lock is not held by anyone
+	if FORK_LOCK.locked():
+		FORK_LOCK.release()
+
+if hasattr(os, "register_at_fork"):
+	os.register_at_fork(after_in_child=_release_fork_lock)
+
 def trim_before_target(lists, target):
 	'''Trim the list before the target. If there is no target,
 	return the origin list.
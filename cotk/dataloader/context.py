@@ -1,8 +1,26 @@
 
-from typing import List, Any, Dict, Union, Optional
+from typing import List, Any, Dict, Union, Optional, Mapping
+from types import MappingProxyType
+import threading
 
 from .._utils.metaclass import DocStringInheritor
 
+try:
+	from contextvars import ContextVar
+except ImportError: # python < 3.7
+	class ContextVar(threading.local): #type: ignore
+		'''A minimal thread-local replacement of :class:`contextvars.ContextVar`.'''
+		def __init__(self, name, *, default):
+			super().__init__()
+			self.name = name
+			self.value = default
+
+		def get(self):
+			return self.value
+
+		def set(self, value):
+			self.value = value
+
 # For type checking
 if False: #pylint: disable=using-constant-test
 	#pylint: disable=unused-import
@@ -13,7 +31,20 @@ if False: #pylint: disable=using-constant-test
 class _UNDEFINED():
 	pass
 
-class Context(metaclass=DocStringInheritor):
+class _ContextMeta(DocStringInheritor):
+	# ``context_dict`` and ``corrupted`` used to be class attributes, and they are kept as read-only
+	# views of the context variables of the current thread.
+	@property
+	def context_dict(cls) -> Mapping[str, Any]:
+		'''A read-only snapshot of all the parameters stored in this class. See :meth:`Context.snapshot`.'''
+		return cls._context_dict.get()
+
+	@property
+	def corrupted(cls) -> bool:
+		'''Whether a context object of this class is not closed before becoming invalid.'''
+		return cls._corrupted.get()
+
+class Context(metaclass=_ContextMeta):
 	'''An abstract base class for context manager.
 
 	This class is used for setting default parameters
@@ -30,26 +61,74 @@ class Context(metaclass=DocStringInheritor):
 			Default: ``True``.
 	'''
 
-	context_dict: Dict[str, Any] = {}
-	corrupted = False
+	# Parameters are stored as a read-only snapshot in a context variable,
+	# so that each thread (or asyncio task) sees its own stack of contexts.
+	_context_dict: "ContextVar[Mapping[str, Any]]" = ContextVar("Context.context_dict", default=MappingProxyType({}))
+	_corrupted: "ContextVar[bool]" = ContextVar("Context.corrupted", default=False)
 
 	UNDEFINED = _UNDEFINED()
 
+	context_dict = property(lambda self: type(self).context_dict, \
+		doc='''A read-only snapshot of all the parameters stored in this class. See :meth:`snapshot`.''')
+	corrupted = property(lambda self: type(self).corrupted, \
+		doc='''Whether a context object of this class is not closed before becoming invalid.''')
+
 	def __init__(self, parameter_dict: Dict[str, Any], weak=False, none_as_ignored=True):
-		if self.__class__.corrupted:
+		if self.__class__._corrupted.get():
 			raise RuntimeError("A context object do not close before becoming invalid. Use ``with`` statement, " \
 				"or make sure of calling close.")
 
 		self._old_parameters = self._set_parameters(parameter_dict, weak=weak, none_as_ignored=none_as_ignored)
 		self._closed = False
 
+	@staticmethod
+	def _update(mapping: Dict[str, Any], key: str, value: Any, weak=False, none_as_ignored=True) -> Any:
+		# Apply a single ``set`` to a mutable copy of the snapshot and return the old value.
+		if key not in mapping:
+			if value or not none_as_ignored:
+				mapping[key] = value
+			return Context.UNDEFINED
+
+		old = mapping[key]
+		if not weak:
+			if value is Context.UNDEFINED:
+				del mapping[key]
+			elif value is not None or not none_as_ignored:
+				mapping[key] = value
+		return old
+
 	@classmethod
 	def _set_parameters(cls, parameter_dict: Dict[str, Any], weak=False, none_as_ignored=True) -> Dict[str, Any]:
 		old_parameters: Dict[str, Any] = {}
+		new_dict = dict(cls._context_dict.get())
 		for key, value in parameter_dict.items():
-			old_parameters[key] = cls.set(key, value, weak=weak, none_as_ignored=none_as_ignored)
+			old_parameters[key] = cls._update(new_dict, key, value, weak=weak, none_as_ignored=none_as_ignored)
+		cls._context_dict.set(MappingProxyType(new_dict))
 		return old_parameters
 
+	@classmethod
+	def snapshot(cls) -> Mapping[str, Any]:
+		'''Return a read-only snapshot of all the parameters stored in this class.
+		The snapshot is not affected by later changes of the context.
+		'''
+		return cls._context_dict.get()
+
+	@classmethod
+	def resolve(cls, parameter_dict: Dict[str, Any], weak=False, none_as_ignored=True) -> Mapping[str, Any]:
+		'''Return a read-only mapping of the parameters that would be stored in this class
+		inside a context created with ``parameter_dict``, without entering the context.
+		It is a cheaper alternative to a ``with`` block followed by several :meth:`get`.
+
+		Arguments:
+			parameter_dict (Dict[str, Any]): Key-value dict for changed parameters.
+			{WEAK_ARGS}
+			{NONE_AS_IGNORED_ARGS}
+		'''
+		new_dict = dict(cls._context_dict.get())
+		for key, value in parameter_dict.items():
+			cls._update(new_dict, key, value, weak=weak, none_as_ignored=none_as_ignored)
+		return MappingProxyType(new_dict)
+
 	@classmethod
 	def get(cls, key: str, default: Any = None, no_default=False) -> Any:
 		'''Get the value of parameter named ``key`` stored in this class.
@@ -59,8 +138,9 @@ class Context(metaclass=DocStringInheritor):
 			default (Any, optional): Default value if ``key`` is not set. Defaults: ``None``.
 			no_default (bool, optional): When ``True``, Raise ``KeyError`` if ``key`` is not set. Defaults: ``False``.
 		'''
-		if key in cls.context_dict:
-			return cls.context_dict[key]
+		context_dict = cls._context_dict.get()
+		if key in context_dict:
+			return context_dict[key]
 		else:
 			if no_default:
 				raise KeyError("Must specify %s in Context." % key)
@@ -89,19 +169,7 @@ class Context(metaclass=DocStringInheritor):
 			{WEAK_ARGS}
 			{NONE_AS_IGNORED_ARGS}
 		'''
-		if key not in cls.context_dict:
-			old = Context.UNDEFINED
-			if value or not none_as_ignored:
-				cls.context_dict[key] = value
-			return old
-
-		old = cls.context_dict[key]
-		if not weak:
-			if value is Context.UNDEFINED:
-				del cls.context_dict[key]
-			elif value is not None or not none_as_ignored:
-				cls.context_dict[key] = value
-		return old
+		return cls._set_parameters({key: value}, weak=weak, none_as_ignored=none_as_ignored)[key]
 
 	def __enter__(self):
 		'''Enter a context'''
@@ -109,13 +177,15 @@ class Context(metaclass=DocStringInheritor):
 
 	@classmethod
 	def _restore(cls, old_parameters):
+		new_dict = dict(cls._context_dict.get())
 		for name, param in old_parameters.items():
-			if name not in cls.context_dict:
+			if name not in new_dict:
 				continue
 			if param is Context.UNDEFINED:
-				del cls.context_dict[name]
+				del new_dict[name]
 			else:
-				cls.context_dict[name] = param
+				new_dict[name] = param
+		cls._context_dict.set(MappingProxyType(new_dict))
 
 	def __exit__(self, exc_type, exc_val, exc_tb):
 		'''Exit the context and restore the old parameter.'''
@@ -128,7 +198,7 @@ class Context(metaclass=DocStringInheritor):
 
 	def __del__(self):
 		if hasattr(self, "_closed") and not self._closed:
-			self.__class__.corrupted = True
+			self.__class__._corrupted.set(True)
 			raise RuntimeError("A context object do not close before becoming invalid. Use ``with`` statement, " \
 				"or make sure of calling close.")
 
@@ -138,8 +208,8 @@ class FieldContext(Context):
 	A context class for setting default parameters for :class:`.Field`.
 	'''
 
-	context_dict: Dict[str, Any] = {}
-	corrupted = False
+	_context_dict: "ContextVar[Mapping[str, Any]]" = ContextVar("FieldContext.context_dict", default=MappingProxyType({}))
+	_corrupted: "ContextVar[bool]" = ContextVar("FieldContext.corrupted", default=False)
 	UNDEFINED = Context.UNDEFINED
 
 	NONE_AS_IGNORED_ARGS = Context.NONE_AS_IGNORED_ARGS.replace("``parameter_dict``", "``kwargs``")
@@ -163,8 +233,8 @@ class VocabContext(Context):
 	A context class for setting default parameters for :class:`.Vocab`.
 	'''
 
-	context_dict: Dict[str, Any] = {}
-	corrupted = False
+	_context_dict: "ContextVar[Mapping[str, Any]]" = ContextVar("VocabContext.context_dict", default=MappingProxyType({}))
+	_corrupted: "ContextVar[bool]" = ContextVar("VocabContext.corrupted", default=False)
 	UNDEFINED = Context.UNDEFINED
 
 	NONE_AS_IGNORED_ARGS = Context.NONE_AS_IGNORED_ARGS.replace("``parameter_dict``", "``kwargs``")
@@ -300,19 +300,23 @@ class Sentence(Field):
 		if self.__class__.__name__ == "Sentence":
 			raise NotImplementedError("Sentence is an abstract class, use SentenceDefault instead.")
 
-		with FieldContext.set_parameters(\
-				tokenizer=tokenizer,\
-				vocab=vocab,\
-				vocab_from_mappings=vocab_from_mappings,\
-				max_sent_length=max_sent_length,\
-				convert_to_lower_letter=convert_to_lower_letter):
-			filled_tokenizer: Union[Tokenizer, str] = FieldContext.get("tokenizer", no_default=True)
-			self.vocab: Vocab = FieldContext.get("vocab", no_default=True)
-			self.vocab_from_mappings: Dict[str, str] = FieldContext.get("vocab_from_mappings", Field.DEFAULT_VOCAB_FROM_MAPPINGS)
-			self.max_sent_length: int = FieldContext.get("max_sent_length", None)
-			self.convert_to_lower_letter: bool = FieldContext.get("convert_to_lower_letter", False)
-			if self.max_sent_length == Sentence.INFINITE_LENGTH:
-				self.max_sent_length = None  # max_sent_length is used for slice. So, None means that sent_length is unlimited.
+		context = FieldContext.resolve({\
+				"tokenizer": tokenizer,\
+				"vocab": vocab,\
+				"vocab_from_mappings": vocab_from_mappings,\
+				"max_sent_length": max_sent_length,\
+				"convert_to_lower_letter": convert_to_lower_letter})
+		if "tokenizer" not in context:
+			raise KeyError("Must specify tokenizer in Context.")
+		if "vocab" not in context:
+			raise KeyError("Must specify vocab in Context.")
+		filled_tokenizer: Union[Tokenizer, str] = context["tokenizer"]
+		self.vocab: Vocab = context["vocab"]
+		self.vocab_from_mappings: Dict[str, str] = context.get("vocab_from_mappings", Field.DEFAULT_VOCAB_FROM_MAPPINGS)
+		self.max_sent_length: int = context.get("max_sent_length", None)
+		self.convert_to_lower_letter: bool = context.get("convert_to_lower_letter", False)
+		if self.max_sent_length == Sentence.INFINITE_LENGTH:
+			self.max_sent_length = None  # max_sent_length is used for slice. So, None means that sent_length is unlimited.
 
 		self.tokenizer: Tokenizer
 		if isinstance(filled_tokenizer, str):
@@ -506,6 +510,85 @@ class Sentence(Field):
 	def get_batch(self, name: str, data: Dict[str, Any], indexes: List[int]) -> Dict[str, Any]:
 		raise NotImplementedError
 
+	_GET_PACKED_BATCH_RETURN_VALUE = """
+		The function will return a dict, containing:
+
+		* ``FIELDNAME_packed`` (``np.ndarray[row_num, packed_length]``):
+		  Several sentences concatenated into each row in id formats. The tail of a row is padded.
+		* ``FIELDNAME_packed_position`` (``np.ndarray[row_num, packed_length]``):
+		  Position ids, which are reset to ``0`` at the beginning of every sentence. ``0`` for padding.
+		* ``FIELDNAME_packed_segment`` (``np.ndarray[row_num, packed_length]``):
+		  Segment ids, the ``k``-th sentence in a row is marked as ``k`` (starting from ``1``). ``0`` for padding.
+		  Tokens can attend to each other only if they have the same non-zero segment id.
+		* ``FIELDNAME_packed_attnmask`` (``np.ndarray[row_num, packed_length]``):
+		  ``1`` for tokens of sentences and ``0`` for padding.
+		* ``FIELDNAME_packed_length`` (``np.ndarray[row_num]``): The number of non-padding tokens in each row.
+		* ``FIELDNAME_packed_sent_length`` (``List[List[int]]``): The length of sentences in each row.
+		* ``FIELDNAME_packed_index`` (``List[List[int]]``): The indexes of sentences in each row.
+
+		where
+
+		* ``FIELDNAME`` is the name of the field.
+		* ``row_num`` is the number of rows used for packing all the sentences in ``indexes``.
+	"""
+	def get_packed_batch(self, name: str, data: Dict[str, Any], indexes: List[int], packed_length: int = 512) \
+			-> Dict[str, Any]:
+		'''Invoked by :meth:`LanguageGeneration.get_packed_batch`, return the batched data where
+		multiple sentences are packed into rows of fixed length. Compared with :meth:`get_batch`,
+		it avoids wasting most of the tensor on padding when the sentences are short.
+		Sentences are placed into the first row with enough space left, in the order of ``indexes``.
+
+		{_GET_PACKED_BATCH_RETURN_VALUE}
+
+		Arguments:
+			name (str): name of the field.
+			{_GET_BATCH_DATA_DOCSTRING}
+			indexes (List[int]): the indexes of the data in this batch
+			packed_length (int, optional): The length of each row. Default: ``512``.
+		'''
+		raise NotImplementedError
+
+	def _get_packed_batch(self, name: str, data: Dict[str, Any], indexes: List[int], \
+			packed_length: int, pad_id: int) -> Dict[str, Any]:
+		if packed_length <= 0:
+			raise ValueError("packed_length must be a positive integer.")
+		data_id = data["id"]
+
+		rows_left: List[int] = []
+		rows_index: List[List[int]] = []
+		for j in indexes:
+			length = len(data_id[j])
+			if length > packed_length:
+				raise ValueError("The length of sentence %d is %d, which is longer than packed_length %d. " \
+					"Use a larger packed_length or set max_sent_length." % (j, length, packed_length))
+			for row, left in enumerate(rows_left):
+				if left >= length:
+					rows_left[row] -= length
+					rows_index[row].append(j)
+					break
+			else:
+				rows_left.append(packed_length - length)
+				rows_index.append([j])
+
+		res: Dict[str, Any] = {}
+		row_num = len(rows_index)
+		res_sent = res[name + "_packed"] = np.full((row_num, packed_length), pad_id, dtype=int)
+		res_position = res[name + "_packed_position"] = np.zeros((row_num, packed_length), dtype=int)
+		res_segment = res[name + "_packed_segment"] = np.zeros((row_num, packed_length), dtype=int)
+		res[name + "_packed_sent_length"] = [[len(data_id[j]) for j in row_index] for row_index in rows_index]
+		for row, row_index in enumerate(rows_index):
+			now = 0
+			for segment, j in enumerate(row_index):
+				sent = data_id[j]
+				res_sent[row, now:now + len(sent)] = sent
+				res_position[row, now:now + len(sent)] = np.arange(len(sent))
+				res_segment[row, now:now + len(sent)] = segment + 1
+				now += len(sent)
+		res[name + "_packed_attnmask"] = (res_segment > 0).astype(int)
+		res[name + "_packed_length"] = packed_length - np.array(rows_left, dtype=int)
+		res[name + "_packed_index"] = rows_index
+		return res
+
 	def trim_in_ids(self, ids: List[int]) -> List[int]:
 		'''Find the first special token indicating the sentence is over and remove all the tokens after it (included).
 		Then remove all trailing ``pad``. {_SENTENCE_MORE_DOCSTRING}
@@ -731,6 +814,10 @@ class SentenceGPT2(Sentence):
 		res[name + "_str"] = [data_str[i] for i in indexes]
 		return res
 
+	def get_packed_batch(self, name: str, data: Dict[str, Any], indexes: List[int], packed_length: int = 512) \
+			-> Dict[str, Any]:
+		return self._get_packed_batch(name, data, indexes, packed_length, self.vocab.eos_id)
+
 	def trim_in_ids(self, ids: List[int]) -> List[int]:
 		if ids[0] == self.vocab.eos_id:
 			ids = [self.vocab.eos_id] + trim_before_target(list(ids[1:]), self.vocab.eos_id)
@@ -821,6 +908,10 @@ class SentenceBERT(Sentence):
 		res[name + "_str"] = [data_str[i] for i in indexes]
 		return res
 
+	def get_packed_batch(self, name: str, data: Dict[str, Any], indexes: List[int], packed_length: int = 512) \
+			-> Dict[str, Any]:
+		return self._get_packed_batch(name, data, indexes, packed_length, self.vocab.pad_id)
+
 	def trim_in_ids(self, ids: List[int]) -> List[int]:
 		# The first token can't be the sep token
 		ids = trim_before_target(list(ids), self.vocab.get_special_tokens_id("sep"))
@@ -922,10 +1013,9 @@ class Session(Sentence):
 			raise NotImplementedError(
 				"%s is an abstract class. Please use %s instead." % (Session.__name__, SessionDefault.__name__))
 		super().__init__(tokenizer, vocab, vocab_from_mappings, max_sent_length, convert_to_lower_letter)
-		with FieldContext.set_parameters(max_turn_length=max_turn_length):
-			max_turn_length = FieldContext.get('max_turn_length', None)
-			if max_turn_length == Sentence.INFINITE_LENGTH:
-				max_turn_length = None  # max_turn_length is used for slice. So, None means that turn_length is unlimited.
+		max_turn_length = FieldContext.resolve({'max_turn_length': max_turn_length}).get('max_turn_length', None)
+		if max_turn_length == Sentence.INFINITE_LENGTH:
+			max_turn_length = None  # max_turn_length is used for slice. So, None means that turn_length is unlimited.
 		if max_turn_length is not None:
 			msg = "max_turn_length must be None or a positive integer"
 			if not isinstance(max_turn_length, int):
@@ -1498,10 +1588,9 @@ class SparseLabel(Field):
 	"""
 	def __init__(self, vocab: Optional[SimpleVocab] = None):
 		super().__init__()
-		with FieldContext.set_parameters(vocab=vocab):
-			self.vocab = FieldContext.get('vocab')
-			if not isinstance(self.vocab, SimpleVocab):
-				raise TypeError("vocab for SparseLabel must be a SimpleVocab object.")
+		self.vocab = FieldContext.resolve({'vocab': vocab}).get('vocab')
+		if not isinstance(self.vocab, SimpleVocab):
+			raise TypeError("vocab for SparseLabel must be a SimpleVocab object.")
 
 	def get_vocab(self) -> Optional[Vocab]:
 		return self.vocab
@@ -8,7 +8,7 @@ from .context import FieldContext, VocabContext
 from .tokenizer import PretrainedTokenizer
 from .vocab import GeneralVocab, PretrainedVocab
 from ..metric.metric import MetricChain, MetricBase
-from .field import Sentence
+from .field import Sentence, SentenceGPT2, SentenceBERT
 
 # pylint: disable=W0223
 class LanguageGeneration(LanguageProcessing):
@@ -98,6 +98,24 @@ class LanguageGeneration(LanguageProcessing):
 			) -> Dict[str, Any]:
 		return super().get_batch(set_name, indexes)
 
+	def get_packed_batch(self, set_name: str, indexes: List[int], packed_length: int = 512) -> Dict[str, Any]:
+		'''Get a batch of data with specified ``indexes``, where multiple sentences are concatenated into
+		rows of fixed length ``packed_length``. It is only available for a
+		:ref:`pretrained field<pretrained_field_ref>` (``pretrained="gpt2"`` or ``pretrained="bert"``).
+		See :meth:`.SentenceGPT2.get_packed_batch` for the return value.
+
+		Arguments:
+			{SET_NAME_DESCRIPTION}
+			indexes (list): a list of specified indexes of batched data.
+			packed_length (int, optional): The length of each row. Default: ``512``.
+		'''
+		if set_name not in self.fields:
+			raise ValueError("No set named %s." % set_name)
+		field = self.fields[set_name]["sent"]
+		if not isinstance(field, (SentenceGPT2, SentenceBERT)):
+			raise RuntimeError("get_packed_batch is only supported when pretrained is gpt2 or bert.")
+		return field.get_packed_batch("sent", self.data[set_name]["sent"], indexes, packed_length)
+
 
 	GEN_LOG_PROB_KEY_ARGUMENTS = MetricBase.GEN_LOG_PROB_KEY_ARGUMENTS
 	def get_teacher_forcing_metric(self, gen_log_prob_key="gen_log_prob") -> "MetricChain":
@@ -365,13 +365,16 @@ class SwitchboardCorpus(MultiTurnDialog):
 			A :class:`.metric.MetricChain` object.
 		'''
 		from ..metric import MetricChain, BleuPrecisionRecallMetric, EmbSimilarityPrecisionRecallMetric
+		from ..metric.precision_recall import PairwiseBleuScorer
 		metric = MetricChain()
 		if word2vec is None:
 			glove = Glove("resources://Glove300d")
 			word2vec = glove.load_dict(self.frequent_vocab_list)
+		# the n-grams are counted once for the BLEU metrics of all orders
+		scorer = PairwiseBleuScorer(4)
 		for ngram in range(1, 5):
 			metric.add_metric(BleuPrecisionRecallMetric(self, ngram, generated_num_per_context, \
-														multiple_gen_key=multiple_gen_key))
+														multiple_gen_key=multiple_gen_key, scorer=scorer))
 		metric.add_metric(EmbSimilarityPrecisionRecallMetric(self, word2vec, \
 															 'avg', generated_num_per_context,
 															 multiple_gen_key=multiple_gen_key))
@@ -3,14 +3,10 @@ A module for single turn dialog.
 '''
 from collections import Counter, OrderedDict
 from itertools import chain
-import multiprocessing
-from multiprocessing import Pool
-import tqdm
 from typing import Optional, Any, List, Tuple, Dict
 
 import numpy as np
 
-from nltk.tokenize import WordPunctTokenizer
 from ..file_utils import get_resource_file_path
 from .dataloader import LanguageProcessing
 from .tokenizer import PretrainedTokenizer
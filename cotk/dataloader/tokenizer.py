@@ -4,12 +4,13 @@ import hashlib
 import tempfile
 import re
 
-from nltk.tokenize import WordPunctTokenizer
-from checksumdir import dirhash
-
 from .._utils.unordered_hash import dumps
 from .._utils.metaclass import DocStringInheritor
 from .._utils import chain_sessions, restore_sessions
+from .._utils.imports import LazyObject
+
+WordPunctTokenizer = LazyObject("nltk.tokenize.WordPunctTokenizer")
+dirhash = LazyObject("checksumdir.dirhash")
 
 class Tokenizer(metaclass=DocStringInheritor):
 	"""Tokenizer is used for spliting sentence to tokens.
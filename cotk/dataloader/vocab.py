@@ -192,15 +192,15 @@ class GeneralVocab(Vocab):
 			special_appeared_in_data: Optional[bool] = None):
 		super().__init__()
 
-		with VocabContext.set_parameters(\
-				min_frequent_vocab_times=min_frequent_vocab_times,\
-				min_rare_vocab_times=min_rare_vocab_times,\
-				special_tokens_mapping=special_tokens_mapping,\
-				special_appeared_in_data=special_appeared_in_data):
-			self.min_frequent_vocab_times: int = VocabContext.get("min_frequent_vocab_times", 0)
-			self.min_rare_vocab_times: int = VocabContext.get("min_rare_vocab_times", 0)
-			filled_special_tokens: Optional[OrderedDictType[str, str]] = VocabContext.get("special_tokens_mapping", None)
-			self.special_appeared_in_data: bool = VocabContext.get("special_appeared_in_data", False)
+		context = VocabContext.resolve({\
+				"min_frequent_vocab_times": min_frequent_vocab_times,\
+				"min_rare_vocab_times": min_rare_vocab_times,\
+				"special_tokens_mapping": special_tokens_mapping,\
+				"special_appeared_in_data": special_appeared_in_data})
+		self.min_frequent_vocab_times: int = context.get("min_frequent_vocab_times", 0)
+		self.min_rare_vocab_times: int = context.get("min_rare_vocab_times", 0)
+		filled_special_tokens: Optional[OrderedDictType[str, str]] = context.get("special_tokens_mapping", None)
+		self.special_appeared_in_data: bool = context.get("special_appeared_in_data", False)
 
 		self.special_tokens_mapping = filled_special_tokens or OrderedDict(
 			[("pad", "<pad>"), ("unk", "<unk>"), ("go", "<go>"), ("eos", "<eos>")]
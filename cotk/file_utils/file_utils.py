@@ -13,12 +13,13 @@ import logging
 import sys
 from pathlib import Path
 from urllib.parse import urlparse
-import requests
-
-from tqdm import tqdm
-from checksumdir import dirhash
 
 from .resource_processor import ResourceProcessor
+from .._utils.imports import LazyObject, LazyModule
+
+requests = LazyModule("requests", globals())
+tqdm = LazyObject("tqdm.tqdm")
+dirhash = LazyObject("checksumdir.dirhash")
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(level=logging.INFO)
@@ -1,18 +1,26 @@
 r"""
 Containing some classes and functions about bleu evaluating results of models.
 """
-from typing import Union, List, Any, Optional, Iterable, Dict
+from typing import Union, List, Any, Optional, Iterable, Dict, Tuple
+from itertools import chain
 import random
 import os
-import multiprocessing
-from multiprocessing import Pool
 import numpy as np
-import tqdm
-from nltk.translate.bleu_score import corpus_bleu, sentence_bleu, SmoothingFunction
 
 from .metric import MetricBase
+from .bleu_utils import BleuStatistics, check_bleu_engine, check_bootstrap_arguments, \
+	bootstrap_mean, confidence_interval
+from .worker_pool import get_worker_pool
 from ..dataloader.tokenizer import Tokenizer, SimpleTokenizer
+from ..dataloader.field import SentenceDefault
 from .._utils import replace_unk
+from .._utils.imports import LazyObject, LazyModule
+
+multiprocessing = LazyModule("multiprocessing", globals())
+tqdm = LazyModule("tqdm", globals())
+corpus_bleu = LazyObject("nltk.translate.bleu_score.corpus_bleu")
+sentence_bleu = LazyObject("nltk.translate.bleu_score.sentence_bleu")
+SmoothingFunction = LazyObject("nltk.translate.bleu_score.SmoothingFunction")
 
 if False: # for type check # disable: using-constant-test
 	from ..dataloader.dataloader import LanguageProcessing
@@ -30,6 +38,59 @@ def _sentence_bleu(ele):
 
 	return sentence_bleu(ele[0], ele[1], weights=ele[2], smoothing_function=SmoothingFunction().method1)
 
+def _indexed_sentence_bleu(data, i):
+	# Sentence bleu of ``hyps[i]`` against ``refs``, where ``data`` is (``refs``, ``hyps``, ``weights``).
+	refs, hyps, weights = data
+	return _sentence_bleu((refs, hyps[i], weights))
+
+def _leave_one_out_sentence_bleu(data, i):
+	# Sentence bleu of ``hyps[i]`` against ``refs`` except ``refs[i]``.
+	refs, hyps, weights = data
+	return _sentence_bleu((refs[:i] + refs[i+1:], hyps[i], weights))
+
+def _sentence_bleu_list(func, data, num, cpu_count):
+	# Compute ``func(data, i)`` for ``i`` in ``range(num)``, using the shared worker pool for large inputs.
+	values: Iterable[Any]
+	if num >= 1000 and cpu_count > 1:
+		# use multiprocessing
+		values = get_worker_pool().imap(func, data, num, cpu_count)
+	else:
+		values = (func(data, i) for i in range(num))
+	if num >= 1000:
+		# use tqdm
+		values = tqdm.tqdm(values, total=num)
+	return list(values)
+
+def _remove_special_in_batch(dataloader: Union["LanguageProcessing", "Sentence", "Session"], \
+		sentences: Union[List[Any], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+	# Return the concatenated ids and the lengths of ``dataloader.remove_special_in_ids(sent)`` for ``sentences``.
+	# The special tokens of SentenceDefault (and SessionDefault) are removed on a padded array at once.
+	field = dataloader.get_default_field() if hasattr(dataloader, "get_default_field") else dataloader
+	if type(field).remove_special_in_ids is not SentenceDefault.remove_special_in_ids or \
+			type(field).trim_in_ids is not SentenceDefault.trim_in_ids:
+		sentences = [dataloader.remove_special_in_ids(sent) for sent in sentences]
+		lengths = np.array([len(sent) for sent in sentences], dtype=np.int64)
+		return np.fromiter(chain.from_iterable(sentences), dtype=np.int64, count=int(lengths.sum())), lengths
+
+	if isinstance(sentences, np.ndarray) and sentences.ndim == 2:
+		ids = sentences.astype(np.int64)
+	else:
+		lengths = np.array([len(sent) for sent in sentences], dtype=np.int64)
+		ids = np.full((len(sentences), max(lengths, default=0)), field.pad_id, dtype=np.int64)
+		ids[np.arange(ids.shape[1])[None, :] < lengths[:, None]] = \
+			np.fromiter(chain.from_iterable(sentences), dtype=np.int64, count=int(lengths.sum()))
+	if ids.shape[1] == 0:
+		return np.zeros(0, dtype=np.int64), np.zeros(len(ids), dtype=np.int64)
+	columns = np.arange(ids.shape[1])[None, :]
+	# trim_in_ids: remove the tokens from the first eos, then remove the trailing pads
+	is_eos = ids == field.eos_id
+	ends = np.where(is_eos.any(axis=1), is_eos.argmax(axis=1), ids.shape[1])
+	kept = (ids != field.pad_id) & (columns < ends[:, None])
+	ends = np.where(kept.any(axis=1), ids.shape[1] - kept[:, ::-1].argmax(axis=1), 0)
+	# _remove_special_in_ids: remove the go at the beginning, and there is no eos at the end after trimming
+	starts = ((ends > 0) & (ids[:, 0] == field.go_id)).astype(np.int64)
+	return ids[(columns >= starts[:, None]) & (columns < ends[:, None])], ends - starts
+
 class BleuCorpusMetric(MetricBase):
 	'''Metric for calculating BLEU.
 
@@ -43,6 +104,11 @@ class BleuCorpusMetric(MetricBase):
 		{MetricBase.REFERENCE_ALLVOCABS_KEY_ARGUMENTS}
 		{MetricBase.GEN_KEY_ARGUMENTS}
 		reference_str_key (str, optional): The key of reference sentences in the string form. Default: ``ref_str``.
+		{MetricBase.BLEU_ENGINE_ARGUMENTS}
+		{MetricBase.BOOTSTRAP_SAMPLES_ARGUMENTS} The ``native`` engine keeps the BLEU statistics of
+			every sentence instead of the running sums when it is positive.
+		{MetricBase.CONFIDENCE_ARGUMENTS}
+		{MetricBase.SEED_ARGUMENTS} It is only used by bootstrap.
 
 	Here is an example:
 
@@ -72,9 +138,15 @@ class BleuCorpusMetric(MetricBase):
 	def __init__(self, dataloader: Union["LanguageProcessing", "Sentence", "Session"], ngram: int =4, *, \
 			tokenizer: Union[None, Tokenizer, str] = None, reference_num: Optional[int] = 1, \
 			ignore_smoothing_error: bool = False, reference_allvocabs_key: str = "ref_allvocabs", \
-			gen_key: str = "gen", reference_str_key: str = "ref_str"):
+			gen_key: str = "gen", reference_str_key: str = "ref_str", engine: str = "native", \
+			bootstrap_samples: int = 0, confidence: float = 0.95, seed: int = 1229):
 		super().__init__(self._name, self._version)
 		#self._hash_ordered_data(self.ngram)
+		check_bleu_engine(engine)
+		check_bootstrap_arguments(bootstrap_samples, confidence)
+		if bootstrap_samples:
+			# the confidence interval depends on the resamples
+			self._hash_ordered_data(seed)
 		self.dataloader = dataloader
 		self.ngram = ngram
 		self.tokenizer = tokenizer
@@ -83,6 +155,15 @@ class BleuCorpusMetric(MetricBase):
 		self.reference_allvocabs_key = reference_allvocabs_key
 		self.reference_str_key = reference_str_key
 		self.gen_key = gen_key
+		self.engine = engine
+		self.bootstrap_samples = bootstrap_samples
+		self.confidence = confidence
+		self.seed = seed
+		# the ``native`` engine only keeps the running sums of BLEU statistics (or the statistics of
+		# every sentence for bootstrap), while the ``nltk`` engine keeps all the sentences.
+		self.statistics: Optional[BleuStatistics] = None
+		# the statistics of the batches forwarded since they were last concatenated (for bootstrap)
+		self._batch_statistics: List[BleuStatistics] = []
 		self.hyps: List[Any] = []
 		self.refs: List[List[Any]] = []
 
@@ -121,8 +202,12 @@ class BleuCorpusMetric(MetricBase):
 
 		if len(resp) != len(gen):
 			raise ValueError("Batch num is not matched.")
+		if self.engine == "native":
+			self._id_forward(gen, resp)
+			return
 
 		relevant_data = []
+		batch_hyps, batch_refs = [], []
 		for gen_sen, resp_sen in zip(gen, resp):
 			hyp = self.dataloader.convert_ids_to_tokens(gen_sen, remove_special=True, trim=True)
 			if self.reference_num == 1:
@@ -131,10 +216,63 @@ class BleuCorpusMetric(MetricBase):
 				if self.reference_num is not None and len(resp_sen) != self.reference_num:
 					raise RuntimeError("Require %d references but get %d" % (self.reference_num, len(resp_sen)))
 				refs = [self.dataloader.convert_ids_to_tokens(resp_single_sen, remove_special=True, trim=True) for resp_single_sen in resp_sen]
-			self.hyps.append(hyp)
-			self.refs.append(refs)
+			batch_hyps.append(hyp)
+			batch_refs.append(refs)
 			relevant_data.append(refs)
 		self._hash_unordered_list(relevant_data)
+		self._add_batch(batch_hyps, batch_refs)
+
+	def _id_forward(self, gen: Union[List[Any], np.ndarray], resp: Union[List[Any], np.ndarray]):
+		# The same as the string path of ``_direct_forward``, but BLEU is computed on word ids,
+		# which are trimmed on arrays and never converted to tokens except for hashing.
+		if self.reference_num == 1:
+			refs = resp
+			ref_nums = np.ones(len(resp), dtype=np.int64)
+		else:
+			for resp_sen in resp:
+				if self.reference_num is not None and len(resp_sen) != self.reference_num:
+					raise RuntimeError("Require %d references but get %d" % (self.reference_num, len(resp_sen)))
+			if isinstance(resp, np.ndarray) and resp.ndim == 3:
+				refs = resp.reshape(-1, resp.shape[2])
+			else:
+				refs = [resp_single_sen for resp_sen in resp for resp_single_sen in resp_sen]
+			ref_nums = np.array([len(resp_sen) for resp_sen in resp], dtype=np.int64)
+		hyp_ids, hyp_lengths = _remove_special_in_batch(self.dataloader, gen)
+		ref_ids, ref_lengths = _remove_special_in_batch(self.dataloader, refs)
+
+		# hash the reference tokens as the string path does
+		tokens = self.dataloader.convert_ids_to_tokens(ref_ids.tolist(), remove_special=False, trim=False)
+		ref_offsets = np.concatenate([[0], np.cumsum(ref_lengths)]).tolist()
+		ref_tokens = [tokens[start:end] for start, end in zip(ref_offsets[:-1], ref_offsets[1:])]
+		sample_offsets = np.concatenate([[0], np.cumsum(ref_nums)]).tolist()
+		self._hash_unordered_list([ref_tokens[start:end] for start, end in zip(sample_offsets[:-1], sample_offsets[1:])])
+
+		if len(hyp_lengths) == 0:
+			return
+		# the code of a word is its id plus 1, and unknown words in hypotheses (``-1`` in replace_unk) get 0
+		hyp_codes = hyp_ids + 1
+		if "unk" in self.dataloader.get_special_tokens_mapping():
+			hyp_codes[hyp_ids == self.dataloader.unk_id] = 0
+		statistics = BleuStatistics.compute_encoded(np.concatenate([hyp_codes, ref_ids + 1]), \
+			np.concatenate([hyp_lengths, ref_lengths]), \
+			np.repeat(np.arange(len(hyp_lengths), dtype=np.int64), ref_nums), self.ngram)
+		self._add_statistics(statistics)
+
+	def _add_statistics(self, statistics: BleuStatistics):
+		if self.bootstrap_samples:
+			# concatenated once in :meth:`_merge_statistics`, instead of copying all the sentences every batch
+			self._batch_statistics.append(statistics)
+			return
+		if self.statistics is not None:
+			statistics = BleuStatistics.concatenate([self.statistics, statistics])
+		self.statistics = statistics.sum()
+
+	def _merge_statistics(self):
+		if self._batch_statistics:
+			if self.statistics is not None:
+				self._batch_statistics.insert(0, self.statistics)
+			self.statistics = BleuStatistics.concatenate(self._batch_statistics)
+			self._batch_statistics = []
 
 	def _re_tokenize_forward(self, data: Dict[str, Any]):
 		gen = data[self.gen_key]
@@ -146,6 +284,7 @@ class BleuCorpusMetric(MetricBase):
 		#fill more typeerror hints
 
 		relevant_data = []
+		batch_hyps, batch_refs = [], []
 		for i, gen_sen in enumerate(gen):
 			hyp = self.dataloader.convert_ids_to_sentence(gen_sen, remove_special=True, trim=True)
 			if resp_str:
@@ -162,42 +301,67 @@ class BleuCorpusMetric(MetricBase):
 					if self.reference_num is not None and len(resp[i]) != self.reference_num:
 						raise RuntimeError("Require %d references but get %d" % (self.reference_num, len(resp[i])))
 					refs = [self.dataloader.convert_ids_to_sentence(resp_single_sen, remove_special=True, trim=True) for resp_single_sen in resp[i]]
-			self.hyps.append(hyp)
-			self.refs.append(refs)
+			batch_hyps.append(hyp)
+			batch_refs.append(refs)
 			relevant_data.append(refs)
 		self._hash_unordered_list(relevant_data)
+		self._add_batch(batch_hyps, batch_refs)
 
-	def close(self) -> Dict[str, Any]:
-		'''Return a dict which contains
+	def _add_batch(self, hyps: List[Any], refs: List[List[Any]]):
+		if self.tokenizer:
+			hyps, refs = self._do_tokenize(hyps, refs)
+		if "unk" in self.dataloader.get_special_tokens_mapping():
+			hyps = replace_unk(hyps, self.dataloader.get_special_tokens_mapping()["unk"])
 
-			* **bleu**: bleu value.
-			* **bleu hashvalue**: hash value for bleu metric, same hash value stands
-			  for same evaluation settings.
+		if self.engine == "nltk":
+			self.hyps.extend(hyps)
+			self.refs.extend(refs)
+		elif hyps:
+			self._add_statistics(BleuStatistics.compute(refs, hyps, self.ngram))
+
+	def peek(self) -> Dict[str, Any]:
+		'''Return the BLEU of the data forwarded so far, without closing the metric.
+		The returned dict contains the same keys as :meth:`close`.
 		'''
-		result = super().close()
-		if (not self.hyps) or (not self.refs):
+		self._merge_statistics()
+		if self.statistics is None and ((not self.hyps) or (not self.refs)):
 			raise RuntimeError("The metric has not been forwarded data correctly.")
 
-		if self.tokenizer:
-			self._do_tokenize()
-
-		if "unk" in self.dataloader.get_special_tokens_mapping():
-			self.hyps = replace_unk(self.hyps, self.dataloader.get_special_tokens_mapping()["unk"])
 		try:
 			weights = np.ones(self.ngram) / self.ngram
-			result.update({"bleu": \
-				corpus_bleu(self.refs, self.hyps, weights=weights, smoothing_function=SmoothingFunction().method3), \
-				"bleu hashvalue": self._hashvalue()})
+			if self.statistics is not None:
+				bleu = self.statistics.corpus_bleu(weights)
+			else:
+				bleu = corpus_bleu(self.refs, self.hyps, weights=weights, smoothing_function=SmoothingFunction().method3)
 		except ZeroDivisionError as _:
 			if not self.ignore_smoothing_error:
 				raise ZeroDivisionError("Bleu smoothing divided by zero. This is a known bug of corpus_bleu, \
 				usually caused when there is only one sample and the sample length is 1.") from None
-			result.update({"bleu": \
-					0, \
-					"bleu hashvalue": self._hashvalue()})
+			bleu = 0
+		result = {"bleu": bleu, "bleu hashvalue": self._hashvalue()}
+		if self.bootstrap_samples:
+			statistics = self.statistics
+			if statistics is None:
+				statistics = BleuStatistics.compute(self.refs, self.hyps, self.ngram)
+			samples = statistics.bootstrap_corpus_bleu(weights, self.bootstrap_samples, self.seed)
+			result["bleu confidence interval"] = confidence_interval(samples, self.confidence)
 		return result
 
-	def _do_tokenize(self):
+	def close(self) -> Dict[str, Any]:
+		'''Return a dict which contains
+
+			* **bleu**: bleu value.
+			* **bleu hashvalue**: hash value for bleu metric, same hash value stands
+			  for same evaluation settings.
+			* **bleu confidence interval**: the bootstrap confidence interval of bleu, as ``(low, high)``.
+			  Only returned if ``bootstrap_samples`` is positive. The sentences are resampled
+			  with ``seed``, and their n-grams are never counted again.
+		'''
+		result = super().close()
+		result.update(self.peek())
+		return result
+
+	def _do_tokenize(self, hyps: List[str], refs: List[List[str]]):
 		tokenizer: Tokenizer
 		if isinstance(self.tokenizer, str):
 			tokenizer = SimpleTokenizer(self.tokenizer)
@@ -206,8 +370,7 @@ class BleuCorpusMetric(MetricBase):
 		else:
 			raise TypeError("Unknown type of tokenizer")
 
-		self.refs = tokenizer.tokenize_sessions(self.refs)
-		self.hyps = tokenizer.tokenize_sentences(self.hyps)
+		return tokenizer.tokenize_sentences(hyps), tokenizer.tokenize_sessions(refs)
 
 
 class SelfBleuCorpusMetric(MetricBase):
@@ -221,6 +384,11 @@ class SelfBleuCorpusMetric(MetricBase):
 		{MetricBase.SAMPLE_ARGUMENTS_IN_BLEU}
 		{MetricBase.SEED_ARGUMENTS}
 		{MetricBase.CPU_COUNT_ARGUMENTS}
+		{MetricBase.BLEU_ENGINE_ARGUMENTS} The ``native`` engine computes Self-BLEU for all samples
+			from one n-gram count index, which makes it feasible for a large ``sample``.
+			Multiprocessing is only used by the ``nltk`` engine.
+		{MetricBase.BOOTSTRAP_SAMPLES_ARGUMENTS}
+		{MetricBase.CONFIDENCE_ARGUMENTS}
 
 	Warning:
 		the calculation of ``hashvalue`` considers the actual sample size of hypotheses which
@@ -249,8 +417,13 @@ class SelfBleuCorpusMetric(MetricBase):
 		gen_key: str = "gen", \
 		sample: int = 1000, \
 		seed: int = 1229, \
-		cpu_count: Optional[int] = None):
+		cpu_count: Optional[int] = None, \
+		engine: str = "native", \
+		bootstrap_samples: int = 0, \
+		confidence: float = 0.95):
 		super().__init__(self._name, self._version)
+		check_bleu_engine(engine)
+		check_bootstrap_arguments(bootstrap_samples, confidence)
 		self.dataloader = dataloader
 		self.ngram = ngram
 		self.tokenizer = tokenizer
@@ -258,6 +431,9 @@ class SelfBleuCorpusMetric(MetricBase):
 		self.sample = sample
 		self.hyps: List[Any] = []
 		self.seed = seed
+		self.engine = engine
+		self.bootstrap_samples = bootstrap_samples
+		self.confidence = confidence
 		if cpu_count is not None:
 			self.cpu_count = cpu_count
 		elif "CPU_COUNT" in os.environ and os.environ["CPU_COUNT"] is not None:
@@ -295,6 +471,9 @@ class SelfBleuCorpusMetric(MetricBase):
 			* **self-bleu**: self-bleu value.
 			* **self-bleu hashvalue**: hash value for self-bleu metric, same hash value stands
 			  for same evaluation settings.
+			* **self-bleu confidence interval**: the bootstrap confidence interval of self-bleu,
+			  as ``(low, high)``. Only returned if ``bootstrap_samples`` is positive. The sentence BLEU
+			  of the samples are resampled, while the references of each sample are fixed.
 		'''
 		res = super().close()
 		if not self.hyps:
@@ -308,10 +487,7 @@ class SelfBleuCorpusMetric(MetricBase):
 		if self.sample > len(self.hyps):
 			self.sample = len(self.hyps)
 
-		rng_state = random.getstate()
-		random.seed(self.seed)
-		random.shuffle(self.hyps)
-		random.setstate(rng_state)
+		random.Random(self.seed).shuffle(self.hyps)
 
 		ref = self.hyps[:self.sample]
 
@@ -331,32 +507,19 @@ class SelfBleuCorpusMetric(MetricBase):
 		else:
 			_ref = ref
 
-		bleu_irl = []
-
 		weights = np.ones(self.ngram) / self.ngram
-		tasks = ((ref[:i]+ref[i+1:self.sample], _ref[i], weights) for i in range(self.sample))
-
-		pool: Optional[Any]
-		values: Iterable[Any]
-		if self.sample >= 1000 and self.cpu_count > 1:
-			# use multiprocessing
-			pool = Pool(self.cpu_count)
-			values = pool.imap_unordered(_sentence_bleu, tasks, chunksize=20)
+		bleu_irl: List[float]
+		if self.engine == "native":
+			bleu_irl = BleuStatistics.compute_shared(ref, _ref, self.ngram, leave_one_out=True).sentence_bleu(weights)
 		else:
-			pool = None
-			values = map(_sentence_bleu, tasks)
-		if self.sample >= 1000:
-			# use tqdm
-			values = tqdm.tqdm(values, total=self.sample)
-		for ans in values:
-			bleu_irl.append(ans)
-		if pool is not None:
-			pool.close()
-			pool.join()
+			bleu_irl = _sentence_bleu_list(_leave_one_out_sentence_bleu, (ref, _ref, weights), self.sample, self.cpu_count)
 
 		self._hash_ordered_data((self.seed, self.sample))
 		res.update({"self-bleu" : 1.0 * sum(bleu_irl) / len(bleu_irl),\
 					"self-bleu hashvalue": self._hashvalue()})
+		if self.bootstrap_samples:
+			res["self-bleu confidence interval"] = confidence_interval( \
+				bootstrap_mean(bleu_irl, self.bootstrap_samples, self.seed), self.confidence)
 		return res
 
 class FwBwBleuCorpusMetric(MetricBase):
@@ -371,6 +534,11 @@ class FwBwBleuCorpusMetric(MetricBase):
 		{MetricBase.SAMPLE_ARGUMENTS_IN_BLEU}
 		{MetricBase.SEED_ARGUMENTS}
 		{MetricBase.CPU_COUNT_ARGUMENTS}
+		{MetricBase.BLEU_ENGINE_ARGUMENTS} The ``native`` engine scores all hypotheses (references)
+			against one n-gram count index of references (hypotheses), which makes it feasible for a large ``sample``.
+			Multiprocessing is only used by the ``nltk`` engine.
+		{MetricBase.BOOTSTRAP_SAMPLES_ARGUMENTS}
+		{MetricBase.CONFIDENCE_ARGUMENTS}
 	Warning:
 		The calculation of ``hashvalue`` considers the actual sample size of hypotheses and
 		references. Therefore ``hashvalue`` may vary with the size of hypothesis or references
@@ -404,8 +572,13 @@ class FwBwBleuCorpusMetric(MetricBase):
 			gen_key: str = "gen", \
 			sample: int = 1000, \
 			seed: int = 1229, \
-			cpu_count: Optional[int] = None):
+			cpu_count: Optional[int] = None, \
+			engine: str = "native", \
+			bootstrap_samples: int = 0, \
+			confidence: float = 0.95):
 		super().__init__(self._name, self._version)
+		check_bleu_engine(engine)
+		check_bootstrap_arguments(bootstrap_samples, confidence)
 		self.dataloader = dataloader
 		self.tokenizer = tokenizer
 		self.reference_test_list = reference_test_list
@@ -413,6 +586,9 @@ class FwBwBleuCorpusMetric(MetricBase):
 		self.sample = sample
 		self.seed = seed
 		self.ngram=ngram
+		self.engine = engine
+		self.bootstrap_samples = bootstrap_samples
+		self.confidence = confidence
 		if cpu_count is not None:
 			self.cpu_count = cpu_count
 		elif "CPU_COUNT" in os.environ and os.environ["CPU_COUNT"] is not None:
@@ -453,6 +629,10 @@ class FwBwBleuCorpusMetric(MetricBase):
 			* **fw-bw-bleu**: harmony mean of fw/bw bleu value.
 			* **fw-bw-bleu hashvalue**: hash value for fwbwbleu metric, same hash value stands
 			  for same evaluation settings.
+			* **fw-bleu confidence interval**, **bw-bleu confidence interval**, **fw-bw-bleu confidence interval**:
+			  the bootstrap confidence intervals, as ``(low, high)``. Only returned if ``bootstrap_samples``
+			  is positive. The sentence BLEU of hypotheses and references are resampled independently,
+			  while the sentences they are scored against are fixed.
 		'''
 		res = super().close()
 		if not self.hyps:
@@ -493,50 +673,23 @@ class FwBwBleuCorpusMetric(MetricBase):
 			refs = [self.dataloader.convert_ids_to_tokens(ids, remove_special=True, trim=True) for ids in sample_refs]
 			hyps = [self.dataloader.convert_ids_to_tokens(ids, remove_special=True, trim=True) for ids in sample_hyps]
 
-		rng_state = random.getstate()
-		random.seed(self.seed)
-		random.shuffle(hyps)
-		random.shuffle(refs)
-		random.setstate(rng_state)
+		rng = random.Random(self.seed)
+		rng.shuffle(hyps)
+		rng.shuffle(refs)
 
 		if "unk" in self.dataloader.get_special_tokens_mapping():
 			refs = replace_unk(refs, self.dataloader.get_special_tokens_mapping()["unk"])
 
 
-		bleu_irl_fw, bleu_irl_bw = [], []
 		weights = np.ones(self.ngram) / self.ngram
-
-		tasks = ((refs, hyps[i], weights) for i in range(sample_hyps_num))
-		pool: Optional[Any]
-		values: Iterable[Any]
-		if sample_hyps_num >= 1000 and self.cpu_count > 1:
-			pool = Pool(self.cpu_count)
-			values = pool.imap_unordered(_sentence_bleu, tasks, chunksize=20)
-		else:
-			pool = None
-			values = map(_sentence_bleu, tasks)
-		if sample_hyps_num >= 1000:
-			values = tqdm.tqdm(values, total=sample_hyps_num)
-		for ans in values:
-			bleu_irl_fw.append(ans)
-		if pool is not None:
-			pool.close()
-			pool.join()
-
-		tasks = ((hyps, refs[i], weights) for i in range(sample_refs_num))
-		if sample_refs_num >= 1000 and self.cpu_count > 1:
-			pool = Pool(self.cpu_count)
-			values = pool.imap_unordered(_sentence_bleu, tasks, chunksize=20)
+		bleu_irl_fw: List[float]
+		bleu_irl_bw: List[float]
+		if self.engine == "native":
+			bleu_irl_fw = BleuStatistics.compute_shared(refs, hyps, self.ngram).sentence_bleu(weights)
+			bleu_irl_bw = BleuStatistics.compute_shared(hyps, refs, self.ngram).sentence_bleu(weights)
 		else:
-			pool = None
-			values = map(_sentence_bleu, tasks)
-		if sample_refs_num >= 1000:
-			values = tqdm.tqdm(values, total=sample_refs_num)
-		for ans in values:
-			bleu_irl_bw.append(ans)
-		if pool is not None:
-			pool.close()
-			pool.join()
+			bleu_irl_fw = _sentence_bleu_list(_indexed_sentence_bleu, (refs, hyps, weights), sample_hyps_num, self.cpu_count)
+			bleu_irl_bw = _sentence_bleu_list(_indexed_sentence_bleu, (hyps, refs, weights), sample_refs_num, self.cpu_count)
 
 		fw_bleu = (1.0 * sum(bleu_irl_fw) / len(bleu_irl_fw))
 		bw_bleu = (1.0 * sum(bleu_irl_bw) / len(bleu_irl_bw))
@@ -553,6 +706,16 @@ class FwBwBleuCorpusMetric(MetricBase):
 		self._hash_unordered_list(refs)
 		self._hash_ordered_data((self.ngram, self.seed, sample_hyps_num, sample_refs_num))
 		res.update({"fw-bw-bleu hashvalue" : self._hashvalue()})
+
+		if self.bootstrap_samples:
+			fw_samples = bootstrap_mean(bleu_irl_fw, self.bootstrap_samples, self.seed)
+			bw_samples = bootstrap_mean(bleu_irl_bw, self.bootstrap_samples, self.seed + 1)
+			total = fw_samples + bw_samples
+			fw_bw_samples = np.divide(2.0 * fw_samples * bw_samples, total, out=np.zeros_like(total), where=total > 0)
+			res.update({"fw-bleu confidence interval": confidence_interval(fw_samples, self.confidence), \
+				"bw-bleu confidence interval": confidence_interval(bw_samples, self.confidence), \
+				"fw-bw-bleu confidence interval": confidence_interval(fw_bw_samples, self.confidence) \
+			})
 		return res
 
 class MultiTurnBleuCorpusMetric(MetricBase):
@@ -564,6 +727,7 @@ class MultiTurnBleuCorpusMetric(MetricBase):
 		{MetricBase.MULTI_TURN_REFERENCE_ALLVOCABS_KEY_ARGUMENTS}
 		{MetricBase.MULTI_TURN_GEN_KEY_ARGUMENTS}
 		{MetricBase.MULTI_TURN_LENGTH_KEY_ARGUMENTS}
+		{MetricBase.BLEU_ENGINE_ARGUMENTS}
 
 	Here is an example:
 
@@ -600,14 +764,18 @@ class MultiTurnBleuCorpusMetric(MetricBase):
 					ignore_smoothing_error: bool = False,\
 					multi_turn_reference_allvocabs_key: str = "reference_allvocabs", \
 					multi_turn_gen_key: str = "multi_turn_gen", \
-					turn_len_key: str = "turn_length" \
+					turn_len_key: str = "turn_length", \
+					engine: str = "native" \
 			  ):
 		super().__init__(self._name, self._version)
+		check_bleu_engine(engine)
 		self.dataloader = dataloader
 		self.ignore_smoothing_error = ignore_smoothing_error
 		self.multi_turn_reference_allvocabs_key = multi_turn_reference_allvocabs_key
 		self.turn_len_key = turn_len_key
 		self.multi_turn_gen_key = multi_turn_gen_key
+		self.engine = engine
+		self.statistics: Optional[BleuStatistics] = None
 		self.refs = []
 		self.hyps = []
 
@@ -646,12 +814,43 @@ class MultiTurnBleuCorpusMetric(MetricBase):
 		if len(length) != len(reference_allvocabs) or len(length) != len(gen):
 			raise ValueError("Batch num is not matched.")
 
+		hyps, refs = [], []
 		for i, turn_length in enumerate(length):
 			gen_session = gen[i]
 			ref_session = reference_allvocabs[i]
 			for j in range(turn_length):
-				self.hyps.append(list(self.dataloader.trim_in_ids(gen_session[j])))
-				self.refs.append([list(self.dataloader.trim_in_ids(ref_session[j])[1:])])
+				hyps.append(list(self.dataloader.trim_in_ids(gen_session[j])))
+				refs.append([list(self.dataloader.trim_in_ids(ref_session[j])[1:])])
+		self._hash_unordered_list(refs)
+		hyps = replace_unk(hyps, self.dataloader.unk_id)
+
+		if self.engine == "nltk":
+			self.hyps.extend(hyps)
+			self.refs.extend(refs)
+		elif hyps:
+			statistics = BleuStatistics.compute(refs, hyps, 4)
+			if self.statistics is not None:
+				statistics = BleuStatistics.concatenate([self.statistics, statistics])
+			self.statistics = statistics.sum()
+
+	def peek(self) -> Dict[str, Any]:
+		'''Return the BLEU of the data forwarded so far, without closing the metric.
+		The returned dict contains the same keys as :meth:`close`.
+		'''
+		if self.statistics is None and ((not self.hyps) or (not self.refs)):
+			raise RuntimeError("The metric has not been forwarded data correctly.")
+
+		try:
+			if self.statistics is not None:
+				bleu = self.statistics.corpus_bleu((0.25, 0.25, 0.25, 0.25))
+			else:
+				bleu = corpus_bleu(self.refs, self.hyps, smoothing_function=SmoothingFunction().method3)
+		except ZeroDivisionError as _:
+			if not self.ignore_smoothing_error:
+				raise ZeroDivisionError("Bleu smoothing divided by zero. This is a known bug of corpus_bleu, \
+				usually caused when there is only one sample and the sample length is 1.")
+			bleu = 0
+		return {"bleu": bleu, "bleu hashvalue": self._hashvalue()}
 
 	def close(self) -> Dict[str, Any]:
 		'''Return a dict which contains
@@ -661,21 +860,5 @@ class MultiTurnBleuCorpusMetric(MetricBase):
 			  for same evaluation settings.
 		'''
 		result = super().close()
-		if (not self.hyps) or (not self.refs):
-			raise RuntimeError("The metric has not been forwarded data correctly.")
-		self.hyps = replace_unk(self.hyps, self.dataloader.unk_id)
-
-		self._hash_unordered_list(self.refs)
-
-		try:
-			result.update({"bleu": \
-				corpus_bleu(self.refs, self.hyps, smoothing_function=SmoothingFunction().method3), \
-				"bleu hashvalue": self._hashvalue()})
-		except ZeroDivisionError as _:
-			if not self.ignore_smoothing_error:
-				raise ZeroDivisionError("Bleu smoothing divided by zero. This is a known bug of corpus_bleu, \
-				usually caused when there is only one sample and the sample length is 1.")
-			result.update({"bleu": \
-					0, \
-					"bleu hashvalue": self._hashvalue()})
+		result.update(self.peek())
 		return result
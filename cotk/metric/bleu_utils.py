@@ -0,0 +1,453 @@
+r"""
+``cotk.metric.bleu_utils`` provides a native BLEU engine working on n-gram counts,
+which gives the same results as ``nltk.translate.bleu_score``.
+"""
+from typing import List, Any, Sequence, Tuple, Iterator, Union, Optional
+from itertools import chain
+import math
+
+import numpy as np
+
+BLEU_ENGINES = ["native", "nltk"]
+
+def _encode_sentences(sentences: List[Sequence[Any]]) -> Tuple[np.ndarray, np.ndarray]:
+	'''Concatenate the tokens of ``sentences`` into a 1-d array of dense integer codes.
+	Two tokens have the same code if and only if they are equal.
+
+	Returns:
+		(:class:`numpy.ndarray`, :class:`numpy.ndarray`): codes of tokens and lengths of sentences.
+	'''
+	lengths = np.array([len(sent) for sent in sentences], dtype=np.int64)
+	flat = list(chain.from_iterable(sentences))
+	if not flat:
+		return np.zeros(0, dtype=np.int64), lengths
+	tokens = np.array(flat)
+	if tokens.ndim != 1 or tokens.dtype.kind not in "iub":
+		# strings or mixed types (e.g. ``-1`` for unknown words in token lists)
+		vocab = {}
+		tokens = np.array([vocab.setdefault(token, len(vocab)) for token in flat], dtype=np.int64)
+	_, codes = np.unique(tokens, return_inverse=True)
+	return codes.astype(np.int64).reshape(-1), lengths
+
+def _iter_ngram_codes(codes: np.ndarray, lengths: np.ndarray, max_order: int) \
+		-> Iterator[Tuple[int, np.ndarray, np.ndarray, int]]:
+	'''Yield ``(n, ngram_codes, valid, bound)`` for ``n`` in ``1..max_order``.
+	``ngram_codes[i]`` (less than ``bound``) is a code of the n-gram starting at position ``i``,
+	and ``valid[i]`` indicates whether the n-gram is inside a sentence.
+	The codes of n-grams are extended from the codes of (n-1)-grams, so equal codes always stand for equal n-grams.
+	The codes are re-numbered only when ``sentence_num * bound`` may overflow ``int64``.
+	It never exceeds ``2 ** 62``, unless ``sentence_num * len(codes)`` does.
+	'''
+	total = len(codes)
+	ends = np.repeat(np.cumsum(lengths), lengths)
+	positions = np.arange(total, dtype=np.int64)
+	vocab_size = int(codes.max()) + 1 if total else 1
+	limit = 2 ** 62 // max(len(lengths), 1)
+	if vocab_size > limit:
+		_, codes = np.unique(codes, return_inverse=True)
+		codes = codes.astype(np.int64).reshape(-1)
+		vocab_size = int(codes.max()) + 1
+	ngram_codes, bound = codes, vocab_size
+	for n in range(1, max_order + 1):
+		if n > total:
+			yield n, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool), 1
+			continue
+		if n > 1:
+			if bound * vocab_size > limit:
+				_, ngram_codes = np.unique(ngram_codes, return_inverse=True)
+				ngram_codes = ngram_codes.astype(np.int64).reshape(-1)
+				bound = int(ngram_codes.max()) + 1
+			if bound * vocab_size <= limit:
+				ngram_codes = ngram_codes[:total - n + 1] * vocab_size + codes[n - 1:]
+				bound *= vocab_size
+			else:
+				# the vocabulary is too large, so number the pairs of codes by their ranks
+				pairs = np.stack([ngram_codes[:total - n + 1], codes[n - 1:]], axis=1)
+				_, ngram_codes = np.unique(pairs, axis=0, return_inverse=True)
+				ngram_codes = ngram_codes.astype(np.int64).reshape(-1)
+				bound = int(ngram_codes.max()) + 1
+			assert bound <= max(limit, total), "n-gram codes overflow"
+		yield n, ngram_codes, positions[:total - n + 1] + n <= ends[:total - n + 1], bound
+
+def _group_max(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	'''Return the sorted unique ``keys`` and the maximum of ``values`` in each group.'''
+	if len(keys) == 0:
+		return keys, values
+	order = np.argsort(keys, kind="stable")
+	keys, values = keys[order], values[order]
+	starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+	return keys[starts], np.maximum.reduceat(values, starts)
+
+def _lookup(keys: np.ndarray, table_keys: np.ndarray, table_values: np.ndarray) -> np.ndarray:
+	'''Return the values of ``keys`` in a table with sorted ``table_keys``. Missing keys get ``0``.'''
+	if len(table_keys) == 0:
+		return np.zeros(len(keys), dtype=np.int64)
+	idx = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+	return np.where(table_keys[idx] == keys, table_values[idx], 0)
+
+def _closest_lengths(hyp_lengths: np.ndarray, ref_lengths: np.ndarray, \
+		excluded_lengths: Optional[np.ndarray] = None) -> np.ndarray:
+	'''Return the closest reference length (the shorter one if there is a tie) for each hypothesis,
+	where all hypotheses share ``ref_lengths``. If ``excluded_lengths`` is not ``None``,
+	one reference of length ``excluded_lengths[i]`` is not available to the i-th hypothesis.
+	'''
+	lengths, counts = np.unique(ref_lengths, return_counts=True)
+	pos = np.searchsorted(lengths, hyp_lengths)
+	# the closest available length is one of lengths[pos - 2: pos + 2]
+	candidates = pos[:, None] + np.arange(-2, 2)[None, :]
+	available = (candidates >= 0) & (candidates < len(lengths))
+	candidates = np.clip(candidates, 0, len(lengths) - 1)
+	if excluded_lengths is not None:
+		available &= counts[candidates] - (lengths[candidates] == excluded_lengths[:, None]) > 0
+	candidate_lengths = lengths[candidates]
+	# sort key: (distance, length), unavailable candidates are put at last
+	key = np.abs(candidate_lengths - hyp_lengths[:, None]) * (2 * int(lengths[-1]) + 2) + candidate_lengths
+	key = np.where(available, key, np.iinfo(np.int64).max)
+	return candidate_lengths[np.arange(len(hyp_lengths)), np.argmin(key, axis=1)]
+
+def bleu_score(numerators: Sequence[int], denominators: Sequence[int], hyp_length: int, ref_length: int, \
+		weights: Sequence[float], smoothing: str = "method3") -> float:
+	'''Compute BLEU from the sufficient statistics in the same way as
+	``nltk.translate.bleu_score.corpus_bleu``.
+
+	Arguments:
+		numerators (Sequence[int]): Clipped matched n-gram counts for n in ``1..len(weights)``.
+		denominators (Sequence[int]): Total n-gram counts (at least ``1``) for n in ``1..len(weights)``.
+		hyp_length (int): The length of hypotheses.
+		ref_length (int): The length of the closest references.
+		weights (Sequence[float]): Weights for unigrams, bigrams, trigrams and so on.
+		smoothing (str, optional): ``method1`` or ``method3`` of ``nltk.translate.bleu_score.SmoothingFunction``.
+			Default: ``method3``.
+	'''
+	if numerators[0] == 0:
+		return 0
+	p_n: List[float] = []
+	incvnt = 1
+	for numerator, denominator in zip(numerators, denominators):
+		numerator, denominator = int(numerator), int(denominator)
+		if numerator != 0:
+			p_n.append(numerator / denominator)
+		elif smoothing == "method1":
+			p_n.append((numerator + 0.1) / denominator)
+		elif smoothing == "method3":
+			p_n.append(1 / (2 ** incvnt * denominator))
+			incvnt += 1
+		else:
+			raise ValueError("Unknown smoothing method %s" % smoothing)
+
+	hyp_length, ref_length = int(hyp_length), int(ref_length)
+	if hyp_length > ref_length:
+		brevity_penalty: float = 1
+	elif hyp_length == 0:
+		brevity_penalty = 0
+	else:
+		brevity_penalty = math.exp(1 - ref_length / hyp_length)
+	return brevity_penalty * math.exp(math.fsum(w_i * math.log(p_i) for w_i, p_i in zip(weights, p_n) if p_i > 0))
+
+def bleu_scores(numerators: np.ndarray, denominators: np.ndarray, hyp_lengths: np.ndarray, ref_lengths: np.ndarray, \
+		weights: Sequence[float], smoothing: str = "method3") -> np.ndarray:
+	'''The vectorized version of :func:`bleu_score` for many rows of statistics.
+	The results may differ from :func:`bleu_score` in the last bits of floating numbers.
+
+	Arguments:
+		numerators (:class:`numpy.ndarray`): Clipped matched n-gram counts. Size: ``[num, len(weights)]``.
+		denominators (:class:`numpy.ndarray`): Total n-gram counts (at least ``1``). Size: ``[num, len(weights)]``.
+		hyp_lengths (:class:`numpy.ndarray`): Lengths of hypotheses. Size: ``[num]``.
+		ref_lengths (:class:`numpy.ndarray`): Lengths of the closest references. Size: ``[num]``.
+		weights (Sequence[float]): Weights for unigrams, bigrams, trigrams and so on.
+		smoothing (str, optional): ``method1`` or ``method3``. Default: ``method3``.
+	'''
+	numerators, denominators = numerators.astype(np.float64), denominators.astype(np.float64)
+	zeros = numerators == 0
+	if smoothing == "method1":
+		p_n = np.where(zeros, 0.1 / denominators, numerators / denominators)
+	elif smoothing == "method3":
+		p_n = np.where(zeros, 1 / (2. ** np.cumsum(zeros, axis=1) * denominators), numerators / denominators)
+	else:
+		raise ValueError("Unknown smoothing method %s" % smoothing)
+
+	hyp_lengths, ref_lengths = hyp_lengths.astype(np.float64), ref_lengths.astype(np.float64)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		brevity_penalty = np.where(hyp_lengths > ref_lengths, 1., \
+			np.where(hyp_lengths == 0, 0., np.exp(1 - ref_lengths / hyp_lengths)))
+	scores = brevity_penalty * np.exp(np.log(p_n) @ np.asarray(weights, dtype=np.float64))
+	return np.where(zeros[:, 0], 0., scores)
+
+def _iter_bootstrap_indices(num: int, samples: int, rng: np.random.RandomState) -> Iterator[np.ndarray]:
+	# Yield the indices of bootstrap resamples, a block of resamples at a time to limit the memory.
+	block = max(1, 2 ** 20 // max(num, 1))
+	for start in range(0, samples, block):
+		yield rng.randint(0, num, size=(min(block, samples - start), num))
+
+def bootstrap_mean(values: Sequence[float], samples: int, seed: int) -> np.ndarray:
+	'''Return the means of ``samples`` bootstrap resamples of ``values``, e.g. sentence BLEU.
+
+	Arguments:
+		values (Sequence[float]): The values to be resampled.
+		samples (int): The number of resamples.
+		seed (int): Random seed for resampling.
+	'''
+	values = np.asarray(values, dtype=np.float64)
+	rng = np.random.RandomState(seed)
+	return np.concatenate([values[indices].mean(axis=1) for indices in _iter_bootstrap_indices(len(values), samples, rng)] \
+		+ [np.zeros(0)])
+
+def confidence_interval(samples: np.ndarray, confidence: float) -> Tuple[float, float]:
+	'''Return the percentile interval of bootstrap ``samples`` at the ``confidence`` level.'''
+	alpha = (1 - confidence) / 2 * 100
+	low, high = np.percentile(samples, [alpha, 100 - alpha])
+	return float(low), float(high)
+
+def check_bootstrap_arguments(samples: int, confidence: float):
+	'''Raise ``ValueError`` if the arguments of bootstrap confidence intervals are invalid.'''
+	if samples < 0:
+		raise ValueError("bootstrap_samples should be non-negative, but got %d." % samples)
+	if not 0 < confidence < 1:
+		raise ValueError("confidence should be in (0, 1), but got %s." % confidence)
+
+class BleuStatistics:
+	'''Per-sentence sufficient statistics of BLEU, i.e., clipped n-gram matches,
+	total n-gram counts, hypothesis lengths and closest reference lengths.
+
+	Arguments:
+		numerators (:class:`numpy.ndarray`): Clipped matched n-gram counts. Size: ``[num, max_order]``.
+		denominators (:class:`numpy.ndarray`): Total n-gram counts (at least ``1``). Size: ``[num, max_order]``.
+		hyp_lengths (:class:`numpy.ndarray`): Lengths of hypotheses. Size: ``[num]``.
+		ref_lengths (:class:`numpy.ndarray`): Lengths of the closest references. Size: ``[num]``.
+	'''
+	def __init__(self, numerators: np.ndarray, denominators: np.ndarray, \
+			hyp_lengths: np.ndarray, ref_lengths: np.ndarray):
+		self.numerators = numerators
+		self.denominators = denominators
+		self.hyp_lengths = hyp_lengths
+		self.ref_lengths = ref_lengths
+
+	def __len__(self):
+		return len(self.hyp_lengths)
+
+	@classmethod
+	def compute(cls, references: List[List[Sequence[Any]]], hypotheses: List[Sequence[Any]], \
+			max_order: int) -> "BleuStatistics":
+		'''Compute the statistics of each hypothesis against its references.
+
+		Arguments:
+			references (List[List[Sequence[Any]]]): References of each hypothesis.
+			hypotheses (List[Sequence[Any]]): Hypotheses. Tokens can be ids or strings.
+			max_order (int): The maximum order of n-grams.
+		'''
+		if len(references) != len(hypotheses):
+			raise ValueError("The number of hypotheses and their reference(s) should be the same.")
+		num = len(hypotheses)
+		owners = np.repeat(np.arange(num, dtype=np.int64), [len(refs) for refs in references])
+		codes, lengths = _encode_sentences(list(hypotheses) + list(chain.from_iterable(references)))
+		return cls.compute_encoded(codes, lengths, owners, max_order)
+
+	@classmethod
+	def compute_encoded(cls, codes: np.ndarray, lengths: np.ndarray, owners: np.ndarray, \
+			max_order: int) -> "BleuStatistics":
+		'''The same as :meth:`compute`, but the sentences are given as integer codes of tokens.
+
+		Arguments:
+			codes (:class:`numpy.ndarray`): Non-negative integer codes of the tokens of hypotheses and then references,
+				concatenated. Two tokens are equal if and only if they have the same code.
+			lengths (:class:`numpy.ndarray`): Lengths of hypotheses and then references.
+			owners (:class:`numpy.ndarray`): The index of the hypothesis of each reference.
+			max_order (int): The maximum order of n-grams.
+		'''
+		num = len(lengths) - len(owners)
+		if len(np.unique(owners)) != num:
+			raise ValueError("Each hypothesis should have at least one reference.")
+		if len(codes) and codes.max() >= len(codes):
+			# re-number sparse codes (e.g. word ids of a large vocabulary), so that n-gram codes do not overflow
+			_, codes = np.unique(codes, return_inverse=True)
+			codes = codes.astype(np.int64).reshape(-1)
+		hyp_lengths, ref_lengths = lengths[:num], lengths[num:]
+		sentence_ids = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+
+		numerators = np.zeros((num, max_order), dtype=np.int64)
+		for n, ngram_codes, valid, ngram_num in _iter_ngram_codes(codes, lengths, max_order):
+			sent = sentence_ids[:len(ngram_codes)]
+			is_hyp = valid & (sent < num)
+			hyp_keys, hyp_counts = np.unique(sent[is_hyp] * ngram_num + ngram_codes[is_hyp], return_counts=True)
+			is_ref = valid & (sent >= num)
+			ref_keys, ref_counts = np.unique(sent[is_ref] * ngram_num + ngram_codes[is_ref], return_counts=True)
+			ref_keys = owners[ref_keys // ngram_num - num] * ngram_num + ref_keys % ngram_num
+			ref_keys, ref_counts = _group_max(ref_keys, ref_counts)
+			clipped = np.minimum(hyp_counts, _lookup(hyp_keys, ref_keys, ref_counts))
+			numerators[:, n - 1] = np.bincount(hyp_keys // ngram_num, weights=clipped, minlength=num)
+		denominators = np.maximum(1, hyp_lengths[:, None] - np.arange(max_order)[None, :])
+
+		# closest reference length, the shorter one is chosen if there is a tie
+		distance = np.abs(ref_lengths - hyp_lengths[owners])
+		order = np.lexsort((ref_lengths, distance, owners))
+		starts = np.flatnonzero(np.concatenate([[True], owners[order][1:] != owners[order][:-1]])) \
+			if len(order) else np.zeros(0, dtype=np.int64)
+		closest_ref_lengths = ref_lengths[order[starts]]
+
+		return cls(numerators, denominators, hyp_lengths, closest_ref_lengths)
+
+	@classmethod
+	def compute_shared(cls, references: List[Sequence[Any]], hypotheses: List[Sequence[Any]], \
+			max_order: int, leave_one_out: bool = False) -> "BleuStatistics":
+		'''Compute the statistics of each hypothesis against the same set of references,
+		i.e., ``sentence_bleu(references, hypotheses[i])`` for each ``i``.
+		The maximum reference count of each n-gram is looked up from an index shared by all hypotheses,
+		instead of being computed for each hypothesis.
+
+		Arguments:
+			references (List[Sequence[Any]]): References shared by all hypotheses.
+			hypotheses (List[Sequence[Any]]): Hypotheses. Tokens can be ids or strings.
+			max_order (int): The maximum order of n-grams.
+			leave_one_out (bool, optional): If ``True``, ``references[i]`` is not used for ``hypotheses[i]``,
+				which is used for Self-BLEU. The index keeps the largest two counts of each n-gram,
+				so that the maximum count of the other references is found in O(1). Default: ``False``.
+		'''
+		num = len(hypotheses)
+		if leave_one_out and len(references) != num:
+			raise ValueError("The number of hypotheses and references should be the same when leave_one_out.")
+		if len(references) <= int(leave_one_out):
+			raise ValueError("Each hypothesis should have at least one reference.")
+		codes, lengths = _encode_sentences(list(hypotheses) + list(references))
+		hyp_lengths, ref_lengths = lengths[:num], lengths[num:]
+		sentence_ids = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+
+		numerators = np.zeros((num, max_order), dtype=np.int64)
+		for n, ngram_codes, valid, ngram_num in _iter_ngram_codes(codes, lengths, max_order):
+			sent = sentence_ids[:len(ngram_codes)]
+			is_hyp = valid & (sent < num)
+			hyp_keys, hyp_counts = np.unique(sent[is_hyp] * ngram_num + ngram_codes[is_hyp], return_counts=True)
+			hyp_sents, hyp_codes = hyp_keys // ngram_num, hyp_keys % ngram_num
+			is_ref = valid & (sent >= num)
+			ref_keys, ref_counts = np.unique(sent[is_ref] * ngram_num + ngram_codes[is_ref], return_counts=True)
+			ref_sents, ref_codes = ref_keys // ngram_num - num, ref_keys % ngram_num
+
+			# the largest count of each n-gram and its reference, sorted by n-gram
+			order = np.lexsort((-ref_counts, ref_codes))
+			ref_sents, ref_codes, ref_counts = ref_sents[order], ref_codes[order], ref_counts[order]
+			first = np.concatenate([[True], ref_codes[1:] != ref_codes[:-1]])[:len(ref_codes)]
+			max_counts = _lookup(hyp_codes, ref_codes[first], ref_counts[first])
+			if leave_one_out:
+				# the second largest count, used when the largest one comes from the hypothesis itself
+				second = np.concatenate([[False], first[:-1]])[:len(ref_codes)] & ~first
+				second_counts = _lookup(hyp_codes, ref_codes[second], ref_counts[second])
+				max_sents = _lookup(hyp_codes, ref_codes[first], ref_sents[first] + 1) - 1
+				max_counts = np.where(max_sents == hyp_sents, second_counts, max_counts)
+			clipped = np.minimum(hyp_counts, max_counts)
+			numerators[:, n - 1] = np.bincount(hyp_sents, weights=clipped, minlength=num)
+		denominators = np.maximum(1, hyp_lengths[:, None] - np.arange(max_order)[None, :])
+		closest_ref_lengths = _closest_lengths(hyp_lengths, ref_lengths, ref_lengths if leave_one_out else None)
+
+		return cls(numerators, denominators, hyp_lengths, closest_ref_lengths)
+
+	@classmethod
+	def compute_pairwise(cls, references: List[Sequence[Any]], hypotheses: List[Sequence[Any]], \
+			max_order: int) -> "BleuStatistics":
+		'''Compute the statistics of each hypothesis against each single reference,
+		i.e., ``sentence_bleu([references[i]], hypotheses[j])`` at row ``i * len(hypotheses) + j``.
+		The n-grams of each sentence are counted once into a table, and the clipped matches
+		of all the pairs are computed from the table at once.
+
+		Arguments:
+			references (List[Sequence[Any]]): References.
+			hypotheses (List[Sequence[Any]]): Hypotheses. Tokens can be ids or strings.
+			max_order (int): The maximum order of n-grams.
+		'''
+		ref_num, hyp_num = len(references), len(hypotheses)
+		codes, lengths = _encode_sentences(list(hypotheses) + list(references))
+		hyp_lengths, ref_lengths = lengths[:hyp_num], lengths[hyp_num:]
+		sentence_ids = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+
+		numerators = np.zeros((ref_num, hyp_num, max_order), dtype=np.int64)
+		for n, ngram_codes, valid, _ in _iter_ngram_codes(codes, lengths, max_order):
+			if not valid.any():
+				continue
+			sent = sentence_ids[:len(ngram_codes)][valid]
+			_, ngram_ids = np.unique(ngram_codes[valid], return_inverse=True)
+			ngram_ids = ngram_ids.reshape(-1)
+			ngram_num = int(ngram_ids.max()) + 1
+			# counts of each n-gram in each sentence, only the n-grams in both sides can be matched
+			table = np.bincount(sent * ngram_num + ngram_ids, minlength=len(lengths) * ngram_num) \
+				.reshape(len(lengths), ngram_num)
+			hyp_table, ref_table = table[:hyp_num], table[hyp_num:]
+			shared = hyp_table.any(axis=0) & ref_table.any(axis=0)
+			hyp_table, ref_table = hyp_table[:, shared], ref_table[:, shared]
+			numerators[:, :, n - 1] = np.minimum(ref_table[:, None, :], hyp_table[None, :, :]).sum(axis=2)
+		denominators = np.maximum(1, hyp_lengths[:, None] - np.arange(max_order)[None, :])
+
+		return cls(numerators.reshape(ref_num * hyp_num, max_order), np.tile(denominators, (ref_num, 1)), \
+			np.tile(hyp_lengths, ref_num), np.repeat(ref_lengths, hyp_num))
+
+	@classmethod
+	def concatenate(cls, statistics_list: List["BleuStatistics"]) -> "BleuStatistics":
+		'''Concatenate the statistics of several parts of a corpus.
+
+		Arguments:
+			statistics_list (List[BleuStatistics]): The statistics to be concatenated.
+		'''
+		return cls(np.concatenate([stats.numerators for stats in statistics_list]), \
+			np.concatenate([stats.denominators for stats in statistics_list]), \
+			np.concatenate([stats.hyp_lengths for stats in statistics_list]), \
+			np.concatenate([stats.ref_lengths for stats in statistics_list]))
+
+	def sum(self) -> "BleuStatistics":
+		'''Return the statistics of the whole corpus as a single row,
+		which gives the same :meth:`corpus_bleu`.
+		'''
+		return BleuStatistics(self.numerators.sum(axis=0, keepdims=True), \
+			self.denominators.sum(axis=0, keepdims=True), \
+			self.hyp_lengths.sum(keepdims=True), self.ref_lengths.sum(keepdims=True))
+
+	def corpus_bleu(self, weights: Sequence[float], smoothing: str = "method3") -> float:
+		'''Return the corpus BLEU, which equals to ``nltk.translate.bleu_score.corpus_bleu``.
+
+		Arguments:
+			weights (Sequence[float]): Weights for unigrams, bigrams, trigrams and so on.
+			smoothing (str, optional): ``method1`` or ``method3``. Default: ``method3``.
+		'''
+		order = len(weights)
+		return bleu_score(self.numerators[:, :order].sum(axis=0).tolist(), \
+			self.denominators[:, :order].sum(axis=0).tolist(), \
+			self.hyp_lengths.sum(), self.ref_lengths.sum(), weights, smoothing)
+
+	def bootstrap_corpus_bleu(self, weights: Sequence[float], samples: int, seed: int, \
+			smoothing: str = "method3") -> np.ndarray:
+		'''Return the corpus BLEU of ``samples`` bootstrap resamples of the sentences,
+		which are computed from the statistics without counting n-grams again.
+
+		Arguments:
+			weights (Sequence[float]): Weights for unigrams, bigrams, trigrams and so on.
+			samples (int): The number of resamples.
+			seed (int): Random seed for resampling.
+			smoothing (str, optional): ``method1`` or ``method3``. Default: ``method3``.
+		'''
+		order = len(weights)
+		rng = np.random.RandomState(seed)
+		scores = [np.zeros(0)]
+		for indices in _iter_bootstrap_indices(len(self), samples, rng):
+			scores.append(bleu_scores(self.numerators[indices, :order].sum(axis=1), \
+				self.denominators[indices, :order].sum(axis=1), self.hyp_lengths[indices].sum(axis=1), \
+				self.ref_lengths[indices].sum(axis=1), weights, smoothing))
+		return np.concatenate(scores)
+
+	def sentence_bleu(self, weights: Sequence[float], smoothing: str = "method1") -> List[float]:
+		'''Return the BLEU of each sentence, which equals to ``nltk.translate.bleu_score.sentence_bleu``.
+
+		Arguments:
+			weights (Sequence[float]): Weights for unigrams, bigrams, trigrams and so on.
+			smoothing (str, optional): ``method1`` or ``method3``. Default: ``method1``.
+		'''
+		order = len(weights)
+		return [bleu_score(numerators, denominators, hyp_length, ref_length, weights, smoothing) \
+			for numerators, denominators, hyp_length, ref_length in \
+			zip(self.numerators[:, :order].tolist(), self.denominators[:, :order].tolist(), \
+				self.hyp_lengths.tolist(), self.ref_lengths.tolist())]
+
+def check_bleu_engine(engine: str):
+	'''Raise ``ValueError`` if ``engine`` is not a valid BLEU engine.'''
+	if engine not in BLEU_ENGINES:
+		raise ValueError("Unknown BLEU engine %s, should be one of %s." % (engine, BLEU_ENGINES))
+
+def native_corpus_bleu(references: List[List[Sequence[Any]]], hypotheses: List[Sequence[Any]], \
+		weights: Sequence[float] = (0.25, 0.25, 0.25, 0.25), smoothing: str = "method3") -> Union[int, float]:
+	'''The native version of ``nltk.translate.bleu_score.corpus_bleu``.'''
+	return BleuStatistics.compute(references, hypotheses, len(weights)).corpus_bleu(weights, smoothing)
@@ -2,11 +2,13 @@ from typing import Union, List, Any, Optional, Iterable
 import random
 from itertools import chain
 import numpy as np
-from nltk import ngrams
 
 from .metric import MetricBase
 from ..dataloader import LanguageProcessing, Tokenizer, SimpleTokenizer
 from .._utils import replace_unk
+from .._utils.imports import LazyObject
+
+ngrams = LazyObject("nltk.util.ngrams")
 
 class DistinctNgramsCorpus(MetricBase):
 	'''Metric for calculating BLEU.
@@ -101,10 +103,7 @@ class DistinctNgramsCorpus(MetricBase):
 			sample = self.sample
 		self._hash_ordered_data(sample)
 
-		rng_state = random.getstate()
-		random.seed(self.seed)
-		random.shuffle(self.hyps)
-		random.setstate(rng_state)
+		random.Random(self.seed).shuffle(self.hyps)
 		self.hyps = self.hyps[:sample]
 
 		if self.tokenizer:
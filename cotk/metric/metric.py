@@ -3,10 +3,31 @@
 It provides a fair metric for every model.
 """
 from typing import Any, List, Dict
+from itertools import count
 import hashlib
 
+from .._utils import FORK_LOCK
 from .._utils.unordered_hash import UnorderedSha256, dumps
 from .._utils.metaclass import LoadClassInterface, DocStringInheritor
+from .._utils.imports import LazyObject, LazyModule
+
+multiprocessing = LazyModule("multiprocessing", globals())
+ProcessPoolExecutor = LazyObject("concurrent.futures.ProcessPoolExecutor")
+
+# The components of the MetricChains being closed, which are inherited by the forked processes.
+# token -> metric_list
+_forked_metrics = {}
+_forked_metric_tokens = count()
+
+def _close_forked(token, index):
+	return _forked_metrics[token][index].close()
+
+def _add_note(err: BaseException, note: str):
+	# ``BaseException.add_note`` is new in Python 3.11
+	if hasattr(err, "add_note"):
+		err.add_note(note)
+	else:
+		err.__notes__ = getattr(err, "__notes__", []) + [note]
 
 class MetricBase(LoadClassInterface, metaclass=DocStringInheritor):
 	'''Base class for metrics.
@@ -26,6 +47,10 @@ class MetricBase(LoadClassInterface, metaclass=DocStringInheritor):
 	IGNORE_SMOOTHING_ERROR_ARGUMENTS = \
 		"""ignore_smoothing_error (bool, optional): Specifies whether to ignore the smoothing error when calculating \
 			BLEU. Default: ``False``."""
+	BLEU_ENGINE_ARGUMENTS = \
+		"""engine (str, optional): The implementation used to calculate BLEU. \
+			``native`` counts n-grams on integer codes with NumPy, and ``nltk`` uses ``nltk.translate.bleu_score``. \
+			Both give the same result. Default: ``native``."""
 	SAMPLE_ARGUMENTS_IN_BLEU = \
 		"""sample (int, optional): Number of examples sampled from the generated sentences. Default: ``1000``."""
 	SAMPLE_ARGUMENTS_IN_NGRAM_PERPLEXITY = \
@@ -126,8 +151,13 @@ class MetricBase(LoadClassInterface, metaclass=DocStringInheritor):
 	FULL_CHECK_ARGUMENTS = \
 		"""full_check (bool, optional): Whether to perform a full check on ``gen_log_prob`` to make sure the sum
 			of probability is 1. Otherwise, a random check will be performed for efficiency.
-			If PyTorch is used, a full check is always performed and this argument will be ignored.
 			Default: ``False``."""
+	CHECK_ROWS_ARGUMENTS = \
+		"""check_rows (int, optional): Number of randomly sampled positions in every batch, whose sum of
+			probability is checked. No random check is performed if ``0``. Default: ``1``."""
+	CHECK_BATCHES_ARGUMENTS = \
+		"""check_batches (int, optional): Only the first ``check_batches`` batches are checked (both the
+			random check and the full check). If ``None``, all the batches are checked. Default: ``None``."""
 	FORWARD_GEN_ARGUMENTS = \
 				"""* **data[gen_key]** (list, :class:`numpy.ndarray`): \
 				  A 2-d jagged or padded array of int. \
@@ -161,6 +191,16 @@ class MetricBase(LoadClassInterface, metaclass=DocStringInheritor):
 			when ``cpu_count`` is set to ``1`` or the dataset is small. Default: If ``None``, \
 			the environment variable ``CPU_COUNT`` will be used when available, \
 			or all available cpu will be used otherwise."""
+	MODEL_CACHE_DIR_ARGUMENTS = \
+		"""model_cache_dir (str, optional): Directory where the language models trained on the references \
+			are cached, so that they are trained only once for the same references. \
+			No model is cached if ``None``. Default: ``None``."""
+
+	BOOTSTRAP_SAMPLES_ARGUMENTS = \
+		"""bootstrap_samples (int, optional): Number of bootstrap resamples of the sentences for \
+			the confidence interval. No interval is reported if ``0``. Default: ``0``."""
+	CONFIDENCE_ARGUMENTS = \
+		"""confidence (float, optional): Confidence level of the bootstrap interval. Default: ``0.95``."""
 
 	def __init__(self, name: str, version: int):
 		self.unordered_hash = UnorderedSha256()
@@ -213,6 +253,17 @@ class MetricChain(MetricBase):
 	'''A metric-like class for stacked metric. You can use this class
 	making multiples metric combination like one.
 
+	Arguments:
+		max_workers (int, optional): The number of processes calling :meth:`.close` of the metric components
+			concurrently. If ``1``, the components are closed one by one in this process. Default: ``1``.
+
+	Note:
+		The components are closed in processes forked from this process, which inherit the components
+		instead of unpickling them. Only the results of :meth:`.close` are sent back, and the components
+		are marked as closed in this process. Each of the processes creates its own worker processes
+		for the components with ``cpu_count > 1``. If ``fork`` is not supported (e.g. on Windows),
+		the components are closed one by one.
+
 	Examples:
 		>>> metric = MetricChain()
 		>>> metric.add_metric(BleuCorpusMetric())
@@ -222,8 +273,11 @@ class MetricChain(MetricBase):
 	'''
 	_name = 'MetricChain'
 	_version = 2
-	def __init__(self):
+	def __init__(self, max_workers: int = 1):
 		super().__init__(self._name, self._version)
+		if max_workers < 1:
+			raise ValueError("max_workers should be positive, but got %d." % max_workers)
+		self.max_workers = max_workers
 		self.metric_list = []
 
 	def add_metric(self, metric: "MetricBase"):
@@ -249,8 +303,40 @@ class MetricChain(MetricBase):
 
 	def close(self) -> Dict[Any, Any]:
 		r'''Return a dict containing the items which all the metric components return.
+		The items are merged in the order of the components, even if they are closed concurrently.
 		'''
 		res = super().close()
-		for metric in self.metric_list:
-			res.update(metric.close())
+		if self.max_workers == 1 or len(self.metric_list) <= 1 or \
+				"fork" not in multiprocessing.get_all_start_methods():
+			results = [self._close_component(i, metric.close) for i, metric in enumerate(self.metric_list)]
+		else:
+			results = self._close_forked()
+		for result in results:
+			res.update(result)
 		return res
+
+	def _close_forked(self) -> List[Dict[Any, Any]]:
+		token = next(_forked_metric_tokens)
+		_forked_metrics[token] = self.metric_list
+		try:
+			executor = ProcessPoolExecutor(max_workers=min(self.max_workers, len(self.metric_list)), \
+				mp_context=multiprocessing.get_context("fork"))
+			with executor:
+				# the processes are forked when the first task is submitted
+				with FORK_LOCK:
+					futures = [executor.submit(_close_forked, token, i) for i in range(len(self.metric_list))]
+				results = [self._close_component(i, future.result) for i, future in enumerate(futures)]
+		finally:
+			del _forked_metrics[token]
+			for metric in self.metric_list:
+				metric.closed = True
+		return results
+
+	def _close_component(self, index: int, close) -> Dict[Any, Any]:
+		# Return ``close()``, and add the name of the component to the exception it raises.
+		try:
+			return close()
+		except Exception as err:
+			_add_note(err, "Failed to close the metric %s (index %d in the chain)." % \
+				(self.metric_list[index].name, index))
+			raise
@@ -1,10 +1,14 @@
 '''Containing NgramFwBwPerplexityMetric'''
 from typing import Optional, List, Any, Union, Dict
+import hashlib
 import logging
+import os
+import tempfile
 
 from ..dataloader import Tokenizer, SimpleTokenizer
 from .metric import MetricBase
-from ..models.ngram_language_model import KneserNeyInterpolated
+from ..models.ngram_language_model import KneserNeyInterpolated, _FILE_VERSION
+from .._utils.unordered_hash import dumps
 
 class NgramFwBwPerplexityMetric(MetricBase):
 	'''Metric for calculating n gram forward perplexity and backward perplexity.
@@ -18,6 +22,7 @@ class NgramFwBwPerplexityMetric(MetricBase):
 		{MetricBase.SAMPLE_ARGUMENTS_IN_NGRAM_PERPLEXITY}
 		{MetricBase.SEED_ARGUMENTS}
 		{MetricBase.CPU_COUNT_ARGUMENTS}
+		{MetricBase.MODEL_CACHE_DIR_ARGUMENTS}
 
 	Here is an example (to only show the format but not the exact value of results):
 
@@ -42,7 +47,8 @@ class NgramFwBwPerplexityMetric(MetricBase):
 	def __init__(self, dataloader: Union["LanguageProcessing", "Sentence", "Session"], \
 			reference_test_list: List[Any], ngram: int = 4, *, \
 			tokenizer: Union[None, Tokenizer, str] = None, gen_key: str = "gen", \
-			sample: int = 10000, seed: int = 1229, cpu_count: Optional[int] = None):
+			sample: int = 10000, seed: int = 1229, cpu_count: Optional[int] = None, \
+			model_cache_dir: Optional[str] = None):
 		super().__init__(self._name, self._version)
 		self.dataloader = dataloader
 		self.ngram = ngram
@@ -53,6 +59,7 @@ class NgramFwBwPerplexityMetric(MetricBase):
 		self.cpu_count = cpu_count
 		self.sample = sample
 		self.seed = seed
+		self.model_cache_dir = model_cache_dir
 
 	def forward(self, data: Dict[str, Any]):
 		'''Processing a batch of data.
@@ -107,11 +114,11 @@ class NgramFwBwPerplexityMetric(MetricBase):
 		left_pad, right_pad = None, None
 		unk = self.dataloader.get_special_tokens_mapping().get("unk", None)
 
-		model = KneserNeyInterpolated(self.ngram, \
-					left_pad, right_pad, \
-					unk, cpu_count=self.cpu_count)
-		logging.info("training forward")
-		model.fit(refs)
+		self._hash_unordered_list(refs)
+		self._hash_ordered_data((self.ngram,))
+		hashvalue = self._hashvalue()
+
+		model = self._reference_model(refs, left_pad, right_pad, unk, hashvalue)
 		logging.info("scoring forward")
 		fwppl = model.perplexity(hyps)
 
@@ -124,8 +131,36 @@ class NgramFwBwPerplexityMetric(MetricBase):
 		bwppl = model.perplexity(refs)
 
 		res.update({"fwppl": fwppl, "bwppl": bwppl})
-
-		self._hash_unordered_list(refs)
-		self._hash_ordered_data((self.ngram,))
-		res["fwppl hashvalue"] = res["bwppl hashvalue"] = self._hashvalue()
+		res["fwppl hashvalue"] = res["bwppl hashvalue"] = hashvalue
 		return res
+
+	def _reference_model(self, refs: List[Any], left_pad: Any, right_pad: Any, unk: Any, \
+			hashvalue: str) -> KneserNeyInterpolated:
+		'''Return the forward model trained on ``refs``, which is loaded from ``model_cache_dir`` if cached.'''
+		cache_path = None
+		if self.model_cache_dir is not None:
+			# ``hashvalue`` identifies the references and ``ngram``
+			name = hashlib.sha256(dumps((hashvalue, left_pad, right_pad, unk, _FILE_VERSION))).hexdigest()
+			cache_path = os.path.join(self.model_cache_dir, "kneser_ney_%s.npz" % name)
+			if os.path.exists(cache_path):
+				logging.info("loading forward model from %s", cache_path)
+				return KneserNeyInterpolated.load(cache_path, cpu_count=self.cpu_count)
+
+		model = KneserNeyInterpolated(self.ngram, \
+					left_pad, right_pad, \
+					unk, cpu_count=self.cpu_count)
+		logging.info("training forward")
+		model.fit(refs)
+
+		if cache_path is not None:
+			os.makedirs(self.model_cache_dir, exist_ok=True)
+			# write to a temporary file first, so that other processes never load a partial model
+			with tempfile.NamedTemporaryFile(dir=self.model_cache_dir, suffix=".tmp", delete=False) as model_file:
+				temp_path = model_file.name
+			try:
+				model.save(temp_path)
+				os.replace(temp_path, cache_path)
+			finally:
+				if os.path.exists(temp_path):
+					os.remove(temp_path)
+		return model
@@ -3,7 +3,7 @@ Containing some classes and functions about perplexity evaluating results of mod
 """
 import random
 import numpy as np
-from typing import Union, List, Any, Optional, Dict
+from typing import Union, Any, Optional, Dict
 
 from .._utils.imports import LazyObject, LazyModule
 from ..dataloader import LanguageProcessing, Sentence
@@ -22,6 +22,14 @@ class PerplexityMetric(MetricBase):
 		{MetricBase.GEN_LOG_PROB_KEY_ARGUMENTS}
 		{MetricBase.GENERATE_RARE_VOCAB_ARGUMENTS}
 		{MetricBase.FULL_CHECK_ARGUMENTS}
+		{MetricBase.CHECK_ROWS_ARGUMENTS}
+		{MetricBase.CHECK_BATCHES_ARGUMENTS}
+		gold_log_prob_key (str, optional): The key of the log probability of reference words,
+			which is used instead of ``gen_log_prob`` if ``gen_log_prob`` is not given. Default: ``gold_log_prob``.
+		unk_log_prob_key (str, optional): The key of the log probability of unk,
+			which is used with ``gold_log_prob``. Default: ``unk_log_prob``.
+		gen_prob_sum_key (str, optional): The key of the sum of the probability over the vocabulary,
+			which is optionally used with ``gold_log_prob`` to check the probability. Default: ``gen_prob_sum``.
 
 	Here is an example:
 
@@ -53,24 +61,34 @@ class PerplexityMetric(MetricBase):
 					   reference_len_key: str = "ref_length", \
 					   gen_log_prob_key: str = "gen_log_prob", \
 					   generate_rare_vocab: bool = False, \
-					   full_check: bool = False \
+					   full_check: bool = False, \
+					   gold_log_prob_key: str = "gold_log_prob", \
+					   unk_log_prob_key: str = "unk_log_prob", \
+					   gen_prob_sum_key: str = "gen_prob_sum", \
+					   check_rows: int = 1, \
+					   check_batches: Optional[int] = None \
 			  ):
 		super().__init__(self._name, self._version)
+		if check_rows < 0:
+			raise ValueError("check_rows should be non-negative, but got %d." % check_rows)
+		if check_batches is not None and check_batches < 0:
+			raise ValueError("check_batches should be non-negative or None, but got %d." % check_batches)
 		self.dataloader = dataloader
 		self.reference_allvocabs_key = reference_allvocabs_key
 		self.reference_len_key = reference_len_key
 		self.gen_log_prob_key = gen_log_prob_key
+		self.gold_log_prob_key = gold_log_prob_key
+		self.unk_log_prob_key = unk_log_prob_key
+		self.gen_prob_sum_key = gen_prob_sum_key
 		self.word_loss = 0
 		self.length_sum = 0
 		self.generate_rare_vocab = generate_rare_vocab
 		self.full_check = full_check
+		self.check_rows = check_rows
+		self.check_batches = check_batches
+		self._forward_batches = 0
 		self.engine_version = "unknown" # after first forward, it will be filled with 'default' or 'pytorch'
 
-		self.resp: List[str] = []
-		#self.resp_length = []
-		self.gen_valid_log_prob: List[np.ndarray] = []
-		self.gen_unk_log_prob: List[np.ndarray] = []
-
 		self.have_unk = "unk" in self.dataloader.get_special_tokens_mapping()
 
 	def forward(self, data: Dict[str, Any]):
@@ -101,11 +119,39 @@ class PerplexityMetric(MetricBase):
 					...	    gen_log_prob_key: [[[-3.80666249, -3.11351531, -2.7080502 , -2.42036813, -2.19722458,
 							    -2.01490302, -1.86075234, -1.72722095, -1.60943791],...],...]
 					... }
+
+			If ``data[gen_log_prob_key]`` is not given, the log probability of the reference words and
+			unk can be given instead, which saves the memory of the whole probability distribution.
+
+				* **data[gold_log_prob_key]** (list, :class:`numpy.ndarray`, :class:`torch.Tensor`):
+				  The **log softmax** probability of every reference word (without start token),
+				  which is ignored for :ref:`rare vocabs <vocabulary_ref>` if ``generate_rare_vocab = False``.
+				  A 2-d jagged or padded array of float. Size: ``[batch_size, ~gen_sentence_length]``.
+				* **data[unk_log_prob_key]** (list, :class:`numpy.ndarray`, :class:`torch.Tensor`):
+				  The **log softmax** probability of unk at every position.
+				  Required if the dataloader has unk. Size: ``[batch_size, ~gen_sentence_length]``.
+				* **data[gen_prob_sum_key]** (list, :class:`numpy.ndarray`, :class:`torch.Tensor`, optional):
+				  The sum of the probability over the vocabulary at every position, which should be ``1``.
+				  It is checked if given. Size: ``[batch_size, ~gen_sentence_length]``.
+
 		Warning:
 			``data[gen_log_prob_key]`` must be processed after log_softmax. That means,
 			``np.sum(np.exp(gen_log_prob), -1)`` equals ``np.ones((batch_size, gen_sentence_length))``
 		'''
 		super().forward(data)
+		self._forward(data, self._check_batch())
+
+	def _check_batch(self) -> bool:
+		# Whether the probability of the next batch should be checked.
+		check = self.check_batches is None or self._forward_batches < self.check_batches
+		self._forward_batches += 1
+		return check
+
+	def _forward(self, data: Dict[str, Any], check: bool):
+		if self.gen_log_prob_key not in data and self.gold_log_prob_key in data:
+			self._gold_forward(data, check)
+			return
+
 		resp_allvocabs = data[self.reference_allvocabs_key]
 		resp_length = data[self.reference_len_key]
 		gen_log_prob = data[self.gen_log_prob_key]
@@ -131,27 +177,44 @@ class PerplexityMetric(MetricBase):
 			if not isinstance(resp_allvocabs, torch.Tensor):
 				resp_allvocabs = gen_log_prob.new_tensor(resp_allvocabs).long()
 			with torch.no_grad():
-				self._pytorch_forward(resp_allvocabs, resp_length, gen_log_prob)
+				self._pytorch_forward(resp_allvocabs, resp_length, gen_log_prob, check)
 		else:
-			self._normal_forward(resp_allvocabs, resp_length, gen_log_prob)
+			self._normal_forward(resp_allvocabs, resp_length, gen_log_prob, check)
+
+	def _random_check(self, resp_length, gen_log_prob):
+		# perform random check to assert the probability is valid
+		for _ in range(self.check_rows):
+			checkid = random.randint(0, len(resp_length)-1)
+			if resp_length[checkid] < 2:
+				raise ValueError("resp_length must no less than 2, because <go> and <eos> are always included.")
+			checkrow = random.randint(0, resp_length[checkid]-2)
 
-	def _normal_forward(self, resp_allvocabs, resp_length, gen_log_prob):
+			if self.engine_version == "pytorch":
+				# the probability may be float32 on gpu
+				random_check_expsum = float(gen_log_prob[checkid, checkrow].exp().sum())
+				is_valid = np.isclose(random_check_expsum, 1, rtol=1e-3)
+			else:
+				random_check_expsum = float(np.sum(np.exp(gen_log_prob[checkid][checkrow])))
+				is_valid = np.isclose(random_check_expsum, 1)
+			if not is_valid:
+				raise ValueError("data[gen_log_prob_key] must be processed after log_softmax. \
+					gen_log_prob[%d][%d] exp sum is equal to %f." % (checkid, checkrow, \
+					random_check_expsum))
+
+	def _normal_forward(self, resp_allvocabs, resp_length, gen_log_prob, check: bool):
 		if len(resp_allvocabs) != len(resp_length) or len(resp_allvocabs) != len(gen_log_prob):
 			raise ValueError("Batch num of arguments is not matched.")
 
-		# perform random check to assert the probability is valid
-		checkid = random.randint(0, len(resp_length)-1)
-		if resp_length[checkid] < 2:
-			raise ValueError("resp_length must no less than 2, because <go> and <eos> are always included.")
-		checkrow = random.randint(0, resp_length[checkid]-2)
+		if check:
+			self._random_check(resp_length, gen_log_prob)
 
-		random_check_expsum = float(np.sum(np.exp(gen_log_prob[checkid][checkrow])))
-		if not np.isclose(random_check_expsum, 1):
-			raise ValueError("data[gen_log_prob_key] must be processed after log_softmax. \
-				gen_log_prob[%d][%d] exp sum is equal to %f." % (checkid, checkrow, \
-				random_check_expsum))
+		if isinstance(gen_log_prob, np.ndarray) and gen_log_prob.ndim == 3:
+			self._batch_forward(resp_allvocabs, resp_length, gen_log_prob, check)
+			return
 
+		unk_id = self.dataloader.unk_id if self.have_unk else None
 		relevant_data = []
+		batch_word_loss, batch_length_sum = 0, 0
 		for i, resp_len in enumerate(resp_length):
 			if resp_len < 2:
 				raise ValueError("resp_length must no less than 2, because <go> and <eos> are always included.")
@@ -167,7 +230,7 @@ class PerplexityMetric(MetricBase):
 				raise ValueError("gen_log_prob need to be 3 dimension")
 
 			# perform full check to assert the probability is valid
-			if self.full_check:
+			if check and self.full_check:
 				expsum = np.sum(np.exp(gen_now[:resp_len-1]), -1)
 				if not np.allclose(expsum, [1] * (resp_len - 1), rtol=1e-3):
 					raise ValueError("data[gen_log_prob_key] must be processed after log_softmax.")
@@ -184,21 +247,174 @@ class PerplexityMetric(MetricBase):
 						"but %d != %d") % (gen_now.shape[1], self.dataloader.all_vocab_size))
 
 			resp = resp_now
-			self.resp.append(resp)
-			#self.resp_length.append(resp_len)
 
 			resp_known = resp.copy()
 			if not self.generate_rare_vocab and self.have_unk:
 				#resp_known[resp_known >= self.dataloader.all_vocab_size] = self.dataloader.unk_id
 				resp_known[resp_known >= self.dataloader.frequent_vocab_size] = self.dataloader.unk_id
 
-			self.gen_valid_log_prob.append(gen_now[list(range(resp_len-1)), resp_known])
-			if self.have_unk:
-				self.gen_unk_log_prob.append(gen_now[:resp_len-1, self.dataloader.unk_id])
+			gen_valid_log_prob = gen_now[list(range(resp_len-1)), resp_known]
+			gen_unk_log_prob = gen_now[:resp_len-1, unk_id] if self.have_unk else None
+			word_loss, length_sum = self._run_f((gen_valid_log_prob, gen_unk_log_prob, resp, \
+				self.generate_rare_vocab, self.dataloader.frequent_vocab_size, self.dataloader.all_vocab_size, unk_id))
+			batch_word_loss += word_loss
+			batch_length_sum += length_sum
 
+		self.word_loss += float(batch_word_loss)
+		self.length_sum += batch_length_sum
 		self._hash_unordered_list(relevant_data)
 
-	def _pytorch_forward(self, resp_allvocabs, resp_length, gen_log_prob):
+	def _batch_forward(self, resp_allvocabs, resp_length, gen_log_prob, check: bool):
+		# The same as the loop of ``_normal_forward`` for a padded ``gen_log_prob``,
+		# but the whole batch is gathered at once.
+		resp, length_mask = self._prepare_references(resp_allvocabs, resp_length)
+		steps = resp.shape[1]
+		if gen_log_prob.shape[1] < steps:
+			raise ValueError("The length of resp_allvocabs or gen_log_prob is less than resp_length.")
+
+		if not self.generate_rare_vocab:
+			if gen_log_prob.shape[2] != self.dataloader.frequent_vocab_size:
+				raise ValueError(("The third dimension gen_log_prob should be equals to frequent_vocab_size when "
+					"generate_rare_vocab = False, "
+					"but %d != %d") % (gen_log_prob.shape[2], self.dataloader.frequent_vocab_size))
+		else:
+			if gen_log_prob.shape[2] != self.dataloader.all_vocab_size:
+				raise ValueError(("The third dimension gen_log_prob should be equals to all_vocab_size "
+					"when generate_rare_vocab = True, "
+					"but %d != %d") % (gen_log_prob.shape[2], self.dataloader.all_vocab_size))
+
+		gen_log_prob = gen_log_prob[:, :steps]
+		# perform full check to assert the probability is valid
+		if check and self.full_check:
+			expsum = np.sum(np.exp(gen_log_prob[length_mask]), -1)
+			if not np.allclose(expsum, 1, rtol=1e-3):
+				raise ValueError("data[gen_log_prob_key] must be processed after log_softmax.")
+
+		resp_known = resp.copy()
+		if not self.generate_rare_vocab and self.have_unk:
+			resp_known[resp_known >= self.dataloader.frequent_vocab_size] = self.dataloader.unk_id
+		valid_log_prob = np.take_along_axis(gen_log_prob, resp_known[:, :, None], axis=2)[:, :, 0]
+		unk_log_prob = gen_log_prob[:, :, self.dataloader.unk_id] if self.have_unk else None
+
+		self._hash_references(resp, resp_length)
+		self._add_log_prob(resp, length_mask, valid_log_prob, unk_log_prob)
+
+	def _gold_forward(self, data: Dict[str, Any], check: bool):
+		# Only the log probability of reference words and unk is given.
+		resp_allvocabs = data[self.reference_allvocabs_key]
+		resp_length = data[self.reference_len_key]
+		gold_log_prob = data[self.gold_log_prob_key]
+		unk_log_prob = data.get(self.unk_log_prob_key, None)
+		gen_prob_sum = data.get(self.gen_prob_sum_key, None)
+
+		if not isinstance(resp_allvocabs, (torch.Tensor, np.ndarray, list)):
+			raise TypeError("Unknown type for resp_allvocabs.")
+		if not isinstance(resp_length, (list, np.ndarray)):
+			raise TypeError("Unknown type for resp_length")
+		for name, value in [("gold_log_prob", gold_log_prob), ("unk_log_prob", unk_log_prob), \
+				("gen_prob_sum", gen_prob_sum)]:
+			if value is not None and not isinstance(value, (torch.Tensor, np.ndarray, list)):
+				raise TypeError("Unknown type for %s" % name)
+		if self.have_unk and unk_log_prob is None:
+			raise ValueError("data[unk_log_prob_key] is required when the dataloader has an unk token.")
+		if len(resp_allvocabs) != len(resp_length) or len(resp_allvocabs) != len(gold_log_prob) or \
+				(unk_log_prob is not None and len(unk_log_prob) != len(resp_length)) or \
+				(gen_prob_sum is not None and len(gen_prob_sum) != len(resp_length)):
+			raise ValueError("Batch num of arguments is not matched.")
+
+		resp, length_mask = self._prepare_references(resp_allvocabs, resp_length)
+		resp_length = np.asarray(resp_length)
+		gold_log_prob = self._pad_log_prob(gold_log_prob, resp_length)
+		if unk_log_prob is not None:
+			unk_log_prob = self._pad_log_prob(unk_log_prob, resp_length)
+		if check and gen_prob_sum is not None:
+			if not np.allclose(self._pad_log_prob(gen_prob_sum, resp_length)[length_mask], 1, rtol=1e-3):
+				raise ValueError("data[gen_prob_sum_key] should be 1, which is the sum of the probability over \
+					the vocabulary.")
+
+		self._hash_references(resp, resp_length)
+		self._add_log_prob(resp, length_mask, gold_log_prob, unk_log_prob)
+
+	def _prepare_references(self, resp_allvocabs, resp_length):
+		# Return the padded references without ``<go>`` and the mask of words in the sentences.
+		resp_length = np.asarray(resp_length)
+		if np.any(resp_length < 2):
+			raise ValueError("resp_length must no less than 2, because <go> and <eos> are always included.")
+		steps = int(resp_length.max()) - 1
+
+		if isinstance(resp_allvocabs, torch.Tensor):
+			resp_allvocabs = resp_allvocabs.cpu().numpy()
+		if isinstance(resp_allvocabs, np.ndarray):
+			if resp_allvocabs.ndim != 2:
+				raise ValueError("resp_allvocabs need to be 2 dimension")
+			resp = resp_allvocabs[:, 1:steps + 1].astype(np.int64)
+		else:
+			resp = np.zeros((len(resp_length), steps), dtype=np.int64)
+			for i, resp_len in enumerate(resp_length):
+				resp_now = np.array(resp_allvocabs[i][1:resp_len])
+				if len(resp_now.shape) != 1:
+					raise ValueError("resp_allvocabs need to be 2 dimension")
+				resp[i, :resp_len - 1] = resp_now
+		if resp.shape[1] < steps:
+			raise ValueError("The length of resp_allvocabs or gen_log_prob is less than resp_length.")
+
+		length_mask = np.arange(steps)[None, :] < (resp_length - 1)[:, None]
+		return np.where(length_mask, resp, 0), length_mask
+
+	@staticmethod
+	def _pad_log_prob(log_prob, resp_length: np.ndarray) -> np.ndarray:
+		# Return a ``[batch_size, max(resp_length) - 1]`` array from a 2-d jagged or padded ``log_prob``.
+		steps = int(resp_length.max()) - 1
+		if isinstance(log_prob, torch.Tensor):
+			log_prob = log_prob.detach().cpu().numpy()
+		if isinstance(log_prob, np.ndarray) and log_prob.dtype != object:
+			if log_prob.ndim != 2:
+				raise ValueError("gold_log_prob, unk_log_prob and gen_prob_sum need to be 2 dimension")
+			if log_prob.shape[1] < steps:
+				raise ValueError("The length of gold_log_prob, unk_log_prob or gen_prob_sum is less than resp_length.")
+			return log_prob[:, :steps].astype(np.float64)
+		result = np.zeros((len(resp_length), steps))
+		for i, resp_len in enumerate(resp_length):
+			row = np.asarray(log_prob[i][:resp_len - 1], dtype=np.float64)
+			if row.ndim != 1:
+				raise ValueError("gold_log_prob, unk_log_prob and gen_prob_sum need to be 2 dimension")
+			if len(row) < resp_len - 1:
+				raise ValueError("The length of gold_log_prob, unk_log_prob or gen_prob_sum is less than resp_length.")
+			result[i, :resp_len - 1] = row
+		return result
+
+	def _hash_references(self, resp: np.ndarray, resp_length: np.ndarray):
+		self._hash_unordered_list([self.dataloader.convert_ids_to_tokens(resp[i, :resp_len - 1].tolist()) \
+			for i, resp_len in enumerate(resp_length)])
+
+	def _add_log_prob(self, resp: np.ndarray, length_mask: np.ndarray, valid_log_prob: np.ndarray, \
+			unk_log_prob: Optional[np.ndarray]):
+		# Accumulate the loss of a batch, where ``valid_log_prob`` is the log probability of
+		# the reference words (or unk for rare words if ``generate_rare_vocab`` is ``False``).
+		frequent_vocab_size = self.dataloader.frequent_vocab_size
+
+		# calc normal vocab
+		normal_mask = length_mask & (resp < frequent_vocab_size)
+		if self.have_unk:
+			normal_mask &= resp != self.dataloader.unk_id
+		word_loss = -np.sum(valid_log_prob[normal_mask])
+		length_sum = int(np.sum(normal_mask))
+		# calc invalid vocab
+		# smoothing from unk
+		if self.have_unk:
+			invalid_mask = length_mask & (resp >= frequent_vocab_size)
+			invalid_log_prob = unk_log_prob[invalid_mask] - \
+				np.log(self.dataloader.all_vocab_size - frequent_vocab_size)
+			if self.generate_rare_vocab:
+				word_loss -= np.sum(np.log(np.exp(invalid_log_prob) + np.exp(valid_log_prob[invalid_mask])))
+			else:
+				word_loss -= np.sum(invalid_log_prob)
+			length_sum += int(np.sum(invalid_mask))
+
+		self.word_loss += float(word_loss)
+		self.length_sum += length_sum
+
+	def _pytorch_forward(self, resp_allvocabs, resp_length, gen_log_prob, check: bool):
 		if len(resp_allvocabs) != len(resp_length) or len(resp_allvocabs) != len(gen_log_prob):
 			raise ValueError("Batch num of arguments is not matched.")
 		if len(resp_allvocabs.shape) != 2:
@@ -206,64 +422,74 @@ class PerplexityMetric(MetricBase):
 		if len(gen_log_prob.shape) != 3:
 			raise ValueError("gen_log_prob need to be 3 dimension")
 
-		relevant_data = []
-		for i, resp_len in enumerate(resp_length):
-			if resp_len < 2:
-				raise ValueError("resp_length must no less than 2, because <go> and <eos> are always included.")
-
-			resp_now = resp_allvocabs[i, 1:resp_len]
-			gen_now = gen_log_prob[i, :resp_len - 1]
-			relevant_data.append(self.dataloader.convert_ids_to_tokens(resp_now.tolist()))
-
-			# perform full check to assert the probability is valid
-			expsum = gen_now.exp().sum(-1)
-			if not expsum.allclose(torch.ones_like(expsum), rtol=1e-3):
+		if check:
+			self._random_check(resp_length, gen_log_prob)
+		resp_length = np.asarray(resp_length)
+		if np.any(resp_length < 2):
+			raise ValueError("resp_length must no less than 2, because <go> and <eos> are always included.")
+		steps = int(resp_length.max()) - 1
+		if resp_allvocabs.shape[1] < steps + 1 or gen_log_prob.shape[1] < steps:
+			raise ValueError("The length of resp_allvocabs or gen_log_prob is less than resp_length.")
+
+		if not self.generate_rare_vocab:
+			if gen_log_prob.shape[2] != self.dataloader.frequent_vocab_size:
+				raise ValueError(("The third dimension gen_log_prob should be equals to frequent_vocab_size when "
+					"generate_rare_vocab = False, "
+					"but %d != %d") % (gen_log_prob.shape[2], self.dataloader.frequent_vocab_size))
+		else:
+			if gen_log_prob.shape[2] != self.dataloader.all_vocab_size:
+				raise ValueError(("The third dimension gen_log_prob should be equals to all_vocab_size "
+					"when generate_rare_vocab = True, "
+					"but %d != %d") % (gen_log_prob.shape[2], self.dataloader.all_vocab_size))
+
+		resp = resp_allvocabs[:, 1:steps + 1]
+		gen_log_prob = gen_log_prob[:, :steps]
+		# the ids are copied to host once for hashing
+		resp_ids = resp.tolist()
+		relevant_data = [self.dataloader.convert_ids_to_tokens(ids[:resp_len - 1]) \
+			for ids, resp_len in zip(resp_ids, resp_length.tolist())]
+
+		length_mask = torch.arange(steps, device=resp.device)[None, :] < \
+			torch.as_tensor(resp_length - 1, device=resp.device)[:, None]
+		resp = resp.masked_fill(~length_mask, 0)
+
+		# perform full check to assert the probability is valid
+		if check and self.full_check:
+			expsum = gen_log_prob.exp().sum(-1)
+			if not (expsum.isclose(torch.ones_like(expsum), rtol=1e-3) | ~length_mask).all():
 				raise ValueError("data[gen_log_prob_key] must be processed after log_softmax.")
 
-			if not self.generate_rare_vocab:
-				if gen_now.shape[1] != self.dataloader.frequent_vocab_size:
-					raise ValueError(("The third dimension gen_log_prob should be equals to frequent_vocab_size when "
-						"generate_rare_vocab = False, "
-						"but %d != %d") % (gen_now.shape[1], self.dataloader.frequent_vocab_size))
-			else:
-				if gen_now.shape[1] != self.dataloader.all_vocab_size:
-					raise ValueError(("The third dimension gen_log_prob should be equals to all_vocab_size "
-						"when generate_rare_vocab = True, "
-						"but %d != %d") % (gen_now.shape[1], self.dataloader.all_vocab_size))
-
-			resp_known = resp_now.clone()
-			if not self.generate_rare_vocab and self.have_unk:
-				resp_known[resp_known >= self.dataloader.frequent_vocab_size] = self.dataloader.unk_id
+		unk_id = self.dataloader.unk_id if self.have_unk else None
+		frequent_vocab_size = self.dataloader.frequent_vocab_size
+		rare_vocab_size = self.dataloader.all_vocab_size - frequent_vocab_size
 
-			unk_id = self.dataloader.unk_id if self.have_unk else None
-			frequent_vocab_size = self.dataloader.frequent_vocab_size
-			rare_vocab_size = self.dataloader.all_vocab_size - frequent_vocab_size
+		resp_known = resp.clone()
+		if not self.generate_rare_vocab and self.have_unk:
+			resp_known[resp_known >= frequent_vocab_size] = unk_id
+		valid_log_prob = gen_log_prob.gather(-1, resp_known.unsqueeze(-1))[:, :, 0].double()
+		zeros = torch.zeros_like(valid_log_prob)
 
-			# calc normal vocab
-			if self.have_unk:
-				normal_mask = ((resp_now != unk_id) & (resp_now < frequent_vocab_size)).float()
-			else:
-				normal_mask = (resp_now < frequent_vocab_size).float()
-			word_loss = -(gen_now.gather(-1, resp_known.unsqueeze(1))[:, 0] * normal_mask).sum()
-			length_sum = normal_mask.sum()
-			# calc invalid vocab
-			# smoothing from unk
-			if self.have_unk:
-				invalid_mask = (resp_now >= frequent_vocab_size).float()
-				invalid_log_prob = (gen_now[:, unk_id] - \
-							(torch.ones_like(gen_now[:, unk_id]) * rare_vocab_size).log()) * invalid_mask
-
-				if self.generate_rare_vocab:
-					extra_invalid_log_prob = gen_now.gather(-1, resp_now.unsqueeze(1))[:, 0] * invalid_mask
-					word_loss -= ((invalid_log_prob.exp() + extra_invalid_log_prob.exp()).log() \
-							* invalid_mask).sum()
-				else:
-					word_loss -= invalid_log_prob.sum()
-
-				length_sum += invalid_mask.sum()
-
-			self.word_loss += word_loss.tolist()
-			self.length_sum += length_sum.tolist()
+		# calc normal vocab
+		normal_mask = length_mask & (resp < frequent_vocab_size)
+		if self.have_unk:
+			normal_mask &= resp != unk_id
+		word_loss = -torch.where(normal_mask, valid_log_prob, zeros).sum()
+		length_sum = normal_mask.sum()
+		# calc invalid vocab
+		# smoothing from unk
+		if self.have_unk:
+			invalid_mask = length_mask & (resp >= frequent_vocab_size)
+			invalid_log_prob = gen_log_prob[:, :, unk_id].double() - \
+				torch.log(valid_log_prob.new_tensor(rare_vocab_size))
+			if self.generate_rare_vocab:
+				invalid_log_prob = (invalid_log_prob.exp() + valid_log_prob.exp()).log()
+			word_loss -= torch.where(invalid_mask, invalid_log_prob, zeros).sum()
+			length_sum += invalid_mask.sum()
+
+		# one transfer to host for the whole batch
+		word_loss, length_sum = torch.stack([word_loss, length_sum.to(word_loss.dtype)]).tolist()
+		self.word_loss += word_loss
+		self.length_sum += int(length_sum)
 
 		self._hash_unordered_list(relevant_data)
 
@@ -302,6 +528,15 @@ class PerplexityMetric(MetricBase):
 
 		return word_loss, length_sum
 
+	def peek(self) -> Dict[str, Any]:
+		'''Return the perplexity of the data forwarded so far, without closing the metric.
+		The returned dict contains the same keys as :meth:`close`.
+		'''
+		if self.length_sum == 0:
+			raise RuntimeError("The metric has not been forwarded data correctly.")
+		return {"perplexity": np.exp(self.word_loss / self.length_sum), \
+				"perplexity hashvalue": self._hashvalue()}
+
 	def close(self) -> Dict[str, Any]:
 		r'''Return a dict which contains
 
@@ -310,41 +545,7 @@ class PerplexityMetric(MetricBase):
 			  for same evaluation settings.
 		'''
 		res = super().close()
-
-		if self.engine_version == "pytorch":
-			# pytorch is finished when forward
-			if self.length_sum == 0:
-				raise RuntimeError("The metric has not been forwarded data correctly.")
-		else:
-			if not self.gen_valid_log_prob:
-				raise RuntimeError("The metric has not been forwarded data correctly.")
-
-			loader = self.dataloader
-			unk_id = loader.unk_id if self.have_unk else None
-			tasks = ((self.gen_valid_log_prob[i], self.gen_unk_log_prob[i], self.resp[i], \
-							self.generate_rare_vocab, loader.frequent_vocab_size, loader.all_vocab_size, unk_id) \
-							for i, _ in enumerate(self.gen_valid_log_prob))
-
-			# Multiprocessing seems can't boost the speed
-			# if len(self.gen_valid_log_prob) > 100:
-			# 	pool = Pool(multiprocessing.cpu_count())
-			# 	for ans in tqdm.tqdm(pool.imap_unordered(self.run_f, tasks, chunksize=20), \
-			# 		total=len(self.gen_valid_log_prob)):
-			# 		self.word_loss += ans[0]
-			# 		self.length_sum += ans[1]
-			# 	pool.close()
-			# 	pool.join()
-			# else:
-			for ans in map(self._run_f, tasks):
-				self.word_loss += ans[0]
-				self.length_sum += ans[1]
-
-			self.resp = []
-			self.gen_valid_log_prob = []
-			self.gen_unk_log_prob = []
-
-		res.update({"perplexity": np.exp(self.word_loss / self.length_sum), \
-				"perplexity hashvalue": self._hashvalue()})
+		res.update(self.peek())
 		return res
 
 class MultiTurnPerplexityMetric(MetricBase):
@@ -357,6 +558,8 @@ class MultiTurnPerplexityMetric(MetricBase):
 		{MetricBase.GEN_LOG_PROB_KEY_ARGUMENTS}
 		{MetricBase.GENERATE_RARE_VOCAB_ARGUMENTS}
 		{MetricBase.FULL_CHECK_ARGUMENTS}
+		{MetricBase.CHECK_ROWS_ARGUMENTS}
+		{MetricBase.CHECK_BATCHES_ARGUMENTS}
 
 	Here is an example:
 
@@ -391,7 +594,9 @@ class MultiTurnPerplexityMetric(MetricBase):
 					   multi_turn_reference_len_key: str = "multi_turn_ref_length", \
 					   multi_turn_gen_log_prob_key: str = "multi_turn_gen_log_prob", \
 					   generate_rare_vocab: bool = False, \
-					   full_check: bool = False \
+					   full_check: bool = False, \
+					   check_rows: int = 1, \
+					   check_batches: Optional[int] = None \
 			  ):
 		super().__init__(self._name, self._version)
 		self.dataloader = dataloader
@@ -404,7 +609,9 @@ class MultiTurnPerplexityMetric(MetricBase):
 				reference_len_key="ref_length", \
 				gen_log_prob_key="gen_log_prob", \
 				generate_rare_vocab=generate_rare_vocab, \
-				full_check=full_check)
+				full_check=full_check, \
+				check_rows=check_rows, \
+				check_batches=check_batches)
 
 	def forward(self, data: Dict[str, Any]):
 		'''Processing a batch of data.
@@ -456,14 +663,64 @@ class MultiTurnPerplexityMetric(MetricBase):
 		if len(length) != len(reference_allvocabs) or len(length) != len(gen_log_prob):
 			raise ValueError("Batch num is not matched.")
 
+		# the sessions of a batch are checked or not together
+		check = self.sub_metric._check_batch()
+		if isinstance(gen_log_prob, (np.ndarray, torch.Tensor)) and len(gen_log_prob.shape) == 4:
+			self._flat_forward(reference_allvocabs, length, gen_log_prob, check)
+			return
+
 		for i, sent_length in enumerate(length):
 			# Pass turn as batch for sub_metric, the result will be same.
 			turn_length = sent_length.index(0) if 0 in sent_length else len(sent_length)
 			if len(reference_allvocabs[i]) < turn_length or len(gen_log_prob[i]) < turn_length:
 				raise ValueError("Turn num is not matched.")
-			self.sub_metric.forward({"ref_allvocabs": reference_allvocabs[i][:turn_length], \
+			self.sub_metric._forward({"ref_allvocabs": reference_allvocabs[i][:turn_length], \
 					"ref_length": sent_length[:turn_length], \
-					"gen_log_prob": gen_log_prob[i][:turn_length]})
+					"gen_log_prob": gen_log_prob[i][:turn_length]}, check)
+
+	def _flat_forward(self, reference_allvocabs, length, gen_log_prob, check: bool):
+		# Flatten the turns of a padded ``gen_log_prob`` into ``[batch_size * turn_num, ...]``,
+		# and pass all the valid turns to ``sub_metric`` as one batch. The result is the same
+		# as passing the sessions one by one.
+		turn_lengths = np.array([list(sent_length).index(0) if 0 in list(sent_length) else len(sent_length) \
+			for sent_length in length], dtype=np.int64)
+		turn_num = gen_log_prob.shape[1]
+		if np.any(turn_lengths > turn_num) or \
+				any(len(reference_allvocabs[i]) < turn_length for i, turn_length in enumerate(turn_lengths)):
+			raise ValueError("Turn num is not matched.")
+		if not np.any(turn_lengths):
+			return
+
+		session_index = np.repeat(np.arange(len(turn_lengths)), turn_lengths)
+		turn_index = np.concatenate([np.arange(turn_length) for turn_length in turn_lengths])
+		flat_index = session_index * turn_num + turn_index
+		ref_length = [length[i][j] for i, j in zip(session_index.tolist(), turn_index.tolist())]
+
+		if isinstance(gen_log_prob, torch.Tensor):
+			flat_index = torch.as_tensor(flat_index, device=gen_log_prob.device)
+		gen_log_prob = gen_log_prob.reshape(-1, *gen_log_prob.shape[2:])[flat_index]
+		if isinstance(reference_allvocabs, (np.ndarray, torch.Tensor)) and len(reference_allvocabs.shape) == 3:
+			# the references may be padded to a different number of turns
+			ref_index = session_index * reference_allvocabs.shape[1] + turn_index
+			if isinstance(reference_allvocabs, torch.Tensor):
+				ref_index = torch.as_tensor(ref_index, device=reference_allvocabs.device)
+			reference_allvocabs = reference_allvocabs.reshape(-1, reference_allvocabs.shape[2])[ref_index]
+		else:
+			# the references of different sessions may be padded to different lengths
+			steps = max(ref_length)
+			flat_reference = np.zeros((len(ref_length), steps), dtype=np.int64)
+			for k, (i, j) in enumerate(zip(session_index.tolist(), turn_index.tolist())):
+				reference = np.array(reference_allvocabs[i][j][:steps])
+				if len(reference.shape) != 1:
+					raise ValueError("resp_allvocabs need to be 2 dimension")
+				if len(reference) < ref_length[k]:
+					raise ValueError("The length of resp_allvocabs or gen_log_prob is less than resp_length.")
+				flat_reference[k, :len(reference)] = reference
+			reference_allvocabs = flat_reference
+
+		self.sub_metric._forward({"ref_allvocabs": reference_allvocabs, \
+				"ref_length": ref_length, \
+				"gen_log_prob": gen_log_prob}, check)
 
 	def close(self) -> Dict[str, Any]:
 		r'''Return a dict which contains
@@ -475,3 +732,9 @@ class MultiTurnPerplexityMetric(MetricBase):
 		res = super().close()
 		res.update(self.sub_metric.close())
 		return res
+
+	def peek(self) -> Dict[str, Any]:
+		'''Return the perplexity of the data forwarded so far, without closing the metric.
+		The returned dict contains the same keys as :meth:`close`.
+		'''
+		return self.sub_metric.peek()
@@ -1,11 +1,87 @@
 """
 Containing some classes and functions about precision and recall evaluating results of models.
 """
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Tuple, Optional
 from itertools import chain
+import hashlib
+import threading
+import weakref
 import numpy as np
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
 from .metric import MetricBase
+from .bleu_utils import BleuStatistics, check_bleu_engine
+from .._utils.imports import LazyObject
+
+sentence_bleu = LazyObject("nltk.translate.bleu_score.sentence_bleu")
+SmoothingFunction = LazyObject("nltk.translate.bleu_score.SmoothingFunction")
+
+class PairwiseBleuScorer:
+	'''Pairwise BLEU statistics between the references and the generated sentences of a batch.
+	It can be shared by several :class:`BleuPrecisionRecallMetric` forwarded with the same data
+	(e.g. the metrics of different ``ngram``), and the n-grams of a batch are only counted once.
+	The statistics of the last batch are kept.
+
+	Arguments:
+		max_order (int, optional): The maximum order of n-grams. It can't be less than the ``ngram``
+			of the metrics using the scorer. Default: ``4``.
+	'''
+	def __init__(self, max_order: int = 4):
+		self.max_order = max_order
+		self._lock = threading.Lock()
+		self._last_batch = None # type: Any
+		self._last_statistics = [] # type: List[BleuStatistics]
+
+	def compute(self, gens: List[List[List[int]]], references: List[List[List[int]]]) -> List[BleuStatistics]:
+		'''Return the pairwise statistics of each context (see :meth:`BleuStatistics.compute_pairwise`).
+
+		Arguments:
+			gens (list): list of generated sentences of each context.
+			references (list): list of references of each context.
+		'''
+		with self._lock:
+			if self._last_batch == (gens, references):
+				return self._last_statistics
+		statistics = [BleuStatistics.compute_pairwise(reference, gen, self.max_order) \
+			for gen, reference in zip(gens, references)]
+		with self._lock:
+			self._last_batch, self._last_statistics = (gens, references), statistics
+		return statistics
+
+class _EmbeddingTable:
+	# Embeddings of all the words in the vocabulary of ``dataloader``, indexed by ids.
+	def __init__(self, dataloader: Union["LanguageProcessing", "Sentence", "Session"], \
+			embeddings: np.ndarray, known: np.ndarray):
+		self.dataloader = dataloader
+		self.embeddings = embeddings
+		self.known = known
+
+	def lookup(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+		'''Return the embeddings of ``ids`` and whether the words are in ``word2vec``.'''
+		return self.embeddings[ids], self.known[ids]
+
+# The embedding tables shared by the EmbSimilarityPrecisionRecallMetric of different modes.
+# A table is released with the last metric using it, and it keeps the dataloader alive, so the id is not reused.
+# (id(dataloader), digest of the embeddings) -> _EmbeddingTable
+_EMBEDDING_TABLES = weakref.WeakValueDictionary() # type: weakref.WeakValueDictionary[Tuple[int, str], _EmbeddingTable]
+_EMBEDDING_TABLES_LOCK = threading.Lock()
+
+def _get_embedding_table(dataloader: Union["LanguageProcessing", "Sentence", "Session"], \
+		word2vec: Dict[str, Any]) -> _EmbeddingTable:
+	words = dataloader.convert_ids_to_tokens(list(range(dataloader.all_vocab_size)), remove_special=False, trim=False)
+	known = np.array([word in word2vec for word in words], dtype=bool)
+	dim = len(next(iter(word2vec.values()))) if word2vec else 0
+	embeddings = np.zeros((len(words), dim), dtype=np.float64)
+	if known.any():
+		embeddings[known] = [word2vec[word] for word in words if word in word2vec]
+	# the digest identifies the embeddings of the vocabulary, so a modified ``word2vec`` gets a new table
+	digest = hashlib.sha256(known.tobytes())
+	digest.update(embeddings.tobytes())
+	key = (id(dataloader), digest.hexdigest())
+	with _EMBEDDING_TABLES_LOCK:
+		table = _EMBEDDING_TABLES.get(key)
+		if table is None:
+			table = _EmbeddingTable(dataloader, embeddings, known)
+			_EMBEDDING_TABLES[key] = table
+	return table
 
 class _PrecisionRecallMetric(MetricBase):
 	"""Base class for precision recall metrics. This is an abstract class.
@@ -52,6 +128,30 @@ class _PrecisionRecallMetric(MetricBase):
 		raise NotImplementedError( \
 			"This function should be implemented by subclasses.")
 
+	def _score_matrix(self, gen: List[List[int]], reference: List[List[int]]) -> np.ndarray:
+		'''Return the matrix of scores between each reference (row) and each generated sentence (column).
+		It calls :func:`_score` for each pair by default.
+
+		Arguments:
+			gen (list): list of generated sentences.
+			reference (list): list of references.
+		'''
+		# pylint: disable=no-member
+		matrix = np.zeros((len(reference), len(gen)), dtype=np.float32)
+		for i, single_ref in enumerate(reference):
+			for j, single_gen in enumerate(gen):
+				matrix[i][j] = self._score(single_gen, single_ref)
+		return matrix
+
+	def _score_matrices(self, gens: List[List[List[int]]], references: List[List[List[int]]]) -> List[np.ndarray]:
+		'''Return the score matrices of a batch. It calls :func:`_score_matrix` for each context by default.
+
+		Arguments:
+			gens (list): list of generated sentences of each context.
+			references (list): list of references of each context.
+		'''
+		return [self._score_matrix(gen, reference) for gen, reference in zip(gens, references)]
+
 	def forward(self, data: Dict[str, Any]):
 		'''Processing a batch of data.
 
@@ -104,12 +204,7 @@ class _PrecisionRecallMetric(MetricBase):
 					the specified `generated_num_per_context`")
 
 		self._hash_unordered_list(list(chain(*references)))
-		for reference, gen in zip(references, gens):
-			# pylint: disable=no-member
-			matrix = np.zeros((len(reference), len(gen)), dtype=np.float32)
-			for i, single_ref in enumerate(reference):
-				for j, single_gen in enumerate(gen):
-					matrix[i][j] = self._score(single_gen, single_ref)
+		for reference, gen, matrix in zip(references, gens, self._score_matrices(gens, references)):
 			self.prec_list.append(float(np.sum(np.max(matrix, 0))) / len(gen))
 			self.rec_list.append(float(np.sum(np.max(matrix, 1))) / len(reference))
 
@@ -141,6 +236,10 @@ class BleuPrecisionRecallMetric(_PrecisionRecallMetric):
 	Arguments:
 		{_PrecisionRecallMetric.ARGUMENTS}
 		ngram (int): Specifies using BLEU-ngram.
+		{MetricBase.BLEU_ENGINE_ARGUMENTS}
+		scorer (:class:`PairwiseBleuScorer`, optional): The scorer shared with other metrics
+			forwarded with the same data, which is only used by the ``native`` engine.
+			Default: If ``None``, a scorer owned by the metric is used.
 
 	Here is an exmaple:
 
@@ -168,11 +267,20 @@ class BleuPrecisionRecallMetric(_PrecisionRecallMetric):
 				 ngram: int, \
 				 generated_num_per_context: int, \
 				 candidates_allvocabs_key: str = 'candidate_allvocabs', \
-				 multiple_gen_key: str = 'multiple_gen'):
+				 multiple_gen_key: str = 'multiple_gen', \
+				 engine: str = "native", \
+				 scorer: Optional[PairwiseBleuScorer] = None):
 		super().__init__(self._name, self._version, \
 				dataloader, generated_num_per_context, candidates_allvocabs_key, \
 				multiple_gen_key)
+		check_bleu_engine(engine)
+		if scorer is None:
+			scorer = PairwiseBleuScorer(ngram)
+		elif scorer.max_order < ngram:
+			raise ValueError("The max_order of the scorer is less than ngram.")
+		self.scorer = scorer
 		self.ngram = ngram
+		self.engine = engine
 		self.weights = [1 / ngram] * ngram
 		self.res_prefix = 'BLEU-{}'.format(ngram)
 		self._hash_ordered_data([ngram, generated_num_per_context])
@@ -210,6 +318,13 @@ class BleuPrecisionRecallMetric(_PrecisionRecallMetric):
 		gen = self._replace_unk(gen)
 		return sentence_bleu([reference], gen, self.weights, SmoothingFunction().method1)
 
+	def _score_matrices(self, gens: List[List[List[int]]], references: List[List[List[int]]]) -> List[np.ndarray]:
+		if self.engine != "native":
+			return super()._score_matrices(gens, references)
+		gens = [[self._replace_unk(single_gen) for single_gen in gen] for gen in gens]
+		return [np.array(stats.sentence_bleu(self.weights), dtype=np.float32).reshape(len(reference), len(gen)) \
+			for gen, reference, stats in zip(gens, references, self.scorer.compute(gens, references))]
+
 class EmbSimilarityPrecisionRecallMetric(_PrecisionRecallMetric):
 	'''Metric for calculating cosine similarity precision and recall.
 
@@ -269,6 +384,7 @@ class EmbSimilarityPrecisionRecallMetric(_PrecisionRecallMetric):
 			raise ValueError("mode should be 'avg' or 'extrema'.")
 		self.word2vec = word2vec
 		self.mode = mode
+		self._embedding_table = _get_embedding_table(dataloader, word2vec)
 		self.res_prefix = '{}-bow'.format(mode)
 		self._hash_ordered_data([mode, generated_num_per_context] + \
 				[(word, list(emb)) for word, emb in self.word2vec.items()])
@@ -308,3 +424,46 @@ class EmbSimilarityPrecisionRecallMetric(_PrecisionRecallMetric):
 			  np.sqrt(np.sum(gen_embed * gen_embed) * np.sum(ref_embed * ref_embed))
 		norm = (cos + 1) / 2
 		return norm
+
+	def _bag_of_words(self, sentences: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+		'''Return the normalized bag-of-word embeddings of ``sentences``,
+		and whether each sentence contains any word in ``word2vec``.'''
+		lengths = np.array([len(sent) for sent in sentences], dtype=np.int64)
+		ids = np.fromiter(chain.from_iterable(sentences), dtype=np.int64, count=int(lengths.sum()))
+		embeddings, known = self._embedding_table.lookup(ids)
+		sentence_ids = np.repeat(np.arange(len(sentences)), lengths)[known]
+		embeddings = embeddings[known]
+
+		counts = np.bincount(sentence_ids, minlength=len(sentences))
+		valid = counts > 0
+		# segment reductions over the known words of each sentence
+		starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[valid]
+		bow = np.zeros((len(sentences), embeddings.shape[1]), dtype=np.float64)
+		if valid.any():
+			if self.mode == 'avg':
+				bow[valid] = np.add.reduceat(embeddings, starts, axis=0) / counts[valid, None]
+			else:
+				bow[valid] = np.maximum.reduceat(embeddings, starts, axis=0)
+		bow[valid] /= np.sqrt(np.sum(bow[valid] * bow[valid], axis=1, keepdims=True))
+		return bow, valid
+
+	def _score_matrices(self, gens: List[List[List[int]]], references: List[List[List[int]]]) -> List[np.ndarray]:
+		ref_nums = [len(reference) for reference in references]
+		sentences = [self.dataloader.remove_special_in_ids(sent) for sent in chain(*references, *gens)]
+		bow, valid = self._bag_of_words(sentences)
+		ref_bow, gen_bow = bow[:sum(ref_nums)], bow[sum(ref_nums):]
+		ref_valid, gen_valid = valid[:sum(ref_nums)], valid[sum(ref_nums):]
+
+		# pad the references of each context, then compute all the cosine similarities with one matmul
+		max_ref_num = max(ref_nums, default=0)
+		rows = np.concatenate([np.arange(num) for num in ref_nums] + [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+		contexts = np.repeat(np.arange(len(references)), ref_nums)
+		padded_bow = np.zeros((len(references), max_ref_num, bow.shape[1]), dtype=np.float64)
+		padded_bow[contexts, rows] = ref_bow
+		padded_valid = np.zeros((len(references), max_ref_num), dtype=bool)
+		padded_valid[contexts, rows] = ref_valid
+		gen_bow = gen_bow.reshape(len(gens), self.generated_num_per_context, bow.shape[1])
+		gen_valid = gen_valid.reshape(len(gens), self.generated_num_per_context)
+		cos = np.matmul(padded_bow, gen_bow.transpose(0, 2, 1))
+		scores = np.where(padded_valid[:, :, None] & gen_valid[:, None, :], (cos + 1) / 2, 0).astype(np.float32)
+		return [score[:num] for score, num in zip(scores, ref_nums)]
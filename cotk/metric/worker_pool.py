@@ -0,0 +1,133 @@
+r"""
+``cotk.metric.worker_pool`` provides a process pool shared by all the metrics.
+"""
+from typing import Any, Callable, Iterator, List, Tuple
+from collections import OrderedDict
+from itertools import count
+import atexit
+import os
+import pickle
+import tempfile
+import threading
+import weakref
+
+from .._utils import FORK_LOCK
+from .._utils.imports import LazyObject
+
+Pool = LazyObject("multiprocessing.Pool")
+
+# The data of the latest tasks in a worker process. token -> data
+_worker_data = OrderedDict() # type: OrderedDict[Tuple[int, int], Any]
+# Several metrics may use the pool at the same time (e.g. from several threads)
+_MAX_WORKER_DATA = 4
+# The maximum number of pools (with different numbers of processes) kept alive
+_MAX_POOLS = 2
+# The data of each call of :meth:`WorkerPool.imap` is identified by a token (pid, count),
+# because the path of a removed data file may be used again.
+_data_tokens = count()
+
+def _load_data(token: Tuple[int, int], path: str) -> Any:
+	if token in _worker_data:
+		_worker_data.move_to_end(token)
+	else:
+		with open(path, "rb") as data_file:
+			_worker_data[token] = pickle.load(data_file)
+		if len(_worker_data) > _MAX_WORKER_DATA:
+			_worker_data.popitem(last=False)
+	return _worker_data[token]
+
+def _remove_file(path: str):
+	if os.path.exists(path):
+		os.remove(path)
+
+def _retire_pool(pool):
+	# The tasks already submitted are finished before the processes exit.
+	pool.close()
+	pool.join()
+
+def _run_chunk(task):
+	func, token, path, start, stop = task
+	data = _load_data(token, path)
+	return [func(data, i) for i in range(start, stop)]
+
+class WorkerPool:
+	'''A process pool shared by all the metrics in a process.
+	The processes are created when the pool is used with a number of processes for the first time,
+	and reused until :meth:`close` is called. Only the pools of the latest used numbers of processes are kept,
+	and older ones exit once their tasks are finished. It can be used by several threads at the same time.
+
+	The data used by tasks is sent to each process only once, and every task only carries a range of indices.
+	'''
+	def __init__(self):
+		self._pools = OrderedDict() # type: OrderedDict[int, Any]
+		self._lock = threading.Lock()
+		self._pid = os.getpid()
+		self._inherited_pools = [] # type: List[Any]
+
+	def _check_pid(self):
+		# The pools of the parent process can not be used in a forked process (e.g. by :class:`.metric.MetricChain`),
+		# where their threads do not exist. They are kept but never used, since collecting them would notify
+		# the threads of the parent process.
+		if self._pid != os.getpid():
+			self._inherited_pools.extend(self._pools.values())
+			self._pools = OrderedDict()
+			self._lock = threading.Lock()
+			self._pid = os.getpid()
+
+	def imap(self, func: Callable[[Any, int], Any], data: Any, num: int, processes: int, \
+			chunksize: int = 20) -> Iterator[Any]:
+		'''Return an iterator of ``func(data, i)`` for ``i`` in ``range(num)``, which are computed
+		by ``processes`` worker processes. The results are in order.
+
+		Arguments:
+			func (Callable[[Any, int], Any]): A function defined at the top level of a module.
+			data (Any): The data shared by all the tasks. It should be picklable.
+			num (int): The number of tasks.
+			processes (int): The number of worker processes.
+			chunksize (int, optional): The number of indices in a task. Default: ``20``.
+		'''
+		self._check_pid()
+		with self._lock:
+			if processes in self._pools:
+				self._pools.move_to_end(processes)
+			else:
+				with FORK_LOCK:
+					self._pools[processes] = Pool(processes)
+				if len(self._pools) > _MAX_POOLS:
+					_, old_pool = self._pools.popitem(last=False)
+					threading.Thread(target=_retire_pool, args=(old_pool,), daemon=True).start()
+			pool = self._pools[processes]
+
+		with tempfile.NamedTemporaryFile(suffix=".pkl", delete=False) as data_file:
+			pickle.dump(data, data_file, protocol=pickle.HIGHEST_PROTOCOL)
+		token = (os.getpid(), next(_data_tokens))
+		tasks = [(func, token, data_file.name, start, min(start + chunksize, num)) \
+			for start in range(0, num, chunksize)]
+		results = self._iter_results(pool.imap(_run_chunk, tasks), data_file.name)
+		# remove the data file even if the results are not consumed
+		weakref.finalize(results, _remove_file, data_file.name)
+		return results
+
+	@staticmethod
+	def _iter_results(chunks, path):
+		try:
+			for chunk in chunks:
+				yield from chunk
+		finally:
+			_remove_file(path)
+
+	def close(self):
+		'''Terminate the worker processes. New processes will be created when the pool is used again.'''
+		self._check_pid()
+		with self._lock:
+			for pool in self._pools.values():
+				pool.terminate()
+				pool.join()
+			self._pools.clear()
+
+_WORKER_POOL = WorkerPool()
+atexit.register(_WORKER_POOL.close)
+
+def get_worker_pool() -> WorkerPool:
+	'''Return the :class:`WorkerPool` shared by all the metrics.'''
+	return _WORKER_POOL
@@ -1,17 +1,30 @@
 r""" A implemention of KneserNey Interpolated Language Model.
 """
 import os
-from functools import partial
-from itertools import chain
+import json
+from itertools import chain, count
 from collections import Counter
-import multiprocessing
-from multiprocessing import Pool
-import tqdm
-
-from nltk.lm.preprocessing import pad_both_ends
-from nltk.util import everygrams
 import numpy as np
 
+from .._utils import FORK_LOCK
+from .._utils.imports import LazyModule
+
+multiprocessing = LazyModule("multiprocessing", globals())
+tqdm = LazyModule("tqdm", globals())
+
+# the version of the file format of :meth:`KneserNeyInterpolated.save`
+_FILE_VERSION = 1
+
+# The (model, contexts, words) scored by the worker processes, which are inherited through ``fork``.
+# Several models may be scored at the same time by different threads. token -> task
+_forked_tasks = {}
+_forked_task_tokens = count()
+
+def _score_forked(chunk):
+	token, start, stop = chunk
+	model, contexts, words = _forked_tasks[token]
+	return model._word_probs(words[start:stop], contexts[start:stop])
+
 
 class KneserNeyInterpolated:
 	r'''Language model with modified Kneser-Ney smoothing.
@@ -32,6 +45,11 @@ class KneserNeyInterpolated:
 	Warning:
 	    Default discounts will be adopted only when failing to estimate optimal discounts from the
 	    	training corpus
+
+	The words are encoded as integers, and the n-grams of each order are stored as a sorted array of
+	64-bit keys, where the key of an n-gram is ``rank(prefix) * vocab_num + last_word`` and ``rank(prefix)``
+	is the index of its first ``n - 1`` words in the keys of ``(n - 1)``-grams. All the statistics are
+	arrays aligned with the keys.
 	'''
 	def __init__(self, order, left_pad_symbol, right_pad_symbol, unk_symbol, cutoff=1, \
 				 default_delta_1=0.1, default_delta_2=0.1, default_delta_3=0.1, \
@@ -45,9 +63,17 @@ class KneserNeyInterpolated:
 		self.default_delta_2 = default_delta_2
 		self.default_delta_3 = default_delta_3
 		self.word2cnt = {}
-		self.n2ngram2cnt = {n: {} for n in range(1, self.order + 1)}
-		self.suffix2concnt = {}
-		self.midseq2concnt = {}
+		# the vocabulary after masking infrequent words
+		self.word2id = {}
+		# sorted keys of n-grams, where the only 0-gram (the empty tuple) has key 0
+		self.n2keys = {0: np.zeros(1, dtype=np.int64)}
+		self.n2ngram_counts = {}
+		# the number of distinct words before an n-gram (for n in 1..order-1)
+		self.n2suffix_counts = {}
+		# the number of distinct pairs of words around an n-gram (for n in 0..order-2)
+		self.n2midseq_counts = {}
+		# the discounted mass of the words after an n-gram (for n in 0..order-1)
+		self.n2gamma = {}
 		self.n2cnt2discount = {n: {} for n in range(1, self.order + 1)}
 		if cpu_count is not None:
 			self.cpu_count = cpu_count
@@ -59,18 +85,18 @@ class KneserNeyInterpolated:
 	@property
 	def vocab_size(self):
 		r"""the size of vocabulary"""
-		res = len(self.n2ngram2cnt[1])
-		if (self.unk_symbol, ) not in self.n2ngram2cnt[1]:
+		res = len(self.n2keys.get(1, ()))
+		if self._rank((self.word2id[self.unk_symbol], )) < 0:
 			res += 1
 		return res
 
 	def _mask_oov(self, ngram):
 		r'''Replace infrequent words (with counts less than ``cutoff``) with ``unk_symbol``
 		'''
+		pad_symbols = (self.left_pad_symbol, self.right_pad_symbol)
 		res = []
 		for word in ngram:
-			if self.word2cnt.get(word, 0) < self.cutoff and \
-					word not in [self.left_pad_symbol, self.right_pad_symbol]:
+			if self.word2cnt.get(word, 0) < self.cutoff and word not in pad_symbols:
 				res.append(self.unk_symbol)
 			else:
 				res.append(word)
@@ -85,43 +111,82 @@ class KneserNeyInterpolated:
 		self.word2cnt = Counter(chain(*corpus))
 		self.word2cnt[self.left_pad_symbol] = len(corpus) * (self.order - 1)
 		self.word2cnt[self.right_pad_symbol] = len(corpus) * (self.order - 1)
-		padding_fn = partial(pad_both_ends, n=self.order, \
-							 left_pad_symbol=self.left_pad_symbol, \
-							 right_pad_symbol=self.right_pad_symbol)
-		train_data = (everygrams(list(padding_fn(sent)), max_len=self.order) for sent in corpus)
-
-		for sent in train_data:
-			for ngram in sent:
-				ngram = self._mask_oov(ngram)
-				order = len(ngram)
-				self.n2ngram2cnt[order][ngram] = self.n2ngram2cnt[order].get(ngram, 0) + 1
-
-				if len(ngram) >= 2:
-					suffix = ngram[1:]
-					midseq = ngram[1:-1]
-					if suffix not in self.suffix2concnt:
-						self.suffix2concnt[suffix] = set()
-					self.suffix2concnt[suffix].add(ngram[0])
-
-					if midseq not in self.midseq2concnt:
-						self.midseq2concnt[midseq] = set()
-					self.midseq2concnt[midseq].add((ngram[0], ngram[-1]))
-
-		for stat in [self.suffix2concnt, self.midseq2concnt]:
-			for key, val in stat.items():
-				stat[key] = len(val)
+
+		pad_symbols = (self.left_pad_symbol, self.right_pad_symbol)
+		self.word2id = {self.unk_symbol: 0}
+		for word in chain(pad_symbols, self.word2cnt):
+			if word not in self.word2id and (self.word2cnt[word] >= self.cutoff or word in pad_symbols):
+				self.word2id[word] = len(self.word2id)
+		unk_id = self.word2id[self.unk_symbol]
+		vocab_num = len(self.word2id)
+
+		# pad both ends with ``order - 1`` symbols, and mask infrequent words
+		left_pad, right_pad = [self.left_pad_symbol] * (self.order - 1), [self.right_pad_symbol] * (self.order - 1)
+		sent_lengths = np.array([len(sent) + 2 * (self.order - 1) for sent in corpus], dtype=np.int64)
+		tokens = np.fromiter((self.word2id.get(word, unk_id) for sent in corpus \
+			for word in chain(left_pad, sent, right_pad)), dtype=np.int64, count=int(sent_lengths.sum()))
+		# the number of words from a position to the end of its sentence
+		remains = np.repeat(np.cumsum(sent_lengths), sent_lengths) - np.arange(len(tokens))
+
+		# the rank of the n-gram starting at each position (-1 if it exceeds the sentence)
+		n2position_rank = {0: np.zeros(len(tokens), dtype=np.int64)}
+		self.n2keys = {0: np.zeros(1, dtype=np.int64)}
+		self.n2ngram_counts, self.n2suffix_counts, self.n2midseq_counts = {}, {}, {}
+		for n in range(1, self.order + 1):
+			starts = np.nonzero(remains >= n)[0]
+			keys = n2position_rank[n - 1][starts] * vocab_num + tokens[starts + n - 1]
+			self.n2keys[n], first, inverse, self.n2ngram_counts[n] = \
+				np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+			n2position_rank[n] = np.full(len(tokens), -1, dtype=np.int64)
+			n2position_rank[n][starts] = inverse.reshape(-1)
+
+			if n >= 2:
+				# distinct n-grams with the same suffix (midseq) differ in the first word (the first and last words)
+				next_starts = starts[first] + 1
+				self.n2suffix_counts[n - 1] = np.bincount(n2position_rank[n - 1][next_starts], \
+					minlength=len(self.n2keys[n - 1]))
+				self.n2midseq_counts[n - 2] = np.bincount(n2position_rank[n - 2][next_starts], \
+					minlength=len(self.n2keys[n - 2]))
 
 		self._compute_discount()
+		self._compute_gamma()
+
+	def _rank(self, ngram):
+		r'''Return the index of ``ngram`` (a tuple of word ids) in ``n2keys``, or ``-1`` if it is not in the corpus.
+		'''
+		return int(self._ranks(np.array([ngram], dtype=np.int64))[0])
+
+	def _ranks(self, ngrams):
+		r'''Return the indices of ``ngrams`` (an array of word ids, whose shape is ``(num, n)``) in ``n2keys``.
+		The index is ``-1`` if the n-gram is not in the corpus.
+		'''
+		ranks = np.zeros(len(ngrams), dtype=np.int64)
+		for n in range(1, ngrams.shape[1] + 1):
+			ranks = self._child_ranks(n, ranks, ngrams[:, n - 1])
+		return ranks
+
+	def _child_ranks(self, n, ranks, words):
+		r'''Return the indices of n-grams consisting of the (n - 1)-grams at ``ranks`` and ``words``.
+		'''
+		keys = self.n2keys.get(n, np.zeros(0, dtype=np.int64))
+		query = ranks * len(self.word2id) + words
+		pos = np.searchsorted(keys, query)
+		found = (ranks >= 0) & (words >= 0) & (pos < len(keys))
+		found[found] = keys[pos[found]] == query[found]
+		return np.where(found, pos, -1)
+
+	@staticmethod
+	def _lookup(stat, ranks):
+		res = np.zeros(len(ranks), dtype=stat.dtype)
+		res[ranks >= 0] = stat[ranks[ranks >= 0]]
+		return res
 
 	def _compute_discount(self):
 		r'''Compute discounts for each ngram-level
 		'''
 		#pylint: disable=invalid-name
 		for order in range(1, self.order + 1):
-			n = [0] * 4
-			for _, cnt in self.n2ngram2cnt[order].items():
-				if cnt < 5:
-					n[cnt - 1] += 1
+			n = [int(num) for num in np.bincount(self.n2ngram_counts[order], minlength=5)[1:5]]
 			self.n2cnt2discount[order][0] = 0
 			try:
 				Y = n[0] / (n[0] + 2 * n[1])
@@ -133,6 +198,33 @@ class KneserNeyInterpolated:
 				self.n2cnt2discount[order][2] = self.default_delta_2
 				self.n2cnt2discount[order][3] = self.default_delta_3
 
+	def _compute_gamma(self):
+		r'''Compute the discounted mass of the continuations of each context
+		'''
+		self.n2gamma = {}
+		if self.order == 1:
+			return
+		for n in range(1, self.order + 1):
+			denominator_stat, _ = self._get_stats(n)
+			discounts = self._get_discounts(n, denominator_stat)
+			# the first n - 1 words of an n-gram are its context
+			self.n2gamma[n - 1] = np.bincount(self.n2keys[n] // len(self.word2id), \
+				weights=np.where(denominator_stat >= discounts, discounts, 0), minlength=len(self.n2keys[n - 1]))
+
+	def _get_stats(self, n):
+		r'''Return the statistics of n-grams and (n - 1)-grams, which are the denominators and numerators
+		of the probabilities of n-grams.
+		'''
+		if n == self.order:
+			return self.n2ngram_counts[n], self.n2ngram_counts[n - 1]
+		else:
+			return self.n2suffix_counts[n], self.n2midseq_counts[n - 1]
+
+	def _get_discounts(self, order, cnts):
+		r'''Return discounts for the given ngram-level (``order``) and an array of word ``cnts``
+		'''
+		return np.array([self._get_discount(order, cnt) for cnt in range(4)])[np.minimum(cnts, 3)]
+
 	def _get_discount(self, order, cnt):
 		r'''Return discount for the given ngram-level (``order``) and word ``cnt``
 		'''
@@ -141,35 +233,52 @@ class KneserNeyInterpolated:
 		else:
 			return self.n2cnt2discount[order][cnt]
 
-	def _word_prob(self, word, context):
-		r'''Compute the probability of omitting ``word`` given ``context``
+	def _word_probs(self, words, contexts):
+		r'''Compute the probabilities of omitting ``words`` given ``contexts``, which are arrays of word ids
+		whose shapes are ``(num, )`` and ``(num, length)``. Unknown words are ``-1``. The probabilities are
+		given by the lower-order distribution if ``length`` is less than ``order - 1``.
 		'''
-		ngram = context + (word,)
-		if len(ngram) == self.order:
-			if self.order == 1:
-				return 1 / self.vocab_size
-			denominator_stat = self.n2ngram2cnt[self.order]
-			numerator_stat = self.n2ngram2cnt[self.order - 1]
-		else:
-			denominator_stat = self.suffix2concnt
-			numerator_stat = self.midseq2concnt
-		denominator = denominator_stat.get(ngram, 0)
-		numerator = numerator_stat.get(context, 0)
-		if numerator == 0:
-			return self._word_prob(word, context[1:])
-		else:
-			alpha = max(0, denominator - self._get_discount(len(ngram), denominator)) / numerator
-			gamma = 0
-			for unigram in self.n2ngram2cnt[1]:
-				cnt = denominator_stat.get(context + unigram, 0)
-				discount = self._get_discount(len(ngram), cnt)
-				if cnt >= discount:
-					gamma += discount
-			gamma /= numerator
-			if gamma == 0:
-				gamma = 1
-			return alpha + gamma * (self._word_prob(word, context[1:]) \
-									if context else 1 / self.vocab_size)
+		probs = np.full(len(words), 1 / self.vocab_size)
+		if self.order == 1:
+			return probs
+		# interpolate from the shortest context to the longest one
+		for start in range(contexts.shape[1], -1, -1):
+			n = contexts.shape[1] - start + 1
+			denominator_stat, numerator_stat = self._get_stats(n)
+			context_ranks = self._ranks(contexts[:, start:])
+			numerators = self._lookup(numerator_stat, context_ranks)
+			denominators = self._lookup(denominator_stat, self._child_ranks(n, context_ranks, words))
+			valid = numerators > 0
+			numerators = np.where(valid, numerators, 1)
+			alphas = np.maximum(0, denominators - self._get_discounts(n, denominators)) / numerators
+			gammas = self._lookup(self.n2gamma[n - 1], context_ranks) / numerators
+			gammas[gammas == 0] = 1
+			probs = np.where(valid, alphas + gammas * probs, probs)
+		return probs
+
+	def _encode_corpus(self, corpus):
+		r'''Return the ids of ``(contexts, words, sentences)`` of all the words to be scored in ``corpus``,
+		where ``sentences`` are the indices of the sentences. The words are masked as :meth:`score`.
+		'''
+		# word -> (id in a context, id as the omitted word)
+		word2ids = {}
+		for word in chain((self.left_pad_symbol, self.right_pad_symbol), *corpus):
+			if word not in word2ids:
+				masked_word = self.unk_symbol if self.word2cnt.get(word, 0) < self.cutoff else word
+				word2ids[word] = (self.word2id.get(self._mask_oov((word, ))[0], -1), \
+					self.word2id.get(masked_word, -1))
+
+		left_pad, right_pad = [self.left_pad_symbol] * self.order, [self.right_pad_symbol]
+		sent_lengths = np.array([len(sent) + 1 for sent in corpus], dtype=np.int64)
+		ids = np.array([word2ids[word] for sent in corpus for word in chain(left_pad, sent, right_pad)], \
+			dtype=np.int64).reshape(-1, 2)
+		sentences = np.repeat(np.arange(len(corpus)), sent_lengths)
+		# the i-th word of a sentence starting at ``offset`` is omitted after ``ids[offset + i + 1: offset + i + order]``
+		offsets = np.cumsum(sent_lengths + self.order) - sent_lengths - self.order
+		starts = offsets[sentences] + np.arange(len(sentences)) - (np.cumsum(sent_lengths) - sent_lengths)[sentences]
+		contexts = ids[starts[:, None] + np.arange(1, self.order), 0]
+		words = ids[starts + self.order, 1]
+		return contexts, words, sentences
 
 	def score(self, word, context):
 		r'''Compute the probability of omitting ``word`` given ``context``
@@ -188,7 +297,8 @@ class KneserNeyInterpolated:
 		ngram = context + (word, )
 		if len(ngram) != self.order:
 			raise RuntimeError('Provided context should be {}-gram.'.format(self.order - 1))
-		return self._word_prob(word, context)
+		context = np.array([[self.word2id.get(word, -1) for word in context]], dtype=np.int64).reshape(1, -1)
+		return float(self._word_probs(np.array([self.word2id.get(word, -1)]), context)[0])
 
 	def sent_log_prob(self, sent):
 		r'''Compute the log probability of omitting sentence ``sent``
@@ -199,19 +309,36 @@ class KneserNeyInterpolated:
 		Returns:
 		    (float): \log{P(sent)}
 		'''
-		log_prob = 0
-		sent_now = [self.left_pad_symbol] * self.order + sent + [self.right_pad_symbol]
-		for i in range(len(sent) + 1):
-			log_prob += np.log(self.score(sent_now[i + self.order], tuple(sent_now[i + 1:i + self.order])))
-		return log_prob
+		return float(self.corpus_log_prob([sent])[0])
 
-	@classmethod
-	def _set_language_model(cls, language_model):
-		cls.language_model = language_model
+	def corpus_log_prob(self, corpus):
+		r'''Compute the log probability of omitting each sentence in ``corpus``. The words are scored in bulk,
+		and by ``cpu_count`` worker processes if ``corpus`` has more than 100 sentences.
 
-	@classmethod
-	def _compute_sent_log_prob(cls, sent):
-		return cls.language_model.sent_log_prob(sent)
+		Arguments:
+		    corpus (list of list): Each inner list is a sentence (a sequence of words)
+
+		Returns:
+		    (:class:`numpy.ndarray`): \log{P(sent)} of each sentence
+		'''
+		contexts, words, sentences = self._encode_corpus(corpus)
+		if len(corpus) > 100 and self.cpu_count > 0 and "fork" in multiprocessing.get_all_start_methods():
+			# the worker processes inherit the tables and the corpus instead of unpickling them
+			token = next(_forked_task_tokens)
+			_forked_tasks[token] = (self, contexts, words)
+			chunksize = -(-len(words) // (self.cpu_count * 4))
+			chunks = [(token, start, start + chunksize) for start in range(0, len(words), chunksize)]
+			try:
+				with FORK_LOCK:
+					pool = multiprocessing.get_context("fork").Pool(self.cpu_count)
+				with pool:
+					probs = list(tqdm.tqdm(pool.imap(_score_forked, chunks), total=len(chunks)))
+			finally:
+				del _forked_tasks[token]
+			probs = np.concatenate(probs) if probs else np.zeros(0)
+		else:
+			probs = self._word_probs(words, contexts)
+		return np.bincount(sentences, weights=np.log(probs), minlength=len(corpus))
 
 	def perplexity(self, corpus):
 		r'''Compute perplexity when generating the given ``corpus``
@@ -222,19 +349,115 @@ class KneserNeyInterpolated:
 		Returns:
 		    (float): Perplexity when generating ``corpus``
 		'''
-		log_probs = []
-		if len(corpus) > 100 and self.cpu_count > 0:
-			pool = Pool(self.cpu_count, initializer=self._set_language_model, initargs=(self,))
-			for lp in tqdm.tqdm(pool.imap_unordered(self._compute_sent_log_prob, corpus, chunksize=40), \
-								total=len(corpus)):
-				log_probs.append(lp)
-			pool.close()
-			pool.join()
-		else:
-			if len(corpus) > 100:
-				tasks = tqdm.tqdm(corpus, total=len(corpus))
-			else:
-				tasks = corpus
-			for sent in tasks:
-				log_probs.append(self.sent_log_prob(sent))
-		return np.exp(-sum(log_probs) / sum(map(len, corpus)))
+		return np.exp(-np.sum(self.corpus_log_prob(corpus)) / sum(map(len, corpus)))
+
+	def _ngram_ids(self, n):
+		r'''Return the word ids of all the n-grams in the order of ``n2keys[n]``, whose shape is ``(num, n)``.
+		'''
+		ids = np.zeros((1, 0), dtype=np.int64)
+		for m in range(1, n + 1):
+			keys = self.n2keys[m]
+			ids = np.concatenate([ids[keys // len(self.word2id)], (keys % len(self.word2id))[:, None]], axis=1)
+		return ids
+
+	def save(self, path):
+		r'''Save the trained model to ``path`` (a ``.npz`` file), which can be loaded by :meth:`load`.
+		The words should be strings (or ``None``).
+
+		Arguments:
+		    path (str): The path of the file.
+		'''
+		config = {
+			"version": _FILE_VERSION,
+			"order": self.order,
+			"left_pad_symbol": self.left_pad_symbol,
+			"right_pad_symbol": self.right_pad_symbol,
+			"unk_symbol": self.unk_symbol,
+			"cutoff": self.cutoff,
+			"default_delta": [self.default_delta_1, self.default_delta_2, self.default_delta_3],
+			# only the counts of words in the vocabulary are needed for masking
+			"vocab": list(self.word2id),
+			"word_counts": [self.word2cnt.get(word, 0) for word in self.word2id],
+			"discounts": [[self.n2cnt2discount[n][cnt] for cnt in range(4)] for n in range(1, self.order + 1)],
+		}
+		arrays = {"config": np.frombuffer(json.dumps(config).encode("utf-8"), dtype=np.uint8)}
+		for name, n2stat in [("keys", self.n2keys), ("ngram_counts", self.n2ngram_counts), \
+				("suffix_counts", self.n2suffix_counts), ("midseq_counts", self.n2midseq_counts), \
+				("gamma", self.n2gamma)]:
+			for n, stat in n2stat.items():
+				arrays["{}_{}".format(name, n)] = stat
+		with open(path, "wb") as model_file:
+			np.savez_compressed(model_file, **arrays)
+
+	@classmethod
+	def load(cls, path, cpu_count=None):
+		r'''Load a model saved by :meth:`save`.
+
+		Arguments:
+		    path (str): The path of the file.
+		    cpu_count (int, optional): The number of used cpu for scoring. Default: ``None``.
+
+		Returns:
+		    (:class:`KneserNeyInterpolated`): The loaded model.
+		'''
+		with np.load(path, allow_pickle=False) as arrays:
+			config = json.loads(arrays["config"].tobytes().decode("utf-8"))
+			if config["version"] != _FILE_VERSION:
+				raise ValueError("The version of %s is %d, which should be %d." % \
+					(path, config["version"], _FILE_VERSION))
+			model = cls(config["order"], config["left_pad_symbol"], config["right_pad_symbol"], \
+				config["unk_symbol"], config["cutoff"], *config["default_delta"], cpu_count=cpu_count)
+			n2stat = {}
+			for name in arrays.files:
+				if name != "config":
+					stat_name, n = name.rsplit("_", 1)
+					n2stat.setdefault(stat_name, {})[int(n)] = arrays[name]
+		model.word2cnt = Counter(dict(zip(config["vocab"], config["word_counts"])))
+		model.word2id = {word: i for i, word in enumerate(config["vocab"])}
+		model.n2keys, model.n2ngram_counts = n2stat["keys"], n2stat.get("ngram_counts", {})
+		model.n2suffix_counts, model.n2midseq_counts = n2stat.get("suffix_counts", {}), n2stat.get("midseq_counts", {})
+		model.n2gamma = n2stat.get("gamma", {})
+		model.n2cnt2discount = {n: dict(enumerate(discounts)) for n, discounts in enumerate(config["discounts"], 1)}
+		return model
+
+	def save_arpa(self, path):
+		r'''Export the trained model to ``path`` in the ARPA format, where every n-gram in the training corpus
+		is listed with its (interpolated) probability and the weight of backing off to the lower order.
+		The words should be strings without whitespaces. Unknown words are mapped to ``unk_symbol``.
+
+		ARPA files only contain probabilities, so they cannot be loaded as :class:`KneserNeyInterpolated`.
+
+		Arguments:
+		    path (str): The path of the file.
+		'''
+		id2word = list(self.word2id)
+		for word in id2word:
+			if not isinstance(word, str) or len(word.split()) != 1:
+				raise ValueError("Words in an ARPA file should be strings without whitespaces, but got %r." % word)
+
+		n2ids = {n: self._ngram_ids(n) for n in range(1, self.order + 1)}
+		unk_id = self.word2id[self.unk_symbol]
+		if self._rank((unk_id, )) < 0:
+			n2ids[1] = np.concatenate([n2ids[1], [[unk_id]]])
+		with open(path, "w", encoding="utf-8") as arpa_file:
+			arpa_file.write("\\data\\\n")
+			for n in range(1, self.order + 1):
+				arpa_file.write("ngram %d=%d\n" % (n, len(n2ids[n])))
+			for n in range(1, self.order + 1):
+				arpa_file.write("\n\\%d-grams:\n" % n)
+				ids = n2ids[n]
+				log_probs = np.log10(self._word_probs(ids[:, -1], ids[:, :-1]))
+				if n < self.order:
+					# the weights of the lower-order probabilities when the n-grams are the contexts
+					_, numerator_stat = self._get_stats(n + 1)
+					context_ranks = self._ranks(ids)
+					numerators = self._lookup(numerator_stat, context_ranks)
+					gammas = self._lookup(self.n2gamma[n], context_ranks) / np.where(numerators > 0, numerators, 1)
+					backoffs = np.log10(np.where((numerators > 0) & (gammas > 0), gammas, 1))
+				for i, ngram in enumerate(ids):
+					words = " ".join(id2word[word] for word in ngram)
+					if n < self.order:
+						arpa_file.write("%r\t%s\t%r\n" % (float(log_probs[i]), words, float(backoffs[i])))
+					else:
+						arpa_file.write("%r\t%s\n" % (float(log_probs[i]), words))
+			arpa_file.write("\n\\end\\\n")
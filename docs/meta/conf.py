@@ -18,6 +18,11 @@ import shutil
 sys.path.insert(0, os.path.abspath('../../'))
 sys.path.insert(0, os.path.abspath('../'))
 
+# expand all the docstrings of cotk classes instead of loading them from the cache,
+# so the CONSTANTs in all of them are checked.
+from cotk._utils.metaclass import DocStringInheritor
+DocStringInheritor.use_docstring_cache = False
+
 
 # -- Project information -----------------------------------------------------
 
@@ -0,0 +1,38 @@
+'''Generate the expanded docstrings of all the cotk classes, which are loaded by
+``cotk._utils.metaclass.DocStringInheritor`` instead of being expanded when cotk is imported.
+All the docstrings are expanded here, so a wrong CONSTANT in any docstring raises an error.
+'''
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from cotk._utils.metaclass import DocStringInheritor, DOCSTRING_CACHE_PATH
+
+COTK_MODULES = ["cotk.dataloader", "cotk.metric", "cotk.wordvector", "cotk.models"]
+
+def generate():
+    DocStringInheritor.use_docstring_cache = False
+    DocStringInheritor.docstring_records = {}
+    for module_name in COTK_MODULES:
+        __import__(module_name)
+    return json.dumps(DocStringInheritor.docstring_records, sort_keys=True, separators=(",", ":")) + "\n"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--check', action='store_true', dest='check', help="Just check whether the cache "
+        "is consistent with the docstrings.")
+    cargs = parser.parse_args()
+
+    text = generate()
+    if cargs.check:
+        with open(DOCSTRING_CACHE_PATH, 'r', encoding='utf-8') as cache_file:
+            if cache_file.read() != text:
+                raise ValueError("It seems [%s] is not synced with the docstrings. Please run update_docstring_cache.py !" \
+                    % DOCSTRING_CACHE_PATH)
+    else:
+        with open(DOCSTRING_CACHE_PATH, 'w', encoding='utf-8') as cache_file:
+            cache_file.write(text)
+        print("%d classes are written to %s" % (len(DocStringInheritor.docstring_records), DOCSTRING_CACHE_PATH))
@@ -6,6 +6,7 @@ import shutil
 from collections import OrderedDict
 from typing import List
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
@@ -347,3 +348,60 @@ class TestAllLanguageProcessing(TestLanguageProcessing):
 		lp = load_dataloader()
 		lp.set_default_field('train', 'sent')
 		super().base_test_convert(lp)
+
+class TestContext:
+	def test_resolve(self):
+		with FieldContext.set_parameters(tokenizer='space', max_sent_length=10):
+			resolved = FieldContext.resolve({'max_sent_length': 20, 'vocab': None})
+			assert resolved == {'tokenizer': 'space', 'max_sent_length': 20}
+			resolved = FieldContext.resolve({'max_sent_length': 20, 'vocab': None}, weak=True, none_as_ignored=False)
+			assert resolved == {'tokenizer': 'space', 'max_sent_length': 10, 'vocab': None}
+			resolved = FieldContext.resolve({'tokenizer': FieldContext.UNDEFINED})
+			assert resolved == {'max_sent_length': 10}
+			with FieldContext.set_parameters(max_sent_length=20, vocab=None):
+				assert dict(FieldContext.snapshot()) == {'tokenizer': 'space', 'max_sent_length': 20}
+			assert dict(FieldContext.snapshot()) == {'tokenizer': 'space', 'max_sent_length': 10}
+		assert dict(FieldContext.snapshot()) == {}
+
+	def test_snapshot(self):
+		with VocabContext.set_parameters(min_frequent_vocab_times=3):
+			snapshot = VocabContext.snapshot()
+			with pytest.raises(TypeError):
+				snapshot['min_frequent_vocab_times'] = 4
+			assert VocabContext.set('min_frequent_vocab_times', 4) == 3
+			assert snapshot['min_frequent_vocab_times'] == 3
+			assert VocabContext.get('min_frequent_vocab_times') == 4
+		assert VocabContext.get('min_frequent_vocab_times') is None
+
+	def test_class_attributes(self):
+		with FieldContext.set_parameters(tokenizer='space') as context:
+			assert FieldContext.context_dict == {'tokenizer': 'space'}
+			assert context.context_dict == {'tokenizer': 'space'}
+			assert not FieldContext.corrupted and not context.corrupted
+			assert VocabContext.context_dict == {}
+			with pytest.raises(AttributeError):
+				FieldContext.context_dict = {}
+			with pytest.raises(AttributeError):
+				FieldContext.corrupted = True
+		assert FieldContext.context_dict == {}
+
+	def test_thread_local(self):
+		def get_in_thread():
+			return FieldContext.get('tokenizer', 'undefined')
+		with FieldContext.set_parameters(tokenizer='space'):
+			with ThreadPoolExecutor(max_workers=1) as executor:
+				assert executor.submit(get_in_thread).result() == 'undefined'
+			assert FieldContext.get('tokenizer') == 'space'
+
+def _get_all_hash(dataloader):
+	return (dataloader.get_raw_data_hash(), dataloader.get_data_hash(), \
+		dataloader.get_vocab_hash(), dataloader.get_setting_hash(), dataloader.get_general_hash())
+
+def test_concurrent_construction():
+	serial_hashes = [_get_all_hash(load()) for load in all_load_dataloaders]
+	with ThreadPoolExecutor(max_workers=len(all_load_dataloaders)) as executor:
+		futures = [executor.submit(load) for _ in range(3) for load in all_load_dataloaders]
+		concurrent_hashes = [_get_all_hash(future.result()) for future in futures]
+	assert concurrent_hashes == serial_hashes * 3
+	assert dict(FieldContext.snapshot()) == {}
+	assert dict(VocabContext.snapshot()) == {}
@@ -1,5 +1,6 @@
 import copy
 import random
+from itertools import chain
 import operator
 import os
 import shutil
@@ -153,6 +154,41 @@ class TestLanguageGeneration():
 						flag = True
 			assert flag
 
+	def base_test_get_packed_batch(self, dl):
+		if not dl._pretrained:
+			with pytest.raises(RuntimeError):
+				dl.get_packed_batch("train", [0, 1])
+			return
+		with pytest.raises(ValueError):
+			dl.get_packed_batch("unknown set", [0, 1])
+		for set_name in dl.data.keys():
+			indexes = list(range(len(dl.index[set_name])))
+			sent_id = dl.data[set_name]['sent']['id']
+			max_length = max(map(len, sent_id))
+			with pytest.raises(ValueError):
+				dl.get_packed_batch(set_name, indexes, packed_length=max_length - 1)
+			packed_length = max_length * 2
+			batch = dl.get_packed_batch(set_name, indexes, packed_length=packed_length)
+			row_num = len(batch["sent_packed_index"])
+			for key in ["sent_packed", "sent_packed_position", "sent_packed_segment", "sent_packed_attnmask"]:
+				assert batch[key].shape == (row_num, packed_length)
+			assert sorted(chain(*batch["sent_packed_index"])) == indexes
+			assert batch["sent_packed_attnmask"].sum() == sum(map(len, sent_id))
+			assert batch["sent_packed_length"].tolist() == list(map(sum, batch["sent_packed_sent_length"]))
+			assert row_num <= (len(indexes) + 1) // 2
+
+			for row, row_index in enumerate(batch["sent_packed_index"]):
+				now = 0
+				for segment, idx in enumerate(row_index):
+					length = len(sent_id[idx])
+					assert batch["sent_packed"][row, now:now + length].tolist() == sent_id[idx]
+					assert batch["sent_packed_position"][row, now:now + length].tolist() == list(range(length))
+					assert (batch["sent_packed_segment"][row, now:now + length] == segment + 1).all()
+					now += length
+				assert now == batch["sent_packed_length"][row]
+				assert (batch["sent_packed_segment"][row, now:] == 0).all()
+				assert (batch["sent_packed_attnmask"][row, now:] == 0).all()
+
 	def base_test_get_next_batch(self, dl):
 		with pytest.raises(ValueError):
 			dl.get_next_batch("unknown set")
@@ -270,6 +306,10 @@ class TestMSCOCO(TestLanguageGeneration):
 	def test_get_batch(self, load_dataloader):
 		super().base_test_get_batch(load_dataloader())
 
+	@pytest.mark.parametrize('load_dataloader', all_load_dataloaders)
+	def test_get_packed_batch(self, load_dataloader):
+		super().base_test_get_packed_batch(load_dataloader())
+
 	@pytest.mark.parametrize('load_dataloader', all_load_dataloaders)
 	def test_get_next_batch(self, load_dataloader):
 		super().base_test_get_next_batch(load_dataloader())
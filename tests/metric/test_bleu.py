@@ -10,6 +10,9 @@ import pytest
 from cotk.metric import BleuCorpusMetric, SelfBleuCorpusMetric, \
 	FwBwBleuCorpusMetric, MultiTurnBleuCorpusMetric
 
+from cotk.metric.bleu import _remove_special_in_batch
+from cotk.metric.bleu_utils import BleuStatistics, bleu_scores, _iter_ngram_codes
+from cotk.metric.worker_pool import WorkerPool, get_worker_pool
 from nltk.translate.bleu_score import corpus_bleu, sentence_bleu, SmoothingFunction
 
 from metric_base import *
@@ -27,14 +30,80 @@ def test_bleu_bug():
 	with pytest.raises(ZeroDivisionError):
 		corpus_bleu(ref, gen, smoothing_function=SmoothingFunction().method3)
 
-bleu_test_parameter = generate_testcase(\
+@pytest.mark.parametrize('use_str', [False, True])
+def test_bleu_statistics(use_str):
+	rng = random.Random(0)
+	for _ in range(100):
+		def gen_sen():
+			sen = [rng.randint(0, 6) for _ in range(rng.randint(0, 10))]
+			return [str(word) for word in sen] if use_str else sen
+		hyps = [gen_sen() for _ in range(rng.randint(1, 20))]
+		refs = [[gen_sen() for _ in range(rng.randint(1, 3))] for _ in hyps]
+		for ngram in range(1, 6):
+			weights = np.ones(ngram) / ngram
+			stats = BleuStatistics.compute(refs, hyps, ngram)
+			assert abs(stats.corpus_bleu(weights) - \
+				corpus_bleu(refs, hyps, weights, smoothing_function=SmoothingFunction().method3)) < 1e-12
+			for ref, hyp, bleu in zip(refs, hyps, stats.sentence_bleu(weights)):
+				assert abs(bleu - sentence_bleu(ref, hyp, weights, smoothing_function=SmoothingFunction().method1)) < 1e-12
+	with pytest.raises(ValueError):
+		BleuStatistics.compute([[]], [[1, 2]], 4)
+
+@pytest.mark.parametrize('use_str', [False, True])
+def test_bleu_statistics_pairwise(use_str):
+	rng = random.Random(1)
+	for _ in range(50):
+		def gen_sen():
+			sen = [rng.randint(0, 6) for _ in range(rng.randint(0, 10))]
+			return [str(word) for word in sen] if use_str else sen
+		hyps = [gen_sen() for _ in range(rng.randint(1, 10))]
+		refs = [gen_sen() for _ in range(rng.randint(1, 5))]
+		stats = BleuStatistics.compute_pairwise(refs, hyps, 4)
+		assert len(stats) == len(refs) * len(hyps)
+		for ngram in range(1, 5):
+			weights = np.ones(ngram) / ngram
+			expected = [sentence_bleu([ref], hyp, weights, smoothing_function=SmoothingFunction().method1) \
+				for ref in refs for hyp in hyps]
+			assert stats.sentence_bleu(weights) == expected
+
+@pytest.mark.parametrize('vocab_size', [7, 2 ** 31, 2 ** 61])
+def test_iter_ngram_codes(vocab_size):
+	rng = random.Random(2)
+	words = [rng.randrange(vocab_size) for _ in range(7)]
+	sents = [[rng.choice(words) for _ in range(rng.randint(0, 10))] for _ in range(3)]
+	codes = np.array([word for sent in sents for word in sent], dtype=np.int64)
+	lengths = np.array([len(sent) for sent in sents], dtype=np.int64)
+	tokens = [word for sent in sents for word in sent]
+	for n, ngram_codes, valid, bound in _iter_ngram_codes(codes, lengths, 5):
+		assert len(sents) * bound <= 2 ** 62
+		assert np.all((0 <= ngram_codes) & (ngram_codes < bound))
+		# equal codes stand for equal n-grams
+		ngram2code = {}
+		for i in np.flatnonzero(valid):
+			ngram = tuple(tokens[i:i + n])
+			assert ngram2code.setdefault(ngram, ngram_codes[i]) == ngram_codes[i]
+		assert len(set(ngram2code.values())) == len(ngram2code)
+
+@pytest.mark.parametrize('smoothing', ['method1', 'method3'])
+def test_bleu_scores(smoothing):
+	rng = random.Random(2)
+	hyps = [[rng.randint(0, 6) for _ in range(rng.randint(0, 10))] for _ in range(200)]
+	refs = [[[rng.randint(0, 6) for _ in range(rng.randint(0, 10))]] for _ in hyps]
+	stats = BleuStatistics.compute(refs, hyps, 4)
+	for ngram in range(1, 5):
+		weights = np.ones(ngram) / ngram
+		scores = bleu_scores(stats.numerators[:, :ngram], stats.denominators[:, :ngram], \
+			stats.hyp_lengths, stats.ref_lengths, weights, smoothing)
+		assert np.allclose(scores, stats.sentence_bleu(weights, smoothing), rtol=1e-12, atol=0)
+
+bleu_test_parameter = list(generate_testcase(\
     (zip(test_dataloader), "add"),
 	(zip(test_argument), "add"),
 	(zip(test_shape, test_type), "multi"),
 	(zip(test_batch_len), "add"),
 	(zip(test_gen_len), "multi"),
 	(zip(test_ref_len), "multi")
-)
+))
 
 class TestBleuCorpusMetric:
 	default_reference_key = "ref_allvocabs"
@@ -133,6 +202,128 @@ class TestBleuCorpusMetric:
 			assert np.isclose(bcm.close()['bleu'], self.get_bleu(dataloader, data, reference_key, gen_key))
 		assert same_dict(data, _data)
 
+	# unequal batches are rejected before any engine is used (see ``test_close``)
+	@pytest.mark.parametrize('data_loader, argument, shape, type, batch_len, gen_len, ref_len', \
+		[case for case in bleu_test_parameter if case[4] == 'equal'])
+	def test_engine(self, data_loader, argument, shape, type, batch_len, gen_len, ref_len):
+		dataloader = FakeDataLoader()
+		reference_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, \
+								   to_list=(type == 'list'), pad=(shape == 'pad'), \
+								   gen_len=gen_len, ref_len=ref_len)
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		res = []
+		for engine in ['native', 'nltk']:
+			bcm = BleuCorpusMetric(dataloader, engine=engine)
+			bcm.forward(data)
+			res.append(bcm.close())
+		assert abs(res[0]['bleu'] - res[1]['bleu']) < 1e-12
+		assert res[0]['bleu hashvalue'] == res[1]['bleu hashvalue']
+
+		with pytest.raises(ValueError):
+			BleuCorpusMetric(dataloader, engine='unknown')
+
+	@pytest.mark.parametrize('data_loader, to_list', [['dataloader', True], ['field', False]])
+	def test_remove_special_in_batch(self, data_loader, to_list):
+		dataloader = FakeDataLoader()
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		rng = random.Random(0)
+		# special tokens at any position, including empty sentences
+		sentences = [[rng.randint(0, dataloader.all_vocab_size - 1) for _ in range(rng.randint(0, 8))] for _ in range(300)]
+		if not to_list:
+			length = max(len(sent) for sent in sentences)
+			sentences = np.array([sent + [dataloader.pad_id] * (length - len(sent)) for sent in sentences])
+		ids, lengths = _remove_special_in_batch(dataloader, sentences)
+		expected = [dataloader.remove_special_in_ids(sent) for sent in sentences]
+		assert lengths.tolist() == [len(sent) for sent in expected]
+		assert ids.tolist() == [word for sent in expected for word in sent]
+
+	@pytest.mark.parametrize('reference_num, to_list', [[3, True], [3, False], [None, True]])
+	def test_engine_multi_reference(self, reference_num, to_list):
+		dataloader = FakeDataLoader()
+		reference_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, \
+								   to_list=to_list, pad=True, gen_len='random', ref_len='random', \
+								   reference_num=3)
+		res = []
+		for engine in ['native', 'nltk']:
+			bcm = BleuCorpusMetric(dataloader, reference_num=reference_num, engine=engine)
+			bcm.forward(data)
+			res.append(bcm.close())
+		assert res[0] == res[1]
+
+	@pytest.mark.parametrize('reference_num', [1, 3])
+	def test_peek(self, reference_num):
+		dataloader = FakeDataLoader()
+		reference_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, \
+								   to_list=True, pad=False, gen_len='non-empty', ref_len='non-empty', \
+								   reference_num=reference_num)
+		batches = split_batch(data, self.default_keywords, to_list=True, \
+							  reference_key=reference_key, reference_is_3D=False)
+		bcm = BleuCorpusMetric(dataloader, reference_num=reference_num)
+		with pytest.raises(RuntimeError):
+			bcm.peek()
+		bcm_nltk = BleuCorpusMetric(dataloader, reference_num=reference_num, engine='nltk')
+		for batch in batches:
+			bcm.forward(batch)
+			bcm_nltk.forward(batch)
+			res, res_nltk = bcm.peek(), bcm_nltk.peek()
+			assert abs(res['bleu'] - res_nltk['bleu']) < 1e-12
+			assert res['bleu hashvalue'] == res_nltk['bleu hashvalue']
+			# only the running sums are kept
+			assert len(bcm.statistics) == 1 and not bcm.hyps and not bcm.refs
+		assert bcm.close() == res
+
+	def test_bootstrap(self):
+		dataloader = FakeDataLoader()
+		reference_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, \
+								   to_list=True, pad=False, gen_len='non-empty', ref_len='non-empty', batch=300)
+		bcm = BleuCorpusMetric(dataloader)
+		bcm.forward(data)
+		expected = bcm.close()
+		res = []
+		for engine in ['native', 'nltk']:
+			bcm = BleuCorpusMetric(dataloader, engine=engine, bootstrap_samples=500)
+			bcm.forward(data)
+			res.append(bcm.close())
+		low, high = res[0].pop('bleu confidence interval')
+		assert res[1].pop('bleu confidence interval') == (low, high)
+		assert abs(res[0]['bleu'] - expected['bleu']) < 1e-12
+		# the seed of bootstrap is hashed
+		assert res[0]['bleu hashvalue'] == res[1]['bleu hashvalue'] != expected['bleu hashvalue']
+		assert low < expected['bleu'] < high
+
+		# the statistics of batches are concatenated only when they are used
+		bcm = BleuCorpusMetric(dataloader, bootstrap_samples=500)
+		for start in range(0, len(data[gen_key]), 50):
+			bcm.forward({key: value[start:start + 50] for key, value in data.items()})
+		assert bcm.statistics is None and len(bcm._batch_statistics) == 6
+		batched = bcm.close()
+		assert bcm.statistics is not None and not bcm._batch_statistics
+		assert len(bcm.statistics) == len(data[gen_key])
+		assert abs(batched.pop('bleu') - expected['bleu']) < 1e-12
+		assert batched.pop('bleu confidence interval') == (low, high)
+
+		# a lower confidence gives a narrower interval from the same resamples
+		bcm = BleuCorpusMetric(dataloader, bootstrap_samples=500, confidence=0.5)
+		bcm.forward(data)
+		narrow_low, narrow_high = bcm.close()['bleu confidence interval']
+		assert low <= narrow_low <= narrow_high <= high
+
+		bcm = BleuCorpusMetric(dataloader, bootstrap_samples=500, seed=1)
+		bcm.forward(data)
+		other_seed = bcm.close()
+		assert other_seed.pop('bleu confidence interval') != (low, high)
+		assert other_seed['bleu hashvalue'] != res[0]['bleu hashvalue']
+
+		for kwargs in [{'bootstrap_samples': -1}, {'confidence': 0}, {'confidence': 1.5}]:
+			with pytest.raises(ValueError):
+				BleuCorpusMetric(dataloader, **kwargs)
+
 	def test_version(self):
 		version_test(BleuCorpusMetric, dataloader=FakeDataLoader())
 
@@ -225,6 +416,8 @@ class TestSelfBleuCorpusMetric:
 		fake_bleu_irl = [random.random() for _ in range(sample)]
 
 		import multiprocessing
+		# the shared pool must be created by the mocked Pool, and dropped afterwards
+		get_worker_pool().close()
 		with mock.patch('tqdm.tqdm', return_value=fake_bleu_irl):
 			with mock.patch('multiprocessing.pool.Pool'):
 				dataloader = FakeDataLoader()
@@ -238,10 +431,12 @@ class TestSelfBleuCorpusMetric:
 				_data = copy.deepcopy(data)
 				if data_loader == 'field':
 					dataloader = dataloader.get_default_field()
+				# only the nltk engine uses multiprocessing and tqdm
+				engine = 'nltk' if use_tqdm else 'native'
 				if argument == 'default':
-					bcm = SelfBleuCorpusMetric(dataloader, sample=4000)
+					bcm = SelfBleuCorpusMetric(dataloader, sample=4000, engine=engine)
 				else:
-					bcm = SelfBleuCorpusMetric(dataloader, gen_key = gen_key, sample=4000)
+					bcm = SelfBleuCorpusMetric(dataloader, gen_key = gen_key, sample=4000, engine=engine)
 				assert bcm.sample == 4000
 
 				rng_state_st = random.getstate()
@@ -259,6 +454,35 @@ class TestSelfBleuCorpusMetric:
 				assert same_dict(data, _data)
 				rng_state_ed = random.getstate()
 				assert operator.eq(rng_state_st, rng_state_ed)
+				get_worker_pool().close()
+
+	@pytest.mark.parametrize('data_loader, ngram', [['dataloader', 4], ['field', 2], ['dataloader', 1]])
+	def test_engine(self, data_loader, ngram):
+		dataloader = FakeDataLoader()
+		data = dataloader.get_data(gen_key='gen', to_list=True, pad=False, gen_len='random', batch=300)
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		res = []
+		for engine in ['native', 'nltk']:
+			bcm = SelfBleuCorpusMetric(dataloader, ngram, sample=200, engine=engine)
+			bcm.forward(data)
+			res.append(bcm.close())
+		assert res[0] == res[1]
+
+	def test_bootstrap(self):
+		dataloader = FakeDataLoader()
+		data = dataloader.get_data(gen_key='gen', to_list=True, pad=False, gen_len='random', batch=300)
+		res = []
+		for bootstrap_samples in [0, 500]:
+			bcm = SelfBleuCorpusMetric(dataloader, sample=200, bootstrap_samples=bootstrap_samples)
+			bcm.forward(data)
+			res.append(bcm.close())
+		low, high = res[1].pop('self-bleu confidence interval')
+		assert res[0] == res[1]
+		assert low < res[0]['self-bleu'] < high
+
+		with pytest.raises(ValueError):
+			SelfBleuCorpusMetric(dataloader, bootstrap_samples=-1)
 
 	def test_version(self):
 		version_test(SelfBleuCorpusMetric, dataloader=FakeDataLoader())
@@ -367,6 +591,8 @@ class TestFwBwBleuCorpusMetric:
 			return _get_fake_values
 
 		import multiprocessing
+		# the shared pool must be created by the mocked Pool, and dropped afterwards
+		get_worker_pool().close()
 		with mock.patch('tqdm.tqdm', side_effect=get_fake_values()):
 			with mock.patch('multiprocessing.pool.Pool'):
 				# tqdm.tqdm is replaced by _get_fake_values. It returns fake values.
@@ -380,10 +606,13 @@ class TestFwBwBleuCorpusMetric:
 				_data = copy.deepcopy(data)
 				if data_loader == 'field':
 					dataloader = dataloader.get_default_field()
+				# only the nltk engine uses multiprocessing and tqdm
+				engine = 'nltk' if use_tqdm else 'native'
 				if argument == 'default':
-					bcm = FwBwBleuCorpusMetric(dataloader, data[reference_key], sample=sample)
+					bcm = FwBwBleuCorpusMetric(dataloader, data[reference_key], sample=sample, engine=engine)
 				else:
-					bcm = FwBwBleuCorpusMetric(dataloader, data[reference_key], gen_key = gen_key, sample=sample)
+					bcm = FwBwBleuCorpusMetric(dataloader, data[reference_key], gen_key = gen_key, sample=sample, \
+						engine=engine)
 
 				rng_state_st = random.getstate()
 				assert bcm.sample == sample
@@ -411,6 +640,41 @@ class TestFwBwBleuCorpusMetric:
 				assert same_dict(data, _data)
 				rng_state_ed = random.getstate()
 				assert operator.eq(rng_state_st, rng_state_ed)
+				get_worker_pool().close()
+
+	@pytest.mark.parametrize('data_loader, ngram', [['dataloader', 4], ['field', 2], ['dataloader', 1]])
+	def test_engine(self, data_loader, ngram):
+		dataloader = FakeDataLoader()
+		reference_key, gen_key = ('resp_allvocabs', 'gen')
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, to_list=True, pad=False, \
+								   gen_len='random', ref_len='random', batch=300)
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		res = []
+		for engine in ['native', 'nltk']:
+			bcm = FwBwBleuCorpusMetric(dataloader, data[reference_key][:250], ngram, sample=200, engine=engine)
+			bcm.forward(data)
+			res.append(bcm.close())
+		assert res[0] == res[1]
+
+	def test_bootstrap(self):
+		dataloader = FakeDataLoader()
+		reference_key, gen_key = ('resp_allvocabs', 'gen')
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, to_list=True, pad=False, \
+								   gen_len='random', ref_len='random', batch=300)
+		res = []
+		for bootstrap_samples in [0, 500]:
+			bcm = FwBwBleuCorpusMetric(dataloader, data[reference_key][:250], sample=200, \
+				bootstrap_samples=bootstrap_samples)
+			bcm.forward(data)
+			res.append(bcm.close())
+		intervals = {key: res[1].pop(key + ' confidence interval') for key in ['fw-bleu', 'bw-bleu', 'fw-bw-bleu']}
+		assert res[0] == res[1]
+		for key, (low, high) in intervals.items():
+			assert low < res[0][key] < high
+
+		with pytest.raises(ValueError):
+			FwBwBleuCorpusMetric(dataloader, data[reference_key], confidence=1)
 
 	def test_version(self):
 		version_test(FwBwBleuCorpusMetric, dataloader=FakeDataLoader())
@@ -429,14 +693,14 @@ class TestFwBwBleuCorpusMetric:
 #		 bcm.close()
 
 
-multi_bleu_test_parameter = generate_testcase( \
+multi_bleu_test_parameter = list(generate_testcase( \
 	(zip(test_dataloader), "add"),
 	(zip(test_argument), "add"),
 	(zip(test_shape, test_type), "multi"),
 	(zip(test_batch_len), "add"),
 	(zip(test_gen_len), "multi"),
 	(zip(test_ref_len), "multi")
-)
+))
 
 
 class TestMultiTurnBleuCorpusMetric:
@@ -530,6 +794,45 @@ class TestMultiTurnBleuCorpusMetric:
 			assert np.isclose(mtbcm.close()['bleu'], self.get_bleu(dataloader, data, reference_key, gen_key))
 		assert same_dict(data, _data)
 
+	# unequal batches are rejected before any engine is used (see ``test_close``)
+	@pytest.mark.parametrize('data_loader, argument, shape, type, batch_len, gen_len, ref_len', \
+		[case for case in multi_bleu_test_parameter if case[4] == 'equal'])
+	def test_engine(self, data_loader, argument, shape, type, batch_len, gen_len, ref_len):
+		dataloader = FakeMultiDataloader()
+		reference_key, turn_len_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, turn_len_key=turn_len_key, gen_key=gen_key, \
+								   to_list=(type == 'list'), pad=(shape == 'pad'), \
+								   gen_len=gen_len, ref_len=ref_len)
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		res = []
+		for engine in ['native', 'nltk']:
+			mtbcm = MultiTurnBleuCorpusMetric(dataloader, engine=engine)
+			mtbcm.forward(data)
+			res.append(mtbcm.close())
+		assert abs(res[0]['bleu'] - res[1]['bleu']) < 1e-12
+		assert res[0]['bleu hashvalue'] == res[1]['bleu hashvalue']
+
+	def test_peek(self):
+		dataloader = FakeMultiDataloader()
+		reference_key, turn_len_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, turn_len_key=turn_len_key, gen_key=gen_key, \
+								   to_list=True, pad=False, ref_len='non-empty', ref_vocab='non-empty')
+		batches = split_batch(data, self.default_keywords, to_list=True, \
+							  reference_key=reference_key, reference_is_3D=True)
+		mtbcm = MultiTurnBleuCorpusMetric(dataloader)
+		with pytest.raises(RuntimeError):
+			mtbcm.peek()
+		mtbcm_nltk = MultiTurnBleuCorpusMetric(dataloader, engine='nltk')
+		for batch in batches:
+			mtbcm.forward(batch)
+			mtbcm_nltk.forward(batch)
+			res, res_nltk = mtbcm.peek(), mtbcm_nltk.peek()
+			assert abs(res['bleu'] - res_nltk['bleu']) < 1e-12
+			assert res['bleu hashvalue'] == res_nltk['bleu hashvalue']
+			assert len(mtbcm.statistics) == 1 and not mtbcm.hyps and not mtbcm.refs
+		assert mtbcm.close() == res
+
 	def test_version(self):
 		version_test(MultiTurnBleuCorpusMetric, dataloader=FakeMultiDataloader())
 
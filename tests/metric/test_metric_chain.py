@@ -1,10 +1,13 @@
 import copy
+import os
 import random
 
 import numpy as np
 import pytest
 
-from cotk.metric import MultiTurnPerplexityMetric, MultiTurnBleuCorpusMetric, MetricChain
+from cotk.metric import MultiTurnPerplexityMetric, MultiTurnBleuCorpusMetric, MetricChain, \
+	MetricBase, SelfBleuCorpusMetric, FwBwBleuCorpusMetric
+from cotk.metric.worker_pool import get_worker_pool
 
 from test_perplexity import TestMultiTurnPerplexityMetric
 from test_bleu import TestMultiTurnBleuCorpusMetric
@@ -16,9 +19,24 @@ def setup_module():
 
 #pytestmark = pytest.mark.skip("all tests still WIP")
 
+def _square(data, i):
+	return i * i
+
+class PoolMetric(MetricBase):
+	def __init__(self, index):
+		super().__init__("PoolMetric", 1)
+		self.index = index
+	def close(self):
+		res = super().close()
+		res["squares %d" % self.index] = list(get_worker_pool().imap(_square, None, 3, 2))
+		res["pid %d" % self.index] = os.getpid()
+		return res
+
 class TestMetricChain():
 	def test_init(self):
 		mc = MetricChain()
+		with pytest.raises(ValueError):
+			MetricChain(max_workers=0)
 
 	def test_add_metric(self):
 		mc = MetricChain()
@@ -52,3 +70,48 @@ class TestMetricChain():
 		assert np.isclose(res['perplexity'], perplexity)
 		assert np.isclose(res['bleu'], bleu)
 		assert same_dict(data, _data)
+
+	@pytest.mark.parametrize('engine', ['native', 'nltk'])
+	def test_concurrent_close(self, engine):
+		dataloader = FakeDataLoader()
+		data = dataloader.get_data(reference_key='resp_allvocabs', gen_key='gen', to_list=True, \
+								   pad=False, gen_len='non-empty', ref_len='non-empty', batch=60)
+		results = []
+		for max_workers in [1, 4]:
+			mc = MetricChain(max_workers=max_workers)
+			mc.add_metric(SelfBleuCorpusMetric(dataloader, sample=50, engine=engine))
+			mc.add_metric(FwBwBleuCorpusMetric(dataloader, data['resp_allvocabs'], sample=50, engine=engine))
+			mc.add_metric(FwBwBleuCorpusMetric(dataloader, data['resp_allvocabs'], ngram=2, sample=40, engine=engine))
+			mc.forward(data)
+			results.append(mc.close())
+			assert all(metric.closed for metric in mc.metric_list)
+		assert list(results[0].items()) == list(results[1].items())
+
+	def test_forked_close(self):
+		# the worker pool used before is replaced in the forked processes
+		assert list(get_worker_pool().imap(_square, None, 3, 2)) == [0, 1, 4]
+		mc = MetricChain(max_workers=2)
+		for i in range(3):
+			mc.add_metric(PoolMetric(i))
+		res = mc.close()
+		assert [res["squares %d" % i] for i in range(3)] == [[0, 1, 4]] * 3
+		assert all(res["pid %d" % i] != os.getpid() for i in range(3))
+		assert all(metric.closed for metric in mc.metric_list)
+
+	def test_concurrent_close_error(self):
+		class ErrorMetric(MetricBase):
+			def __init__(self):
+				super().__init__("ErrorMetric", 1)
+			def close(self):
+				super().close()
+				raise ValueError("error in close")
+
+		# the error is raised with the name of the metric whether the metrics are closed concurrently or not
+		for max_workers in [1, 2]:
+			mc = MetricChain(max_workers=max_workers)
+			mc.add_metric(MetricChain())
+			mc.add_metric(ErrorMetric())
+			with pytest.raises(ValueError, match="error in close") as excinfo:
+				mc.close()
+			assert excinfo.value.__notes__ == ["Failed to close the metric ErrorMetric (index 1 in the chain)."]
+			assert all(metric.closed for metric in mc.metric_list)
@@ -1,6 +1,9 @@
+import os
 import pytest
 import numpy as np
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from unittest import mock
 import tqdm
 
@@ -36,37 +39,159 @@ class TestNgramLM():
 			assert probs[-1] >= 0
 		assert np.isclose(sum(probs), 1)
 
-	@pytest.mark.parametrize('order, use_tqdm', zip([1, 1, 2, 2, 3, 3, 4, 4], [False, True] * 4))
-	def test_perplexity(self, order, use_tqdm):
-		# Test whether tqdm.tqdm is called, when sample >= 1000
-		# and tqdm.tqdm is not called , when sample < 1000.
-		# If tqdm.tqdm is called in `bcm.close`, `bleu_irl` will be replaced by random data.
-		if use_tqdm:
+	@pytest.mark.parametrize('order, cutoff, pad', [(1, 1, None), (2, 2, None), (3, 1, '<go>'), (4, 2, '<go>')])
+	def test_fit(self, order, cutoff, pad):
+		from nltk.lm.preprocessing import pad_both_ends
+		from nltk.util import everygrams
+		vocab = ['<unk>', 'a', 'b', 'c', 'd', 'e']
+		corpus = [list(np.random.choice(vocab, np.random.randint(0, 8))) for _ in range(20)]
+		LM = KneserNeyInterpolated(order, pad, pad, vocab[0], cutoff=cutoff)
+		LM.fit(corpus)
+
+		# count the n-grams with tuples as keys
+		n2ngram2cnt = {n: {} for n in range(1, order + 1)}
+		suffix2words, midseq2pairs = {}, {}
+		for sent in corpus:
+			for ngram in everygrams(list(pad_both_ends(sent, n=order, left_pad_symbol=pad, right_pad_symbol=pad)), \
+					max_len=order):
+				ngram = LM._mask_oov(ngram)
+				n2ngram2cnt[len(ngram)][ngram] = n2ngram2cnt[len(ngram)].get(ngram, 0) + 1
+				if len(ngram) >= 2:
+					suffix2words.setdefault(ngram[1:], set()).add(ngram[0])
+					midseq2pairs.setdefault(ngram[1:-1], set()).add((ngram[0], ngram[-1]))
+
+		def count(stat, ngram):
+			rank = LM._rank(tuple(LM.word2id[word] for word in ngram))
+			assert rank >= 0
+			return stat[len(ngram)][rank]
+		for n in range(1, order + 1):
+			assert len(LM.n2keys[n]) == len(n2ngram2cnt[n])
+			for ngram, cnt in n2ngram2cnt[n].items():
+				assert count(LM.n2ngram_counts, ngram) == cnt
+		for n in range(order - 1):
+			assert np.sum(LM.n2midseq_counts[n] > 0) == sum(len(midseq) == n for midseq in midseq2pairs)
+		for suffix, words in suffix2words.items():
+			assert count(LM.n2suffix_counts, suffix) == len(words)
+		for midseq, pairs in midseq2pairs.items():
+			assert count(LM.n2midseq_counts, midseq) == len(pairs)
+		assert LM._rank((len(LM.word2id), )) == -1
+
+	@pytest.mark.parametrize('order', [2, 3, 4])
+	def test_gamma(self, order):
+		vocab = ['<go>', '<eos>', '<unk>', 'a', 'b', 'c', 'd']
+		corpus = [list(np.random.choice(vocab[3:], np.random.randint(0, 10))) for _ in range(20)]
+		LM = KneserNeyInterpolated(order, vocab[0], vocab[1], vocab[2])
+		LM.fit(corpus)
+		word_ids = list(LM.word2id.values())
+		for n in range(order):
+			denominator_stat, _ = LM._get_stats(n + 1)
+			for rank, key in enumerate(LM.n2keys[n]):
+				context = ()
+				for m in range(n, 0, -1):
+					context = (key % len(word_ids), ) + context
+					key = LM.n2keys[m - 1][key // len(word_ids)]
+				# sum the discounts over all the words following the context
+				gamma = 0
+				for word in word_ids:
+					ngram_rank = LM._rank(context + (word, ))
+					cnt = denominator_stat[ngram_rank] if ngram_rank >= 0 else 0
+					if cnt >= LM._get_discount(n + 1, cnt):
+						gamma += LM._get_discount(n + 1, cnt)
+				assert np.isclose(LM.n2gamma[n][rank], gamma)
+
+	@pytest.mark.parametrize('order', [1, 2, 3, 4])
+	def test_save(self, order, tmp_path):
+		vocab = ['<s>', '</s>', '<unk>', 'a', 'b', 'c', 'd', 'e']
+		corpus = [list(np.random.choice(vocab[3:7], np.random.randint(0, 10))) for _ in range(20)]
+		LM = KneserNeyInterpolated(order, vocab[0], vocab[1], vocab[2], cpu_count=0)
+		LM.fit(corpus)
+		LM.save(str(tmp_path / "model.npz"))
+		loaded = KneserNeyInterpolated.load(str(tmp_path / "model.npz"), cpu_count=0)
+		assert loaded.vocab_size == LM.vocab_size
+		assert loaded.perplexity(corpus) == LM.perplexity(corpus)
+
+		# compute the probabilities by backing off in the ARPA file
+		LM.save_arpa(str(tmp_path / "model.arpa"))
+		ngram2log_prob, ngram2backoff = {}, {}
+		with open(str(tmp_path / "model.arpa")) as arpa_file:
+			for line in arpa_file:
+				fields = line.split("\t")
+				if len(fields) >= 2:
+					ngram = tuple(fields[1].split())
+					ngram2log_prob[ngram] = float(fields[0])
+					ngram2backoff[ngram] = float(fields[2]) if len(fields) == 3 else 0
+		def arpa_log_prob(word, context):
+			if context + (word, ) in ngram2log_prob:
+				return ngram2log_prob[context + (word, )]
+			return ngram2backoff.get(context, 0) + arpa_log_prob(word, context[1:])
+		for _ in range(50):
+			context = tuple(np.random.choice(vocab[:2] + vocab[3:], order - 1))
+			word = np.random.choice(vocab[1:])
+			masked = [vocab[2] if LM.word2cnt.get(context_word, 0) < 1 and context_word not in vocab[:2] else context_word \
+				for context_word in context]
+			assert np.isclose(LM.score(word, context), loaded.score(word, context))
+			assert np.isclose(LM.score(word, context), \
+				10 ** arpa_log_prob(word if LM.word2cnt.get(word, 0) else vocab[2], tuple(masked)))
+
+		LM = KneserNeyInterpolated(order, None, None, None)
+		LM.fit(corpus)
+		with pytest.raises(ValueError, match="Words in an ARPA file should be strings"):
+			LM.save_arpa(str(tmp_path / "model.arpa"))
+
+	@pytest.mark.parametrize('order, use_pool', zip([1, 1, 2, 2, 3, 3, 4, 4], [False, True] * 4))
+	def test_perplexity(self, order, use_pool):
+		# The words are scored by worker processes when there are more than 100 sentences.
+		if use_pool:
 			sample = random.randint(101, 200)
-			assert sample > 100
 		else:
 			sample = random.randint(2, 100)
-			assert 1 < sample <= 100
-		fake_sent_lp = [random.random() for _ in range(sample)]
 		vocab = ['<go>', '<eos>', '<unk>', 'a', 'b', 'c', 'd']
-		LM = KneserNeyInterpolated(order, vocab[0], vocab[1], vocab[2])
+		LM = KneserNeyInterpolated(order, vocab[0], vocab[1], vocab[2], cpu_count=2)
 		corpus = []
 		for i in range(10 + sample):
-			corpus.append(list(np.random.choice(vocab[3:], np.random.randint(0, 10, 1)[0])))
+			corpus.append(list(np.random.choice(vocab[3:] + ['e'], np.random.randint(0, 10, 1)[0])))
 		LM.fit(corpus[:10])
 
-		import multiprocessing
-		with mock.patch('tqdm.tqdm', return_value=fake_sent_lp):
-			with mock.patch('multiprocessing.pool.Pool'):
-				if use_tqdm:
-					assert np.isclose(LM.perplexity(corpus[10:]), np.exp(-sum(fake_sent_lp) / sum(map(len, corpus[10:]))))
-					assert tqdm.tqdm.called
-					if LM.cpu_count > 0:
-						assert multiprocessing.pool.Pool.called
-				else:
-					assert LM.perplexity(corpus[10:]) > 0
-					assert not tqdm.tqdm.called
-					assert not multiprocessing.pool.Pool.called
+		sent_log_probs = []
+		for sent in corpus[10:]:
+			sent_now = [vocab[0]] * order + sent + [vocab[1]]
+			sent_log_probs.append(sum(np.log(LM.score(sent_now[i + order], tuple(sent_now[i + 1:i + order]))) \
+				for i in range(len(sent) + 1)))
+		with mock.patch('tqdm.tqdm', side_effect=lambda iterable, total: iterable):
+			assert np.allclose(LM.corpus_log_prob(corpus[10:]), sent_log_probs)
+			assert tqdm.tqdm.called == use_pool
+		assert np.isclose(LM.sent_log_prob(corpus[10]), sent_log_probs[0])
+		assert np.isclose(LM.perplexity(corpus[10:]), np.exp(-sum(sent_log_probs) / sum(map(len, corpus[10:]))))
+
+		LM.cpu_count = 0
+		with mock.patch('multiprocessing.pool.Pool') as pool:
+			assert np.allclose(LM.corpus_log_prob(corpus[10:]), sent_log_probs)
+			assert not pool.called
+
+
+	def test_perplexity_threads(self):
+		# models scored by worker processes at the same time from different threads do not mix up their tasks
+		vocab = ['<go>', '<eos>', '<unk>', 'a', 'b', 'c', 'd']
+		models, corpora, expected = [], [], []
+		for order, sample in [(2, 300), (3, 400)]:
+			LM = KneserNeyInterpolated(order, vocab[0], vocab[1], vocab[2], cpu_count=0)
+			corpus = [list(np.random.choice(vocab[3:] + ['e'], np.random.randint(0, 10))) for _ in range(sample)]
+			LM.fit(corpus[:50])
+			expected.append(LM.corpus_log_prob(corpus))
+			LM.cpu_count = 2
+			models.append(LM)
+			corpora.append(corpus)
+
+		barrier = threading.Barrier(len(models))
+		def score(i):
+			barrier.wait()
+			return models[i].corpus_log_prob(corpora[i])
+		with mock.patch('tqdm.tqdm', side_effect=lambda iterable, total: iterable):
+			for _ in range(5):
+				with ThreadPoolExecutor(len(models)) as executor:
+					results = list(executor.map(score, range(len(models))))
+				for result, expected_result in zip(results, expected):
+					assert np.allclose(result, expected_result)
 
 
 fwbw_perplexity_test_parameter = generate_testcase(\
@@ -149,5 +274,29 @@ class TestNgramFwBwPerplexityMetric():
 		fpm.forward(data)
 		fpm.close()
 
+	def test_model_cache(self, tmp_path):
+		dataloader = FakeDataLoader()
+		data = dataloader.get_data(reference_key='resp_allvocabs', gen_key='gen', \
+								   to_list=True, pad=False, gen_len='non-empty', ref_len='non-empty')
+		fpm = NgramFwBwPerplexityMetric(dataloader, reference_test_list=data['resp_allvocabs'], ngram=3)
+		fpm.forward(data)
+		res = fpm.close()
+
+		with mock.patch.object(KneserNeyInterpolated, 'load', wraps=KneserNeyInterpolated.load) as load:
+			for i in range(2):
+				fpm = NgramFwBwPerplexityMetric(dataloader, reference_test_list=data['resp_allvocabs'], ngram=3, \
+					model_cache_dir=str(tmp_path / "models"))
+				fpm.forward(data)
+				assert fpm.close() == res
+				# the model is trained at the first time, and loaded from the cache at the second time
+				assert load.call_count == i
+				assert len(os.listdir(str(tmp_path / "models"))) == 1
+
+		fpm = NgramFwBwPerplexityMetric(dataloader, reference_test_list=data['resp_allvocabs'], ngram=2, \
+			model_cache_dir=str(tmp_path / "models"))
+		fpm.forward(data)
+		fpm.close()
+		assert len(os.listdir(str(tmp_path / "models"))) == 2
+
 	def test_version(self):
 		version_test(NgramFwBwPerplexityMetric, dataloader=FakeDataLoader())
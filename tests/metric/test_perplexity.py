@@ -28,11 +28,11 @@ perplexity_test_parameter = generate_testcase(\
 )
 
 
-perplexity_test_engine_parameter = generate_testcase(\
+perplexity_test_engine_parameter = list(generate_testcase(\
 	(zip(test_dataloader), "add"),
 	(zip(test_ref_vocab), "multi"),
 	(zip(test_gen_prob_vocab), "multi"),
-)
+))
 
 class TestPerplexityMetric():
 	default_reference_key = 'ref_allvocabs'
@@ -145,6 +145,193 @@ class TestPerplexityMetric():
 		assert np.isclose(res['perplexity'], res_shuffle['perplexity'])
 		assert np.isclose(res['perplexity'], res_shuffle2['perplexity'])
 
+	@pytest.mark.parametrize("data_loader, ref_vocab, gen_prob_vocab", perplexity_test_engine_parameter)
+	def test_batch_forward(self, data_loader, ref_vocab, gen_prob_vocab):
+		dataloader = FakeDataLoader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=True, pad=True, \
+								   gen_prob_check='no_check', ref_len='random', \
+								   ref_vocab=ref_vocab, gen_prob_vocab=gen_prob_vocab, \
+								   resp_len='>=2')
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		generate_rare_vocab = gen_prob_vocab == "all_vocab"
+		pm = PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab, full_check=True)
+		pm.forward(data)
+		res = pm.close()
+
+		# padded with zeros, which are out of the lengths and never checked
+		gen_log_prob = np.zeros((len(data[gen_prob_key]), max(map(len, data[gen_prob_key])) + 2, \
+			len(data[gen_prob_key][0][0])))
+		for i, gen_prob in enumerate(data[gen_prob_key]):
+			gen_log_prob[i, :len(gen_prob)] = gen_prob
+		for reference in [np.array(data[reference_key]), data[reference_key]]:
+			pm_batch = PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab, full_check=True)
+			batch_data = copy.deepcopy(data)
+			batch_data[reference_key] = reference
+			batch_data[gen_prob_key] = gen_log_prob
+			pm_batch.forward(batch_data)
+			res_batch = pm_batch.close()
+			assert res['perplexity hashvalue'] == res_batch['perplexity hashvalue']
+			assert np.isclose(res['perplexity'], res_batch['perplexity'])
+
+	@pytest.mark.parametrize("data_loader, ref_vocab, gen_prob_vocab", perplexity_test_engine_parameter)
+	def test_pytorch_batch(self, data_loader, ref_vocab, gen_prob_vocab):
+		dataloader = FakeDataLoader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=True, pad=True, \
+								   gen_prob_check='no_check', ref_len='random', \
+								   ref_vocab=ref_vocab, gen_prob_vocab=gen_prob_vocab, \
+								   resp_len='>=2')
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		generate_rare_vocab = gen_prob_vocab == "all_vocab"
+		pm = PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab)
+		pm.forward(data)
+		res = pm.close()
+
+		# padded with zeros, which are out of the lengths and never checked
+		gen_log_prob = torch.zeros(len(data[gen_prob_key]), max(map(len, data[gen_prob_key])) + 2, \
+			len(data[gen_prob_key][0][0]), dtype=torch.float64)
+		for i, gen_prob in enumerate(data[gen_prob_key]):
+			gen_log_prob[i, :len(gen_prob)] = torch.tensor(gen_prob)
+		torch_data = copy.deepcopy(data)
+		torch_data[reference_key] = torch.LongTensor(data[reference_key])
+		torch_data[gen_prob_key] = gen_log_prob
+		pm_torch = PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab, full_check=True)
+		pm_torch.forward(torch_data)
+		res_torch = pm_torch.close()
+		assert res['perplexity hashvalue'] == res_torch['perplexity hashvalue']
+		assert np.isclose(res['perplexity'], res_torch['perplexity'])
+
+		# the full check finds an invalid probability in the lengths
+		torch_data[gen_prob_key] = gen_log_prob.clone()
+		torch_data[gen_prob_key][:, 0] -= 1
+		torch_data[gen_prob_key][0, 0] += 1
+		pm_torch = PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab, full_check=True)
+		with pytest.raises(ValueError, match='log_softmax'):
+			pm_torch.forward(torch_data)
+
+	@pytest.mark.parametrize("data_loader, ref_vocab, gen_prob_vocab", perplexity_test_engine_parameter)
+	def test_gold_log_prob(self, data_loader, ref_vocab, gen_prob_vocab):
+		dataloader = FakeDataLoader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=True, pad=True, \
+								   gen_prob_check='no_check', ref_len='random', \
+								   ref_vocab=ref_vocab, gen_prob_vocab=gen_prob_vocab, \
+								   resp_len='>=2')
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		generate_rare_vocab = gen_prob_vocab == "all_vocab"
+		pm = PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab)
+		pm.forward(data)
+		res = pm.close()
+
+		gold_data = {reference_key: data[reference_key], reference_len_key: data[reference_len_key]}
+		gold_data['gold_log_prob'] = [[gen_prob[j][word] if word < len(gen_prob[j]) else 0. \
+			for j, word in enumerate(resp[1:length])] \
+			for resp, length, gen_prob in zip(data[reference_key], data[reference_len_key], data[gen_prob_key])]
+		gold_data['unk_log_prob'] = [[prob[dataloader.unk_id] for prob in gen_prob] for gen_prob in data[gen_prob_key]]
+		gold_data['gen_prob_sum'] = [np.exp(gen_prob).sum(-1).tolist() for gen_prob in data[gen_prob_key]]
+		# padded with zeros, which are out of the lengths and never used
+		width = max(map(len, data[gen_prob_key])) + 1
+		padded_data = {key: value if key in (reference_key, reference_len_key) else \
+			np.array([row + [0.] * (width - len(row)) for row in value]) for key, value in gold_data.items()}
+		torch_data = {key: value if key == reference_len_key else torch.tensor(np.array(value)) \
+			for key, value in padded_data.items()}
+		for forward_data in [gold_data, padded_data, torch_data]:
+			pm_gold = PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab)
+			pm_gold.forward(forward_data)
+			res_gold = pm_gold.close()
+			assert res['perplexity hashvalue'] == res_gold['perplexity hashvalue']
+			assert np.isclose(res['perplexity'], res_gold['perplexity'])
+
+		invalid_data = copy.deepcopy(padded_data)
+		invalid_data['gen_prob_sum'][:, 0] = 0.5
+		with pytest.raises(ValueError, match='gen_prob_sum'):
+			PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab).forward(invalid_data)
+		del invalid_data['unk_log_prob']
+		with pytest.raises(ValueError, match='unk_log_prob'):
+			PerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab).forward(invalid_data)
+
+	@pytest.mark.parametrize('engine', ['list', 'numpy', 'pytorch'])
+	def test_check_policy(self, engine):
+		dataloader = FakeDataLoader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=True, pad=True, \
+								   gen_prob_check='no_check', ref_len='random', \
+								   ref_vocab='valid_vocab', gen_prob_vocab='valid_vocab', \
+								   resp_len='>=2')
+		if engine != 'list':
+			gen_log_prob = np.zeros((len(data[gen_prob_key]), max(map(len, data[gen_prob_key])), \
+				len(data[gen_prob_key][0][0])))
+			for i, gen_prob in enumerate(data[gen_prob_key]):
+				gen_log_prob[i, :len(gen_prob)] = gen_prob
+			data[gen_prob_key] = gen_log_prob
+		if engine == 'pytorch':
+			data[reference_key] = torch.LongTensor(data[reference_key])
+			data[gen_prob_key] = torch.tensor(data[gen_prob_key])
+		invalid_data = copy.copy(data)
+		if engine == 'list':
+			invalid_data[gen_prob_key] = [[[prob - 1 for prob in row] for row in gen_prob] for gen_prob in data[gen_prob_key]]
+		else:
+			invalid_data[gen_prob_key] = data[gen_prob_key] - 1
+
+		# no check
+		pm = PerplexityMetric(dataloader, check_rows=0)
+		pm.forward(invalid_data)
+		# only the first batches are checked
+		pm = PerplexityMetric(dataloader, full_check=True, check_rows=3, check_batches=1)
+		pm.forward(data)
+		pm.forward(invalid_data)
+		pm = PerplexityMetric(dataloader, check_rows=3, check_batches=2)
+		pm.forward(data)
+		with pytest.raises(ValueError, match='log_softmax'):
+			pm.forward(invalid_data)
+		# the full check works without the random check
+		pm = PerplexityMetric(dataloader, full_check=True, check_rows=0)
+		with pytest.raises(ValueError, match='log_softmax'):
+			pm.forward(invalid_data)
+
+		for kwargs in [{'check_rows': -1}, {'check_batches': -1}]:
+			with pytest.raises(ValueError):
+				PerplexityMetric(dataloader, **kwargs)
+
+	@pytest.mark.parametrize('to_list', [True, False])
+	def test_peek(self, to_list):
+		dataloader = FakeDataLoader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		key_list = [reference_key, reference_len_key, gen_prob_key]
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=to_list, pad=not to_list, \
+								   gen_prob_check='no_check', ref_len='non-empty', \
+								   ref_vocab='non-empty', gen_prob_vocab='valid_vocab', \
+								   resp_len='>=2')
+		batches = split_batch(data, key_list, to_list=to_list, less_pad=not to_list, \
+							  reference_key=reference_key, reference_is_3D=False)
+		pm = PerplexityMetric(dataloader)
+		with pytest.raises(RuntimeError):
+			pm.peek()
+		for i, batch in enumerate(batches):
+			pm.forward(batch)
+			res = pm.peek()
+			pm_prefix = PerplexityMetric(dataloader)
+			for prefix_batch in batches[:i + 1]:
+				pm_prefix.forward(prefix_batch)
+			res_prefix = pm_prefix.close()
+			assert res['perplexity hashvalue'] == res_prefix['perplexity hashvalue']
+			assert np.isclose(res['perplexity'], res_prefix['perplexity'])
+		assert pm.close() == res
+
 	@pytest.mark.parametrize( \
 		'data_loader, argument, shape, type, batch_len, check, ref_len, ref_vocab, gen_prob_vocab, resp_len, include_invalid', \
 		perplexity_test_parameter)
@@ -291,6 +478,99 @@ class TestMultiTurnPerplexityMetric:
 
 			assert res['perplexity hashvalue'] != res_unequal['perplexity hashvalue']
 
+	@pytest.mark.parametrize('engine, generate_rare_vocab', \
+		[['numpy', False], ['numpy', True], ['pytorch', False], ['pytorch', True]])
+	def test_flat_forward(self, engine, generate_rare_vocab):
+		dataloader = FakeMultiDataloader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=True, pad=True, \
+								   gen_prob_check='no_check', ref_len='random', \
+								   ref_vocab='all_vocab', gen_prob_vocab='all_vocab' if generate_rare_vocab else 'valid_vocab', \
+								   resp_len=">=2")
+		mtpm = MultiTurnPerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab)
+		mtpm.forward(data)
+		res = mtpm.close()
+
+		# the turns are padded with empty sentences
+		turn_num = max(map(len, data[reference_len_key])) + 1
+		sent_length = len(data[reference_key][0][0])
+		gen_length, vocab_size = len(data[gen_prob_key][0][0]), len(data[gen_prob_key][0][0][0])
+		flat_data = {reference_key: np.zeros((len(data[reference_key]), turn_num, sent_length), dtype=int), \
+			reference_len_key: np.zeros((len(data[reference_key]), turn_num), dtype=int), \
+			gen_prob_key: np.zeros((len(data[reference_key]), turn_num, gen_length, vocab_size))}
+		for i, turn_length in enumerate(data[reference_len_key]):
+			flat_data[reference_key][i, :len(turn_length)] = data[reference_key][i]
+			flat_data[reference_len_key][i, :len(turn_length)] = turn_length
+			flat_data[gen_prob_key][i, :len(turn_length)] = data[gen_prob_key][i]
+		if engine == 'pytorch':
+			flat_data[reference_key] = torch.LongTensor(flat_data[reference_key])
+			flat_data[gen_prob_key] = torch.tensor(flat_data[gen_prob_key])
+		mtpm_flat = MultiTurnPerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab)
+		mtpm_flat.forward(flat_data)
+		res_flat = mtpm_flat.close()
+		assert res['perplexity hashvalue'] == res_flat['perplexity hashvalue']
+		assert np.isclose(res['perplexity'], res_flat['perplexity'])
+
+		# gen_log_prob is padded to more turns than the references
+		gen_log_prob = flat_data[gen_prob_key]
+		if engine == 'pytorch':
+			gen_log_prob = torch.cat([gen_log_prob, torch.zeros_like(gen_log_prob[:, :1])], dim=1)
+		else:
+			gen_log_prob = np.concatenate([gen_log_prob, np.zeros_like(gen_log_prob[:, :1])], axis=1)
+		# the list references of each session are padded to a different length
+		references = [[list(ref) + [0] * i for ref in session] for i, session in enumerate(data[reference_key])]
+		for reference in [flat_data[reference_key], references]:
+			mtpm_padded = MultiTurnPerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab)
+			mtpm_padded.forward({reference_key: reference, reference_len_key: flat_data[reference_len_key], \
+				gen_prob_key: gen_log_prob})
+			res_padded = mtpm_padded.close()
+			assert res['perplexity hashvalue'] == res_padded['perplexity hashvalue']
+			assert np.isclose(res['perplexity'], res_padded['perplexity'])
+
+		flat_data[reference_len_key][0, :] = 2
+		with pytest.raises(ValueError, match='Turn num'):
+			MultiTurnPerplexityMetric(dataloader, generate_rare_vocab=generate_rare_vocab).forward({ \
+				key: value if key == reference_len_key else value[:, :-1] for key, value in flat_data.items()})
+
+	def test_check_batches(self):
+		dataloader = FakeMultiDataloader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=True, pad=False, \
+								   gen_prob_check='no_check', ref_len='non-empty', \
+								   ref_vocab='non-empty', gen_prob_vocab='valid_vocab', \
+								   resp_len=">=2")
+		invalid_data = copy.copy(data)
+		invalid_data[gen_prob_key] = [[[[prob - 1 for prob in row] for row in turn] for turn in session] \
+			for session in data[gen_prob_key]]
+		# the batches are counted instead of the sessions
+		mtpm = MultiTurnPerplexityMetric(dataloader, full_check=True, check_batches=1)
+		mtpm.forward(data)
+		mtpm.forward(invalid_data)
+		mtpm = MultiTurnPerplexityMetric(dataloader, full_check=True, check_batches=2)
+		mtpm.forward(data)
+		with pytest.raises(ValueError, match='log_softmax'):
+			mtpm.forward(invalid_data)
+
+	def test_peek(self):
+		dataloader = FakeMultiDataloader()
+		reference_key, reference_len_key, gen_prob_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, \
+								   reference_len_key=reference_len_key, gen_prob_key=gen_prob_key, \
+								   to_list=True, pad=False, \
+								   gen_prob_check='no_check', ref_len='non-empty', \
+								   ref_vocab='non-empty', gen_prob_vocab='valid_vocab', \
+								   resp_len=">=2")
+		mtpm = MultiTurnPerplexityMetric(dataloader)
+		with pytest.raises(RuntimeError):
+			mtpm.peek()
+		mtpm.forward(data)
+		res = mtpm.peek()
+		assert mtpm.close() == res
+
 	@pytest.mark.parametrize( \
 		'data_loader, argument, shape, type, batch_len, check, ref_len, ref_vocab, gen_prob_vocab, resp_len, include_invalid', \
 		multiperplexity_test_parameter)
@@ -1,9 +1,15 @@
 import copy
+import gc
 import random
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pytest
 
 from cotk.metric import BleuPrecisionRecallMetric, EmbSimilarityPrecisionRecallMetric
+from cotk.metric import precision_recall
+from cotk.metric.precision_recall import _PrecisionRecallMetric, PairwiseBleuScorer
+from cotk.metric.bleu_utils import BleuStatistics
 
 from metric_base import *
 
@@ -13,7 +19,7 @@ def setup_module():
 
 #pytestmark = pytest.mark.skip("all tests still WIP")
 
-bleu_precision_recall_test_parameter = generate_testcase(\
+bleu_precision_recall_test_parameter = list(generate_testcase(\
 	(zip(test_dataloader), "add"),
 	(zip(test_argument), "add"),
 	(zip(test_shape, test_type), "multi"),
@@ -21,7 +27,7 @@ bleu_precision_recall_test_parameter = generate_testcase(\
 	(zip(test_ref_len), "multi"),
 	(zip(test_gen_len), "multi"),
 	(zip(test_ngram), "add")
-)
+))
 
 class TestBleuPrecisionRecallMetric():
 	default_reference_key = 'candidate_allvocabs'
@@ -119,6 +125,74 @@ class TestBleuPrecisionRecallMetric():
 
 		assert same_dict(data, _data)
 
+	# unequal batches are rejected before any engine is used (see ``test_close``)
+	@pytest.mark.parametrize('data_loader, argument, shape, type, batch_len, ref_len, gen_len, ngram', \
+		[case for case in bleu_precision_recall_test_parameter if case[4] == 'equal'])
+	def test_engine(self, data_loader, argument, shape, type, batch_len, ref_len, gen_len, ngram):
+		dataloader = FakeMultiDataloader()
+		reference_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, \
+								   to_list=(type == 'list'), pad=(shape == 'pad'), \
+								   ref_len=ref_len, gen_len=gen_len, test_prec_rec=True)
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		res = []
+		for engine in ['native', 'nltk']:
+			bprm = BleuPrecisionRecallMetric(dataloader, ngram, 3, engine=engine)
+			bprm.forward(data)
+			res.append(bprm.close())
+		assert same_dict(res[0], res[1], False)
+
+	@pytest.mark.parametrize('data_loader', ['dataloader', 'field'])
+	def test_shared_statistics(self, data_loader, monkeypatch):
+		dataloader = FakeMultiDataloader()
+		reference_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, \
+								   to_list=True, pad=False, ref_len='non-empty', gen_len='non-empty', test_prec_rec=True)
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		compute_pairwise = BleuStatistics.compute_pairwise
+		calls = []
+		def counted_compute_pairwise(*args):
+			calls.append(args)
+			return compute_pairwise(*args)
+		monkeypatch.setattr(BleuStatistics, "compute_pairwise", counted_compute_pairwise)
+
+		scorer = PairwiseBleuScorer()
+		for ngram in range(1, 5):
+			res = []
+			for engine in ['native', 'nltk']:
+				bprm = BleuPrecisionRecallMetric(dataloader, ngram, 3, engine=engine, scorer=scorer)
+				bprm.forward(data)
+				res.append(bprm.close())
+			assert same_dict(res[0], res[1], False)
+		# the n-gram counts are computed by the first metric and reused by the others
+		assert len(calls) == len(data[gen_key])
+
+		with pytest.raises(ValueError, match="max_order"):
+			BleuPrecisionRecallMetric(dataloader, 5, 3, scorer=scorer)
+
+	def test_shared_statistics_threads(self):
+		dataloader = FakeMultiDataloader()
+		reference_key, gen_key = self.default_keywords
+		batches = [dataloader.get_data(reference_key=reference_key, gen_key=gen_key, to_list=True, pad=False, \
+			ref_len='non-empty', gen_len='non-empty', test_prec_rec=True) for _ in range(2)]
+		scorer = PairwiseBleuScorer()
+		def close_all(data):
+			res = []
+			for ngram in range(1, 5):
+				bprm = BleuPrecisionRecallMetric(dataloader, ngram, 3, scorer=scorer)
+				bprm.forward(data)
+				res.append(bprm.close())
+			return res
+
+		# the statistics are replaced by other batches while other threads are reading them
+		expected = [close_all(data) for data in batches]
+		with ThreadPoolExecutor(max_workers=4) as executor:
+			futures = [executor.submit(close_all, batches[i % 2]) for i in range(8)]
+		for i, future in enumerate(futures):
+			assert future.result() == expected[i % 2]
+
 	def test_version(self):
 		version_test(BleuPrecisionRecallMetric, dataloader=FakeMultiDataloader())
 
@@ -281,5 +355,51 @@ class TestEmbSimilarityPrecisionRecallMetric():
 
 		assert same_dict(data, _data)
 
+	@pytest.mark.parametrize('data_loader', ['dataloader', 'field'])
+	def test_score_matrices(self, data_loader):
+		dataloader = FakeMultiDataloader()
+		# some words are not in word2vec
+		emb = {word: np.random.rand(5) for word in dataloader.all_vocab_list[:dataloader.frequent_vocab_size - 2]}
+		reference_key, gen_key = self.default_keywords
+		data = dataloader.get_data(reference_key=reference_key, gen_key=gen_key, \
+								   to_list=True, pad=False, ref_len='random', gen_len='random', \
+								   ref_vocab='all_vocab', gen_vocab='all_vocab', test_prec_rec=True)
+		if data_loader == 'field':
+			dataloader = dataloader.get_default_field()
+		references = [[dataloader.trim_in_ids(cand[1:]) for cand in inst] for inst in data[reference_key]]
+		gens = [[dataloader.trim_in_ids(cand) for cand in inst] for inst in data[gen_key]]
+		espr_list = [EmbSimilarityPrecisionRecallMetric(dataloader, emb, mode, 3) for mode in ['avg', 'extrema']]
+		# the metrics of different modes share the embedding table
+		assert espr_list[0]._embedding_table is espr_list[1]._embedding_table
+		for espr in espr_list:
+			matrices = espr._score_matrices(gens, references)
+			expected = _PrecisionRecallMetric._score_matrices(espr, gens, references)
+			assert len(matrices) == len(expected)
+			for matrix, expected_matrix in zip(matrices, expected):
+				assert matrix.dtype == np.float32
+				assert np.allclose(matrix, expected_matrix, atol=1e-6)
+
+	def test_embedding_table(self):
+		dataloader = FakeMultiDataloader()
+		emb = {word: np.random.rand(5) for word in dataloader.all_vocab_list[:dataloader.frequent_vocab_size]}
+		espr = EmbSimilarityPrecisionRecallMetric(dataloader, emb, 'avg', 3)
+		# the table is built once for the whole vocabulary, and never changed by the metrics sharing it
+		assert len(espr._embedding_table.known) == dataloader.all_vocab_size
+		table = weakref.ref(espr._embedding_table)
+		word = dataloader.all_vocab_list[dataloader.frequent_vocab_size - 1]
+		word_id = dataloader.convert_tokens_to_ids([word])[0]
+		espr._embedding_table.lookup(np.array([word_id]))
+
+		# a modified word2vec gets a new table
+		emb[word] = emb[word] + 1
+		modified = EmbSimilarityPrecisionRecallMetric(dataloader, emb, 'extrema', 3)
+		assert modified._embedding_table is not table()
+		assert np.allclose(modified._embedding_table.lookup(np.array([word_id]))[0][0], emb[word])
+
+		# the table is released with the metrics using it
+		del espr, modified
+		gc.collect()
+		assert table() is None
+
 	def test_version(self):
 		version_test(EmbSimilarityPrecisionRecallMetric, dataloader=FakeMultiDataloader())
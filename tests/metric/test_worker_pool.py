@@ -0,0 +1,94 @@
+import os
+import tempfile
+
+import pytest
+
+from unittest import mock
+
+from cotk._utils import FORK_LOCK
+from cotk.metric.worker_pool import WorkerPool, get_worker_pool
+
+def _power(data, i):
+	base, exps = data
+	return base ** exps[i]
+
+class TestWorkerPool():
+	def test_imap(self):
+		pool = WorkerPool()
+		try:
+			data = (3, list(range(50)))
+			results = pool.imap(_power, data, 50, 2, chunksize=7)
+			assert list(results) == [_power(data, i) for i in range(50)]
+			first = pool._pools[2]
+
+			# the processes are reused by the following tasks
+			data = (2, list(range(30, 0, -1)))
+			assert list(pool.imap(_power, data, 30, 2)) == [_power(data, i) for i in range(30)]
+			assert pool._pools[2] is first
+
+			# another number of processes uses another pool
+			assert list(pool.imap(_power, data, 3, 1)) == [_power(data, i) for i in range(3)]
+			assert pool._pools[2] is first and len(pool._pools) == 2
+		finally:
+			pool.close()
+		assert not pool._pools
+
+	def test_limit(self):
+		pool = WorkerPool()
+		try:
+			data = (2, list(range(10)))
+			for processes in [1, 2, 1, 3]:
+				assert list(pool.imap(_power, data, 10, processes)) == [_power(data, i) for i in range(10)]
+			# the pool of the least recently used number of processes is replaced
+			assert list(pool._pools) == [1, 3]
+
+			# the tasks submitted to a replaced pool are still finished
+			results = pool.imap(_power, data, 10, 1, chunksize=1)
+			assert list(pool.imap(_power, data, 10, 2)) == [_power(data, i) for i in range(10)]
+			assert list(pool._pools) == [1, 2]
+			assert list(pool.imap(_power, data, 10, 4)) == [_power(data, i) for i in range(10)]
+			assert list(pool._pools) == [2, 4]
+			assert list(results) == [_power(data, i) for i in range(10)]
+		finally:
+			pool.close()
+
+	def test_data_file(self, tmp_path, monkeypatch):
+		monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+		pool = WorkerPool()
+		try:
+			results = pool.imap(_power, (2, [1, 2, 3]), 3, 2)
+			assert len(os.listdir(str(tmp_path))) == 1
+			assert list(results) == [2, 4, 8]
+			assert not os.listdir(str(tmp_path))
+
+			# the data file is removed when the results are dropped without being consumed
+			results = pool.imap(_power, (2, [1, 2, 3]), 3, 2)
+			assert len(os.listdir(str(tmp_path))) == 1
+			del results
+			assert not os.listdir(str(tmp_path))
+		finally:
+			pool.close()
+
+	def test_reused_path(self, tmp_path, monkeypatch):
+		# every data file gets the same path, which is removed after each call
+		path = str(tmp_path / "data.pkl")
+		monkeypatch.setattr(tempfile, "NamedTemporaryFile", lambda **kwargs: open(path, "wb"))
+		pool = WorkerPool()
+		try:
+			assert list(pool.imap(_power, (2, [1, 2, 3]), 3, 1)) == [2, 4, 8]
+			assert list(pool.imap(_power, (3, [1, 2, 3]), 3, 1)) == [3, 9, 27]
+		finally:
+			pool.close()
+
+	def test_fork_lock(self):
+		# the processes are forked while holding FORK_LOCK
+		locked = []
+		pool = WorkerPool()
+		with mock.patch("cotk.metric.worker_pool.Pool", side_effect=lambda processes: \
+				locked.append(FORK_LOCK.locked()) or mock.MagicMock()):
+			pool.imap(_power, (2, [1]), 1, 2)
+		assert locked == [True]
+		assert not FORK_LOCK.locked()
+
+	def test_shared(self):
+		assert get_worker_pool() is get_worker_pool()
@@ -0,0 +1,113 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Heavy dependencies which should only be loaded when they are used.
+LAZY_MODULES = ["nltk", "requests", "tqdm", "checksumdir", "multiprocessing", "torch", "transformers"]
+
+IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+before = set(sys.modules)
+start = time.perf_counter()
+import {}
+duration = time.perf_counter() - start
+print(json.dumps({{"time": duration, "modules": sorted(set(sys.modules) - before)}}))
+'''
+
+def _import_in_subprocess(module_name):
+	output = subprocess.check_output([sys.executable, "-c", IMPORT_SCRIPT.format(module_name)])
+	return json.loads(output.decode().strip().splitlines()[-1])
+
+@pytest.mark.parametrize('module_name', ["cotk", "cotk.dataloader", "cotk.metric", "cotk.models"])
+def test_import(module_name):
+	res = _import_in_subprocess(module_name)
+	imported = {name.split('.')[0] for name in res["modules"]}
+	assert not imported.intersection(LAZY_MODULES)
+	assert res["time"] < 3
+
+DOCSTRING_SCRIPT = '''
+import gc
+import inspect
+import json
+from cotk._utils.metaclass import DocStringInheritor
+DocStringInheritor.use_docstring_cache = {}
+import cotk.dataloader, cotk.metric, cotk.wordvector
+classes = sorted((obj for obj in gc.get_objects() if isinstance(obj, DocStringInheritor)), \\
+	key=lambda cls: (cls.__module__, cls.__qualname__), reverse=True)
+docs = {{}}
+for cls in classes:
+	for name, attr in vars(cls).items():
+		if isinstance(attr, (staticmethod, classmethod)):
+			attr = attr.__func__
+		if inspect.isfunction(attr) or isinstance(attr, property):
+			docs[cls.__module__ + "." + cls.__qualname__ + "." + name] = attr.__doc__
+	for name, attr in cls.META_DOC_FOR_ATTRIBUTES.items():
+		docs[cls.__module__ + "." + cls.__qualname__ + ".META_DOC_FOR_ATTRIBUTES." + name] = attr
+for cls in classes:
+	docs[cls.__module__ + "." + cls.__qualname__ + ".__doc__"] = cls.__doc__
+	docs[cls.__module__ + "." + cls.__qualname__ + ".META_DOC"] = cls.META_DOC
+print(json.dumps(docs))
+'''
+
+def test_docstring_cache():
+	expanded = subprocess.check_output([sys.executable, "-c", DOCSTRING_SCRIPT.format(False)])
+	cached = subprocess.check_output([sys.executable, "-c", DOCSTRING_SCRIPT.format(True)])
+	assert json.loads(expanded.decode().strip().splitlines()[-1]) == json.loads(cached.decode().strip().splitlines()[-1])
+
+def test_docstring_cache_synced():
+	# expand all the docstrings (which checks all the CONSTANTs in them), and compare with the cache
+	docs_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docs")
+	subprocess.check_call([sys.executable, "update_docstring_cache.py", "--check"], cwd=docs_dir)
+
+def test_docstring_expansion():
+	import gc
+	import weakref
+	from cotk._utils.metaclass import DocStringInheritor
+	class Base(metaclass=DocStringInheritor):
+		'''{_ARGUMENTS}'''
+		_ARGUMENTS = "arguments"
+		def method(self):
+			'''{_ARGUMENTS} of method'''
+	class Derived(Base):
+		_ARGUMENTS = "derived arguments"
+	assert Derived.method.__doc__ == "arguments of method"
+	assert Derived.__doc__ == "derived arguments"
+
+	# the classes not in the cache are expanded when they are created
+	with pytest.raises(ValueError, match="_MISSING"):
+		class Malformed(Base): #pylint: disable=unused-variable
+			'''{_MISSING}'''
+
+	class Unread(Base):
+		pass
+	unread = weakref.ref(Unread)
+	del Unread
+	gc.collect()
+	assert unread() is None
+
+THREAD_IMPORT_SCRIPT = """
+import sys
+import threading
+from cotk._utils.imports import LazyModule, LazyObject
+sys.path.insert(0, sys.argv[1])
+slow_module = LazyModule("slow_module", {})
+value = LazyObject("slow_module.value")
+thread = threading.Thread(target=lambda: slow_module.value)
+thread.start()
+while "slow_module" not in sys.modules:
+	pass
+# the module is being initialized by another thread
+print(slow_module.value, value.real)
+thread.join()
+"""
+
+def test_import_in_threads(tmp_path):
+	with open(str(tmp_path / "slow_module.py"), "w") as module_file:
+		module_file.write("import time\ntime.sleep(0.5)\nvalue = 1\n")
+	output = subprocess.check_output([sys.executable, "-c", THREAD_IMPORT_SCRIPT, str(tmp_path)], timeout=60)
+	assert output.decode().strip().splitlines()[-1] == "1 1"